@@ -3,19 +3,16 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import or_
-from passlib.context import CryptContext
 from datetime import timedelta, datetime
 import secrets
 import uuid
 
 from app.database.postgres import get_db
 from app.models.user import User
-from app.auth.security import create_token, decode_token
+from app.auth.security import create_token, decode_token, verify_password_async, get_password_hash_async
 from app.config import settings
 from app.schemas.user import ChangePasswordRequest, ForgotPasswordRequest, ResetPasswordRequest
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 async def authenticate_user(login: str, password: str, db: AsyncSession):
     """Autentica usuario por username o email"""
     result = await db.execute(
@@ -27,7 +24,7 @@ async def authenticate_user(login: str, password: str, db: AsyncSession):
     
     if not user or user.is_active == 0:  # 0 = inactivo
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     
     return user
@@ -125,11 +122,11 @@ async def change_password(user_id: int, change_request: ChangePasswordRequest, d
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verificar contraseña actual
-    if not pwd_context.verify(change_request.current_password, user.hashed_password):
+    if not await verify_password_async(change_request.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Actualizar contraseña
-    user.hashed_password = pwd_context.hash(change_request.new_password)
+    user.hashed_password = await get_password_hash_async(change_request.new_password)
     
     await db.commit()
     return {"message": "Password changed successfully"}
@@ -4,10 +4,12 @@ from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.auth.security import decode_token
+from app.auth.revocation import get_revocation_store, token_id
 from app.database.postgres import get_db
 from app.models.user import User
 from typing import Optional
 from typing import Optional
+from app.cache import TTLCache
 from app.config import settings
 from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -19,9 +21,29 @@ oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login",
     scheme_name="JWT"
 )
-# Lista para almacenar tokens inválidos (logout)
-# En producción, usar Redis o base de datos
-blacklisted_tokens = set()
+# email -> is_active. Evita una consulta a users en cada petición autenticada; se invalida
+# desde controllers/user.py al cambiar el estado y el TTL acota el desfase entre workers.
+user_status_cache = TTLCache(
+    "user_status",
+    maxsize=settings.USER_STATUS_CACHE_MAX_ENTRIES,
+    ttl=settings.USER_STATUS_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_user_status(*emails: Optional[str]) -> None:
+    for email in emails:
+        if email:
+            user_status_cache.invalidate(email)
+
+
+async def _is_active_user(db: AsyncSession, email: str) -> bool:
+    active = user_status_cache.get(email)
+    if active is None:
+        result = await db.execute(select(User.is_active).where(User.email == email))
+        row = result.first()
+        active = row is not None and row[0] != 0
+        user_status_cache.set(email, active)
+    return active
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -33,10 +55,6 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Verificar si el token está en la lista negra
-    if token in blacklisted_tokens:
-        raise credentials_exception
-    
     try:
         payload = decode_token(token)
 
@@ -50,12 +68,13 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    # Verificar que el token no ha sido revocado (logout)
+    if await get_revocation_store().is_revoked(token_id(payload, token)):
+        raise credentials_exception
     
     # Verificar que el usuario existe y está activo
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
-    
-    if user is None or user.is_active == 0:
+    if not await _is_active_user(db, email):
         raise credentials_exception
     
     return {
@@ -93,9 +112,9 @@ async def get_optional_user(request: Request, db: AsyncSession = Depends(get_db)
     except JWTError:
         return None
 
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
-    if user is None or user.is_active == 0:
+    if await get_revocation_store().is_revoked(token_id(payload, token)):
+        return None
+    if not await _is_active_user(db, email):
         return None
     return {
         "id": user_id,
@@ -117,9 +136,13 @@ def require_role(roles: list):
         return user
     return dependency
 
-def logout_token(token: str):
-    """Añadir token a la lista negra"""
-    blacklisted_tokens.add(token)
+async def logout_token(token: str):
+    """Revoca el token hasta su expiración"""
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return  # Token inválido o caducado: no hay nada que revocar
+    await get_revocation_store().revoke(token_id(payload, token), float(payload.get("exp", 0)))
 
 async def get_current_organization():
     # Organización eliminada del modelo. Mantener stub por compatibilidad si hay endpoints que aún la declaran.
@@ -0,0 +1,195 @@
+"""Revocación de tokens JWT (logout) por jti, con backends intercambiables.
+
+- memory: dict en proceso (solo válido con un worker).
+- postgres: tabla revoked_tokens, compartida entre workers, con caché local: los jti
+  revocados se recuerdan hasta su exp y los no revocados TOKEN_REVOCATION_CACHE_TTL_SECONDS,
+  así que la mayoría de peticiones no tocan la base de datos.
+- redis: claves con caducidad nativa (requiere el paquete `redis`).
+
+Cada entrada vive hasta el `exp` del token: pasado ese momento el token ya es inválido por sí
+mismo, así que la entrada se descarta.
+"""
+import hashlib
+import heapq
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.cache import TTLCache
+from app.config import settings
+from app.database.postgres import engine
+
+
+def token_id(payload: Dict[str, Any], token: str) -> str:
+    """jti del token; los emitidos antes de incluir jti se identifican por el hash del token."""
+    jti = payload.get("jti")
+    if jti:
+        return str(jti)
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationStore(ABC):
+    name = "base"
+
+    def __init__(self):
+        self.lookups = 0
+        self.revoked_hits = 0
+        self.revocations = 0
+
+    @abstractmethod
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        ...
+
+    @abstractmethod
+    async def is_revoked(self, jti: str) -> bool:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "lookups": self.lookups,
+            "revoked_hits": self.revoked_hits,
+            "revocations": self.revocations,
+        }
+
+
+class MemoryRevocationStore(RevocationStore):
+    """dict jti -> exp más un heap por exp para purgar en O(log n) sin recorrer el dict."""
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, float] = {}
+        self._by_expiry: List[Tuple[float, str]] = []
+
+    def _purge(self, now: float) -> None:
+        while self._by_expiry and self._by_expiry[0][0] <= now:
+            exp, jti = heapq.heappop(self._by_expiry)
+            if self._entries.get(jti) == exp:
+                del self._entries[jti]
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        self._purge(now)
+        if expires_at <= now:
+            return
+        self._entries[jti] = expires_at
+        heapq.heappush(self._by_expiry, (expires_at, jti))
+        self.revocations += 1
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.lookups += 1
+        exp = self._entries.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            del self._entries[jti]
+            return False
+        self.revoked_hits += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "size": len(self._entries)}
+
+
+class PostgresRevocationStore(RevocationStore):
+    """Tabla revoked_tokens (PK jti). Purga las filas caducadas como mucho una vez por intervalo.
+
+    Caché local jti -> revocado: True hasta el exp del token (una revocación no se deshace) y
+    False durante TOKEN_REVOCATION_CACHE_TTL_SECONDS. Un logout se ve al instante en su worker
+    y, en los demás, como mucho tras ese TTL.
+    """
+    name = "postgres"
+    purge_interval = 300.0
+
+    def __init__(self):
+        super().__init__()
+        self._last_purge = 0.0
+        self._cache = TTLCache("token_revocation", maxsize=50_000, ttl=settings.TOKEN_REVOCATION_CACHE_TTL_SECONDS)
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        if expires_at <= now:
+            return
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("""
+                    INSERT INTO revoked_tokens (jti, expires_at) VALUES (:jti, :expires_at)
+                    ON CONFLICT (jti) DO NOTHING
+                """),
+                {"jti": jti, "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc)},
+            )
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                await conn.execute(text("DELETE FROM revoked_tokens WHERE expires_at <= NOW()"))
+        self._cache.set(jti, True, ttl=expires_at - now)
+        self.revocations += 1
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.lookups += 1
+        revoked = self._cache.get(jti)
+        if revoked is None:
+            async with engine.connect() as conn:
+                res = await conn.execute(
+                    text("SELECT expires_at FROM revoked_tokens WHERE jti = :jti AND expires_at > NOW()"),
+                    {"jti": jti},
+                )
+                expires_at = res.scalar_one_or_none()
+            revoked = expires_at is not None
+            if revoked:
+                self._cache.set(jti, True, ttl=max(0.0, expires_at.timestamp() - time.time()))
+            else:
+                self._cache.set(jti, False)
+        if revoked:
+            self.revoked_hits += 1
+        return revoked
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "cached": len(self._cache)}
+
+
+class RedisRevocationStore(RevocationStore):
+    """SET revoked:<jti> con EXAT = exp del token: Redis elimina la clave al caducar."""
+    name = "redis"
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("TOKEN_REVOCATION_BACKEND=redis requiere el paquete 'redis'") from e
+        self._client = redis_asyncio.from_url(url)
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        await self._client.set(f"revoked:{jti}", 1, exat=int(expires_at) + 1)
+        self.revocations += 1
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.lookups += 1
+        revoked = bool(await self._client.exists(f"revoked:{jti}"))
+        if revoked:
+            self.revoked_hits += 1
+        return revoked
+
+
+_store: Optional[RevocationStore] = None
+
+
+def get_revocation_store() -> RevocationStore:
+    global _store
+    if _store is None:
+        backend = settings.TOKEN_REVOCATION_BACKEND.lower()
+        if backend == "memory":
+            _store = MemoryRevocationStore()
+        elif backend == "redis":
+            _store = RedisRevocationStore(settings.REDIS_URL)
+        elif backend == "postgres":
+            _store = PostgresRevocationStore()
+        else:
+            raise RuntimeError(f"TOKEN_REVOCATION_BACKEND desconocido: {settings.TOKEN_REVOCATION_BACKEND}")
+    return _store
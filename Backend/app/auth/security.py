@@ -1,6 +1,10 @@
 import os
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
@@ -23,6 +27,72 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
+
+# bcrypt tarda ~100-300 ms por llamada: dentro de un handler async bloquearía el event loop.
+# Se ejecuta en un pool de hilos acotado (bcrypt libera el GIL) y un semáforo limita las
+# operaciones simultáneas; el resto espera en cola sin bloquear otras peticiones.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+_hash_semaphore: Optional[asyncio.Semaphore] = None
+_hash_stats = {
+    "queued": 0,
+    "in_flight": 0,
+    "max_queued": 0,
+    "completed": 0,
+    "wait_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+}
+
+
+async def _run_hashing(fn: Callable[..., Any], *args) -> Any:
+    global _hash_semaphore
+    if _hash_semaphore is None:
+        _hash_semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+    queued_at = time.perf_counter()
+    _hash_stats["queued"] += 1
+    _hash_stats["max_queued"] = max(_hash_stats["max_queued"], _hash_stats["queued"])
+    try:
+        await _hash_semaphore.acquire()
+    finally:
+        _hash_stats["queued"] -= 1
+    started_at = time.perf_counter()
+    _hash_stats["wait_seconds_total"] += started_at - queued_at
+    _hash_stats["in_flight"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_semaphore.release()
+        _hash_stats["in_flight"] -= 1
+        _hash_stats["completed"] += 1
+        _hash_stats["run_seconds_total"] += time.perf_counter() - started_at
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password ejecutado en el pool de hashing (no bloquea el event loop).
+    """
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    get_password_hash ejecutado en el pool de hashing (no bloquea el event loop).
+    """
+    return await _run_hashing(get_password_hash, password)
+
+
+def password_hashing_stats() -> Dict[str, Any]:
+    completed = _hash_stats["completed"]
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "max_concurrency": settings.PASSWORD_HASH_MAX_CONCURRENCY,
+        "queued": _hash_stats["queued"],
+        "in_flight": _hash_stats["in_flight"],
+        "max_queued": _hash_stats["max_queued"],
+        "completed": completed,
+        "avg_wait_ms": round(_hash_stats["wait_seconds_total"] / completed * 1000, 2) if completed else None,
+        "avg_run_ms": round(_hash_stats["run_seconds_total"] / completed * 1000, 2) if completed else None,
+    }
+
 def create_token(data: dict, expires_delta: Optional[timedelta] = None) -> Tuple[str, datetime]:
     """
     Crea un token JWT con los datos proporcionados y la fecha de expiración.
@@ -35,7 +105,8 @@ def create_token(data: dict, expires_delta: Optional[timedelta] = None) -> Tuple
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # jti: identificador único para poder revocar el token (ver auth/revocation.py)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     
     return encoded_jwt, expire
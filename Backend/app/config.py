@@ -33,8 +33,53 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Revocación de tokens (logout): "postgres" (compartido entre workers), "memory" (un solo proceso) o "redis"
+    TOKEN_REVOCATION_BACKEND: str = os.getenv("TOKEN_REVOCATION_BACKEND", "postgres")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Backend postgres: segundos que un worker recuerda que un jti NO está revocado (retraso máximo
+    # con el que ve un logout hecho en otro worker); los revocados se recuerdan hasta su exp
+    TOKEN_REVOCATION_CACHE_TTL_SECONDS: int = int(os.getenv("TOKEN_REVOCATION_CACHE_TTL_SECONDS", "15"))
+
     # Ventana por defecto (días) para planes de mantenimiento próximos
     UPCOMING_PLANS_WINDOW_DAYS: int = int(os.getenv("UPCOMING_PLANS_WINDOW_DAYS", "30"))
+
+    # Caché de KPIs: TTL (segundos) del cubo semana/mes en curso
+    KPI_CURRENT_BUCKET_TTL_SECONDS: int = int(os.getenv("KPI_CURRENT_BUCKET_TTL_SECONDS", "60"))
+    # TTL (segundos) de los cubos cerrados: acota el desfase en otros workers tras editar datos antiguos
+    KPI_CLOSED_BUCKET_TTL_SECONDS: int = int(os.getenv("KPI_CLOSED_BUCKET_TTL_SECONDS", "600"))
+
+    # Caché de la jerarquía de departamentos: vida máxima de una entrada (la invalidación va por versión)
+    DEPARTMENT_CACHE_TTL_SECONDS: int = int(os.getenv("DEPARTMENT_CACHE_TTL_SECONDS", "60"))
+
+    # Caché del estado activo/inactivo de usuarios autenticados (get_current_user / get_optional_user)
+    USER_STATUS_CACHE_TTL_SECONDS: int = int(os.getenv("USER_STATUS_CACHE_TTL_SECONDS", "30"))
+    USER_STATUS_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_STATUS_CACHE_MAX_ENTRIES", "10000"))
+
+    # Hash/verificación bcrypt fuera del event loop: hilos del pool y operaciones simultáneas
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+    # Exportaciones en streaming: filas leídas del cursor de servidor y emitidas por bloque
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+    # Alertas de stock: horizonte de demanda de planes, plazo de reposición y umbral de stock bajo (días)
+    INVENTORY_FORECAST_DAYS: int = int(os.getenv("INVENTORY_FORECAST_DAYS", "30"))
+    INVENTORY_LEAD_TIME_DAYS: int = int(os.getenv("INVENTORY_LEAD_TIME_DAYS", "7"))
+    INVENTORY_LOW_STOCK_DAYS: int = int(os.getenv("INVENTORY_LOW_STOCK_DAYS", "30"))
+
+    # Planificador de planes de mantenimiento (un solo worker líder vía advisory lock)
+    PLAN_SCHEDULER_ENABLED: bool = os.getenv("PLAN_SCHEDULER_ENABLED", "true").lower() == "true"
+    PLAN_SCHEDULER_INTERVAL_SECONDS: int = int(os.getenv("PLAN_SCHEDULER_INTERVAL_SECONDS", "60"))
+    PLAN_SCHEDULER_BATCH_SIZE: int = int(os.getenv("PLAN_SCHEDULER_BATCH_SIZE", "200"))
+    # Autor de las órdenes generadas; 0 = primer usuario Admin activo
+    PLAN_SCHEDULER_USER_ID: int = int(os.getenv("PLAN_SCHEDULER_USER_ID", "0"))
+
+    # Ocurrencias proyectadas por plan: máximo por plan y horizonte (días)
+    PLAN_OCCURRENCES_MAX: int = int(os.getenv("PLAN_OCCURRENCES_MAX", "120"))
+    PLAN_OCCURRENCES_HORIZON_DAYS: int = int(os.getenv("PLAN_OCCURRENCES_HORIZON_DAYS", "365"))
+
+    # Previsión de carga del planner: TTL (segundos) de cada semana calculada
+    PLANNER_FORECAST_CACHE_TTL_SECONDS: int = int(os.getenv("PLANNER_FORECAST_CACHE_TTL_SECONDS", "300"))
     
     # CORS - Configuración mejorada para desarrollo
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", '["http://localhost:3000", "http://localhost:3001", "http://localhost:3002", "http://localhost:8080", "http://localhost:8000"]')
@@ -2,6 +2,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.asset import Asset
 from app.schemas.asset import AssetCreate, AssetRead, AssetUpdate
+from app.pagination import apply_keyset
+from app.controllers.search import search_filter
+from app.controllers.forecast import forecast_week_cache
 
 async def create_asset(db: AsyncSession, asset_in: AssetCreate):
     """Create a new asset in the database"""
@@ -21,7 +24,8 @@ async def get_assets(
     db: AsyncSession, 
     page: int = 1,
     page_size: int = 20,
-    search: str = None
+    search: str = None,
+    cursor: str | None = None,
 ):
     """Get all assets with pagination and search capability"""
     offset = (page - 1) * page_size
@@ -29,13 +33,14 @@ async def get_assets(
     query = select(Asset)
 
     if search:
-        search_term = f"%{search}%"
-        query = query.where(
-            (Asset.name.ilike(search_term)) | 
-            (Asset.description.ilike(search_term))
-        )
+        # Documento de búsqueda con índice trigram (ver controllers/search.py): evita el seq scan de ILIKE
+        query = query.where(search_filter("asset", search))
     
-    query = query.offset(offset).limit(page_size)
+    # Orden estable (created_at, id); con cursor se continúa por keyset en lugar de OFFSET
+    query = apply_keyset(query, Asset.created_at, Asset.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -59,6 +64,9 @@ async def update_asset(db: AsyncSession, asset_id: int, asset_in: AssetUpdate):
         setattr(asset, key, value)
     
     await db.commit()
+    if "responsible_id" in update_data:
+        # La carga proyectada de los planes se reparte por responsable del activo
+        forecast_week_cache.clear()
     await db.refresh(asset)
     return asset
 
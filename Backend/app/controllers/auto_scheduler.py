@@ -0,0 +1,222 @@
+"""Planificación automática de tareas respetando la capacidad diaria de cada usuario.
+
+Se parte de una matriz densa usuarios × días con las horas libres (capacidad de
+compute_capacity_grid: UserWorkingDay + UserSpecialDay + CompanyHoliday), así que consultar o
+descontar la capacidad que queda es O(1). Primero se colocan las tareas ya planificadas en
+su día, por prioridad: las que no caben (o caen en un día no laborable) pasan a pendientes
+junto con las que no tienen fecha o responsable. Las pendientes se asignan por prioridad al
+primer día con hueco a partir de su fecha, con su responsable o, si se permite reasignar,
+con el usuario de su departamento con más horas libres ese día.
+
+schedule_tasks es el algoritmo puro (lo usan el servicio, el seed y benchmark_scheduler.py);
+auto_schedule_tasks carga los datos, lo ejecuta y, salvo en dry run, aplica los cambios
+(también en las horas planificadas por usuario y día).
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import time as _time
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.controllers.calendar import compute_capacity_grid
+from app.controllers.planned_hours import record_task_loads, task_load
+from app.models.enums import TaskPriority, TaskStatus
+from app.models.task import Task
+from app.models.user import User
+from app.models.workorder import WorkOrder
+
+OPEN_TASK_STATUSES = (TaskStatus.PENDING.value, TaskStatus.IN_PROGRESS.value)
+PRIORITY_RANK = {TaskPriority.HIGH.value: 0, TaskPriority.MEDIUM.value: 1, TaskPriority.LOW.value: 2}
+EPS = 1e-6
+
+
+def _rank(task: Dict[str, Any]) -> Tuple:
+    return (PRIORITY_RANK.get(task["priority"], 1), task["day"] if task["day"] is not None else -1, task["id"])
+
+
+def schedule_tasks(
+    remaining: List[List[float]],
+    fixed: Iterable[Dict[str, Any]],
+    pending: Iterable[Dict[str, Any]],
+    pools: Dict[Optional[int], List[int]],
+    reassign: bool = True,
+) -> Tuple[List[Tuple[Dict[str, Any], int, int]], List[Dict[str, Any]]]:
+    """Coloca tareas sobre `remaining` (horas libres [usuario][día], se modifica en sitio).
+
+    Cada tarea es un dict con id, user (índice o None), day (índice o None), hours, priority y
+    department. `fixed` son las ya planificadas en la ventana; `pending` las que hay que
+    colocar sí o sí. `pools` da, por departamento (None = tareas sin departamento), los índices
+    de usuario candidatos a reasignación; un departamento sin pool no tiene candidatos. Devuelve ([(tarea, usuario, día)] para las que cambian de
+    usuario o día, [tareas sin hueco con su motivo]).
+    """
+    days = len(remaining[0]) if remaining else 0
+    queue = list(pending)
+    for task in sorted(fixed, key=_rank):
+        u, d = task["user"], task["day"]
+        if remaining[u][d] + EPS >= task["hours"] and remaining[u][d] > EPS:
+            remaining[u][d] -= task["hours"]
+        else:
+            queue.append(task)
+
+    placed, unplaced = [], []
+    for task in sorted(queue, key=_rank):
+        preferred, hours = task["user"], task["hours"]
+        first_day = task["day"] if task["day"] is not None else 0
+        pool = pools.get(task["department"], []) if reassign else []
+        if preferred is None and not pool:
+            unplaced.append({**task, "reason": "Sin responsable y sin usuarios elegibles en su departamento"})
+            continue
+        choice = None
+        for d in range(first_day, days):
+            if preferred is not None and remaining[preferred][d] > EPS and remaining[preferred][d] + EPS >= hours:
+                choice = (preferred, d)
+                break
+            best = None
+            for u in pool:
+                free = remaining[u][d]
+                if free > EPS and free + EPS >= hours and (best is None or free > remaining[best][d]):
+                    best = u
+            if best is not None:
+                choice = (best, d)
+                break
+        if choice is None:
+            unplaced.append({**task, "reason": "Sin capacidad suficiente en el horizonte"})
+            continue
+        u, d = choice
+        remaining[u][d] -= hours
+        if (u, d) != (preferred, task["day"]):
+            placed.append((task, u, d))
+    return placed, unplaced
+
+
+async def auto_schedule_tasks(
+    db: AsyncSession,
+    users: Sequence[User],
+    start: date,
+    days: int,
+    task_ids: Optional[Sequence[int]] = None,
+    include_unscheduled: bool = True,
+    reassign: bool = True,
+    statuses: Optional[Sequence[str]] = OPEN_TASK_STATUSES,
+    dry_run: bool = True,
+) -> Dict[str, Any]:
+    """Replanifica las tareas de `users` en [start, start + days). No hace commit.
+
+    Considera sus tareas con due_date en la ventana (en `statuses`; None = todas), las
+    `task_ids` indicadas y, con include_unscheduled, las de la ventana sin fecha o sin
+    responsable de sus departamentos. Con dry_run solo devuelve la propuesta.
+    """
+    started = _time.perf_counter()
+    users = list({u.id: u for u in users}.values())
+    index = {u.id: i for i, u in enumerate(users)}
+    departments = {u.department_id for u in users}
+    pools: Dict[Optional[int], List[int]] = {None: list(range(len(users)))}
+    for i, u in enumerate(users):
+        if u.department_id is not None:
+            pools.setdefault(u.department_id, []).append(i)
+
+    grid = await compute_capacity_grid(db, list(index), start, days)
+    remaining = [[hours or 0.0 for (_, hours, _, _) in grid[u.id]] for u in users]
+
+    start_dt = datetime.combine(start, time.min)
+    end_dt = start_dt + timedelta(days=days)
+    in_window = and_(Task.assigned_to.in_(list(index)), Task.due_date >= start_dt, Task.due_date < end_dt)
+    conditions = [in_window]
+    in_departments = WorkOrder.department_id.in_([d for d in departments if d is not None])
+    if task_ids:
+        # Solo tareas del alcance: de sus usuarios o, sin responsable, de sus departamentos
+        conditions.append(and_(
+            Task.id.in_(task_ids),
+            or_(Task.assigned_to.in_(list(index)), and_(Task.assigned_to.is_(None), in_departments)),
+        ))
+    if include_unscheduled:
+        conditions.append(and_(Task.assigned_to.in_(list(index)), Task.due_date.is_(None)))
+        conditions.append(and_(
+            Task.assigned_to.is_(None),
+            or_(Task.due_date.is_(None), Task.due_date < end_dt),
+            in_departments,
+        ))
+    query = (
+        select(
+            Task.id, Task.assigned_to, Task.due_date, Task.estimated_hours, Task.priority,
+            WorkOrder.department_id.label("wo_department_id"),
+        )
+        .outerjoin(WorkOrder, WorkOrder.id == Task.workorder_id)
+        .where(or_(*conditions))
+    )
+    if statuses:
+        query = query.where(Task.status.in_(statuses))
+    if not dry_run:
+        # Las filas leídas son el "from" de la actualización y de las horas planificadas: se
+        # bloquean (en orden de id) para que update_task/delete_task concurrentes esperen
+        query = query.order_by(Task.id).with_for_update(of=Task)
+    rows = (await db.execute(query)).all()
+
+    explicit = set(task_ids or ())
+    fixed, pending = [], []
+    for row in rows:
+        user = index.get(row.assigned_to)
+        day = (row.due_date.date() - start).days if row.due_date is not None else None
+        if day is not None and not 0 <= day < days:
+            # Fuera de la ventana (tareas pedidas explícitamente o sin responsable): desde el inicio
+            day = None
+        task = {
+            "id": row.id,
+            "user": user,
+            "day": day,
+            "due_date": row.due_date,
+            "assigned_to": row.assigned_to,
+            "hours": float(row.estimated_hours or 0.0),
+            "priority": row.priority,
+            "department": row.wo_department_id if row.wo_department_id is not None
+            else (users[user].department_id if user is not None else None),
+        }
+        if user is not None and day is not None and row.id not in explicit:
+            fixed.append(task)
+        else:
+            pending.append(task)
+
+    placed, unplaced = schedule_tasks(remaining, fixed, pending, pools, reassign)
+
+    assignments = []
+    for task, u, d in placed:
+        original = task["due_date"]
+        new_due = datetime.combine(start + timedelta(days=d), original.time() if original else time.min)
+        assignments.append({
+            "task_id": task["id"],
+            "from_user_id": task["assigned_to"],
+            "to_user_id": users[u].id,
+            "from_due_date": original,
+            "to_due_date": new_due,
+        })
+    if assignments and not dry_run:
+        now = datetime.now(timezone.utc)
+        await db.execute(
+            update(Task).execution_options(synchronize_session=False),
+            [
+                {"id": a["task_id"], "assigned_to": a["to_user_id"], "due_date": a["to_due_date"], "updated_at": now}
+                for a in assignments
+            ],
+        )
+        await record_task_loads(db, [
+            (
+                task_load(a["from_user_id"], a["from_due_date"], task["hours"]),
+                task_load(a["to_user_id"], a["to_due_date"], task["hours"]),
+            )
+            for (task, _, _), a in zip(placed, assignments)
+        ])
+    return {
+        "dry_run": dry_run,
+        "assignments": assignments,
+        "unscheduled": [{"task_id": t["id"], "reason": t["reason"]} for t in unplaced],
+        "stats": {
+            "users": len(users),
+            "days": days,
+            "tasks_considered": len(rows),
+            "moved": sum(1 for a in assignments if a["from_due_date"] is not None and a["from_due_date"] != a["to_due_date"]),
+            "reassigned": sum(1 for a in assignments if a["from_user_id"] != a["to_user_id"]),
+            "unscheduled": len(unplaced),
+            "elapsed_ms": round((_time.perf_counter() - started) * 1000, 2),
+        },
+    }
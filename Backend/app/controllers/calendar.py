@@ -1,56 +1,96 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from datetime import date, timedelta
-from typing import List, Dict, Tuple
-from app.models.calendar import UserWorkingDay, UserSpecialDay
-from app.schemas.calendar import WorkingDayPattern, SpecialDayCreate, SpecialDayUpdate
+from typing import List, Dict, Tuple, Iterable, Optional, Sequence
+from app.models.calendar import UserWorkingDay, UserSpecialDay, CompanyHoliday
+from app.schemas.calendar import WorkingDayPattern, SpecialDayCreate, SpecialDayUpdate, CompanyHolidayCreate
 from app.models.user import User
-from app.models.department import Department
-from sqlalchemy import and_
+from app.controllers.department import list_users_managed_by
+from sqlalchemy import and_, cast, func, literal, literal_column, true, Date, Float, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
-async def add_vacation_range(db: AsyncSession, user_id: int, start: date, end: date, reason: str | None = None):
-    # Crear días especiales no laborables para cada fecha en rango
-    cur = start
-    created = []
-    while cur <= end:
-        res = await db.execute(select(UserSpecialDay).where(UserSpecialDay.user_id == user_id, UserSpecialDay.date == cur))
-        row = res.scalar_one_or_none()
-        if row:
-            row.is_working = False
-            row.hours = 0.0
-            row.reason = reason or row.reason
-        else:
-            row = UserSpecialDay(user_id=user_id, date=cur, is_working=False, hours=0.0, reason=reason)
-            db.add(row)
-        created.append(row)
-        cur += timedelta(days=1)
+
+def _invalidate_forecast(*days: date, start: Optional[date] = None, end: Optional[date] = None) -> None:
+    """Descarta la previsión de carga de las semanas afectadas (todas si no se indica nada). Tras el commit."""
+    from app.controllers.forecast import forecast_week_cache, invalidate_forecast_days, invalidate_forecast_range  # evita ciclo
+    if start is not None:
+        invalidate_forecast_range(start, end)
+    elif days:
+        invalidate_forecast_days(*days)
+    else:
+        forecast_week_cache.clear()
+
+
+def _special_days_upsert(user_ids: Sequence[int], start: date, end: date, is_working: bool, hours: Optional[float], reason: Optional[str]):
+    """INSERT ... SELECT usuarios × fechas ON CONFLICT (user_id, date) DO UPDATE, en una sentencia.
+
+    Un reason vacío conserva el que ya tuviera el día.
+    """
+    users = func.unnest(cast(list(dict.fromkeys(user_ids)), ARRAY(Integer))).table_valued("user_id").render_derived()
+    days = func.generate_series(start, end, literal_column("interval '1 day'")).table_valued("day").render_derived()
+    rows = select(
+        users.c.user_id,
+        cast(days.c.day, Date),
+        literal(is_working),
+        literal(hours, Float),
+        literal(reason or None, String),
+    ).select_from(users).join(days, true())
+    stmt = pg_insert(UserSpecialDay).from_select(["user_id", "date", "is_working", "hours", "reason"], rows)
+    return stmt.on_conflict_do_update(
+        constraint="uq_user_date",
+        set_={
+            "is_working": stmt.excluded.is_working,
+            "hours": stmt.excluded.hours,
+            "reason": func.coalesce(stmt.excluded.reason, UserSpecialDay.reason),
+        },
+    )
+
+
+async def upsert_special_day_range(
+    db: AsyncSession,
+    user_ids: Sequence[int],
+    start: date,
+    end: date,
+    is_working: bool = False,
+    hours: Optional[float] = 0.0,
+    reason: Optional[str] = None,
+) -> List[UserSpecialDay]:
+    """Crea o sobrescribe los días especiales de [start, end] para los usuarios dados y hace commit."""
+    if not user_ids or end < start:
+        return []
+    stmt = _special_days_upsert(user_ids, start, end, is_working, hours, reason).returning(UserSpecialDay)
+    res = await db.execute(select(UserSpecialDay).from_statement(stmt).execution_options(populate_existing=True))
+    rows = sorted(res.scalars().all(), key=lambda r: (r.user_id, r.date))
     await db.commit()
-    for r in created:
-        await db.refresh(r)
-    return created
+    _invalidate_forecast(start=start, end=end)
+    return rows
+
+
+async def bulk_upsert_special_days(
+    db: AsyncSession,
+    user_ids: Sequence[int],
+    start: date,
+    end: date,
+    is_working: bool = False,
+    hours: Optional[float] = 0.0,
+    reason: Optional[str] = None,
+) -> int:
+    """Como upsert_special_day_range pero sin devolver las filas (departamentos enteros). Devuelve cuántas escribió."""
+    if not user_ids or end < start:
+        return 0
+    res = await db.execute(_special_days_upsert(user_ids, start, end, is_working, hours, reason))
+    await db.commit()
+    _invalidate_forecast(start=start, end=end)
+    return res.rowcount
+
+
+async def add_vacation_range(db: AsyncSession, user_id: int, start: date, end: date, reason: str | None = None):
+    # Días especiales no laborables para cada fecha del rango (un solo upsert)
+    return await upsert_special_day_range(db, [user_id], start, end, is_working=False, hours=0.0, reason=reason)
 
 async def list_team_vacations(db: AsyncSession, manager_user_id: int, start: date, end: date):
-    # Obtener árbol departamentos
-    dep_res = await db.execute(select(Department).where(Department.manager_id == manager_user_id))
-    managed = dep_res.scalars().all()
-    if not managed:
-        return []
-    all_dep = (await db.execute(select(Department))).scalars().all()
-    by_parent = {}
-    for d in all_dep:
-        by_parent.setdefault(d.parent_id, []).append(d)
-    target = set()
-    stack = [d.id for d in managed]
-    while stack:
-        cur = stack.pop()
-        if cur in target:
-            continue
-        target.add(cur)
-        for ch in by_parent.get(cur, []):
-            stack.append(ch.id)
-    # Usuarios
-    user_res = await db.execute(select(User).where(User.department_id.in_(target)))
-    users = user_res.scalars().all()
+    # Usuarios bajo su gestión (tabla de cierre de departamentos)
+    users = await list_users_managed_by(db, manager_user_id)
     user_ids = [u.id for u in users]
     if not user_ids:
         return []
@@ -70,6 +110,12 @@ async def list_team_vacations(db: AsyncSession, manager_user_id: int, start: dat
     return result
 
 
+# Patrón por defecto para usuarios sin filas en user_working_days: L-V 8h, S/D 0h
+DEFAULT_PATTERN: Dict[int, float] = {wd: (8.0 if wd < 5 else 0.0) for wd in range(7)}
+
+CapacityRow = Tuple[date, float, bool, Optional[str]]
+
+
 async def get_or_create_default_pattern(db: AsyncSession, user_id: int):
     res = await db.execute(select(UserWorkingDay).where(UserWorkingDay.user_id == user_id))
     rows = res.scalars().all()
@@ -77,8 +123,7 @@ async def get_or_create_default_pattern(db: AsyncSession, user_id: int):
         return rows
     # Default: Mon-Fri 8h, Sat/Sun 0h
     defaults = []
-    for wd in range(7):
-        hours = 8.0 if wd < 5 else 0.0
+    for wd, hours in DEFAULT_PATTERN.items():
         defaults.append(UserWorkingDay(user_id=user_id, weekday=wd, hours=hours, is_active=True))
     db.add_all(defaults)
     await db.commit()
@@ -98,6 +143,7 @@ async def set_pattern(db: AsyncSession, user_id: int, pattern: List[WorkingDayPa
         new_rows.append(UserWorkingDay(user_id=user_id, weekday=p.weekday, hours=p.hours, is_active=p.is_active))
     db.add_all(new_rows)
     await db.commit()
+    _invalidate_forecast()
     return new_rows
 
 
@@ -118,11 +164,13 @@ async def add_special_day(db: AsyncSession, user_id: int, data: SpecialDayCreate
         existing.hours = data.hours
         existing.reason = data.reason
         await db.commit()
+        _invalidate_forecast(data.date)
         await db.refresh(existing)
         return existing
     row = UserSpecialDay(user_id=user_id, date=data.date, is_working=data.is_working, hours=data.hours, reason=data.reason)
     db.add(row)
     await db.commit()
+    _invalidate_forecast(data.date)
     await db.refresh(row)
     return row
 
@@ -139,15 +187,19 @@ async def delete_special_day(db: AsyncSession, user_id: int, special_id: int) ->
         return False
     await db.delete(row)
     await db.commit()
+    _invalidate_forecast(row.date)
     return True
 
 
-async def compute_capacity_week(db: AsyncSession, user_id: int, start: date, days: int):
-    # patterns
-    pattern_rows = await list_pattern(db, user_id)
-    pattern_map = {r.weekday: (r.hours if r.is_active else 0.0) for r in pattern_rows}
-    special_rows = await list_special_days(db, user_id, start, start + timedelta(days=days-1))
-    special_map = {r.date: r for r in special_rows}
+def _capacity_rows(
+    pattern_map: Dict[int, float],
+    special_map: Dict[date, UserSpecialDay],
+    start: date,
+    days: int,
+    holidays: Optional[Dict[date, Optional[str]]] = None,
+) -> List[CapacityRow]:
+    # Prioridad: día especial del usuario > festivo de empresa > patrón semanal
+    holidays = holidays or {}
     result = []
     for i in range(days):
         d = start + timedelta(days=i)
@@ -159,12 +211,97 @@ async def compute_capacity_week(db: AsyncSession, user_id: int, start: date, day
             else:
                 hrs = special.hours if special.hours is not None else pattern_map.get(weekday, 0.0)
                 result.append((d, hrs, False, special.reason))
+        elif d in holidays:
+            result.append((d, 0.0, True, holidays[d]))
         else:
             hrs = pattern_map.get(weekday, 0.0)
             is_non = hrs == 0.0
             result.append((d, hrs, is_non, None))
     return result
 
+
+async def get_holiday_map(db: AsyncSession, start: date, end: date) -> Dict[date, Optional[str]]:
+    res = await db.execute(select(CompanyHoliday.date, CompanyHoliday.reason).where(CompanyHoliday.date >= start, CompanyHoliday.date <= end))
+    return dict(res.all())
+
+
+async def compute_capacity_week(db: AsyncSession, user_id: int, start: date, days: int):
+    # patterns
+    pattern_rows = await list_pattern(db, user_id)
+    pattern_map = {r.weekday: (r.hours if r.is_active else 0.0) for r in pattern_rows}
+    end = start + timedelta(days=days-1)
+    special_rows = await list_special_days(db, user_id, start, end)
+    special_map = {r.date: r for r in special_rows}
+    return _capacity_rows(pattern_map, special_map, start, days, await get_holiday_map(db, start, end))
+
+
+async def compute_capacity_grid(db: AsyncSession, user_ids: Iterable[int], start: date, days: int) -> Dict[int, List[CapacityRow]]:
+    """Capacidad de un conjunto de usuarios en tres consultas (patrones, días especiales y festivos).
+
+    Solo lectura: a los usuarios sin patrón se les aplica DEFAULT_PATTERN en memoria, sin persistirlo.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    end = start + timedelta(days=days-1)
+
+    pattern_res = await db.execute(
+        select(UserWorkingDay.user_id, UserWorkingDay.weekday, UserWorkingDay.hours, UserWorkingDay.is_active)
+        .where(UserWorkingDay.user_id.in_(user_ids))
+    )
+    patterns: Dict[int, Dict[int, float]] = {}
+    for user_id, weekday, hours, is_active in pattern_res.all():
+        patterns.setdefault(user_id, {})[weekday] = hours if is_active else 0.0
+
+    special_res = await db.execute(
+        select(UserSpecialDay).where(
+            UserSpecialDay.user_id.in_(user_ids),
+            UserSpecialDay.date >= start,
+            UserSpecialDay.date <= end,
+        )
+    )
+    specials: Dict[int, Dict[date, UserSpecialDay]] = {}
+    for row in special_res.scalars().all():
+        specials.setdefault(row.user_id, {})[row.date] = row
+
+    holidays = await get_holiday_map(db, start, end)
+    return {
+        uid: _capacity_rows(patterns.get(uid, DEFAULT_PATTERN), specials.get(uid, {}), start, days, holidays)
+        for uid in user_ids
+    }
+
 async def is_non_working(db: AsyncSession, user_id: int, d: date) -> bool:
     rows = await compute_capacity_week(db, user_id, d, 1)
     return rows[0][1] == 0.0
+
+
+async def list_company_holidays(db: AsyncSession, start: date, end: date) -> List[CompanyHoliday]:
+    res = await db.execute(select(CompanyHoliday).where(CompanyHoliday.date >= start, CompanyHoliday.date <= end).order_by(CompanyHoliday.date))
+    return res.scalars().all()
+
+
+async def upsert_company_holidays(db: AsyncSession, holidays: List[CompanyHolidayCreate]) -> List[CompanyHoliday]:
+    """Carga el calendario de festivos (p.ej. el del año) en un solo upsert por fecha y hace commit."""
+    by_date = {h.date: h.reason for h in holidays}  # la última gana si se repite una fecha
+    if not by_date:
+        return []
+    stmt = pg_insert(CompanyHoliday).values([{"date": d, "reason": r} for d, r in by_date.items()])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CompanyHoliday.date], set_={"reason": stmt.excluded.reason}
+    ).returning(CompanyHoliday)
+    res = await db.execute(select(CompanyHoliday).from_statement(stmt).execution_options(populate_existing=True))
+    rows = sorted(res.scalars().all(), key=lambda r: r.date)
+    await db.commit()
+    _invalidate_forecast(*by_date)
+    return rows
+
+
+async def delete_company_holiday(db: AsyncSession, holiday_id: int) -> bool:
+    res = await db.execute(select(CompanyHoliday).where(CompanyHoliday.id == holiday_id))
+    row = res.scalar_one_or_none()
+    if not row:
+        return False
+    await db.delete(row)
+    await db.commit()
+    _invalidate_forecast(row.date)
+    return True
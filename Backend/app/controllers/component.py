@@ -5,6 +5,7 @@ from app.models.component import Component
 from app.models.asset import Asset
 from app.schemas.component import ComponentCreate, ComponentUpdate
 from typing import List, Optional
+from app.pagination import apply_keyset
 
 async def create_component(db: AsyncSession, component_in: ComponentCreate):
     """Crear un nuevo componente"""
@@ -28,7 +29,8 @@ async def create_component(db: AsyncSession, component_in: ComponentCreate):
     return db_component
 
 async def get_components(db: AsyncSession, asset_id: Optional[int] = None, 
-                       skip: int = 0, limit: int = 100) -> List[Component]:
+                       skip: int = 0, limit: int = 100,
+                       cursor: Optional[str] = None) -> List[Component]:
     """Obtener componentes con filtros opcionales"""
     
     stmt = select(Component)
@@ -39,7 +41,12 @@ async def get_components(db: AsyncSession, asset_id: Optional[int] = None,
     stmt = stmt.options(
         selectinload(Component.asset),
         selectinload(Component.responsible)
-    ).offset(skip).limit(limit).order_by(Component.created_at.desc())
+    )
+    # Con cursor se continúa por keyset (created_at, id) en lugar de OFFSET
+    stmt = apply_keyset(stmt, Component.created_at, Component.id, cursor)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    stmt = stmt.limit(limit)
     
     result = await db.execute(stmt)
     return result.scalars().all()
@@ -1,13 +1,122 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List, Dict
+from sqlalchemy import text
+from typing import Iterable, List, Dict, Set, FrozenSet
 
-from app.models.department import Department
+from app.cache import TTLCache
+from app.config import settings
+from app.models.department import Department, DepartmentClosure, DepartmentHierarchyVersion
 from app.models.user import User
 from app.schemas.department import DepartmentCreate, DepartmentUpdate
 
 
+# ---------------------------------------------------------------------------
+# Jerarquía: tabla de cierre + caché versionada
+# ---------------------------------------------------------------------------
+
+# Las entradas llevan en la clave la versión de department_hierarchy_version, que sube en la
+# transacción de la reconstrucción: tras el commit ningún worker vuelve a coincidir con las viejas.
+_subtree_cache = TTLCache("department_subtrees", maxsize=4096, ttl=settings.DEPARTMENT_CACHE_TTL_SECONDS)
+
+_BUMP_VERSION_SQL = """
+INSERT INTO department_hierarchy_version (id, version) VALUES (1, 1)
+ON CONFLICT (id) DO UPDATE SET version = department_hierarchy_version.version + 1
+"""
+
+_REBUILD_CLOSURE_SQL = """
+INSERT INTO department_closure (ancestor_id, descendant_id, depth)
+WITH RECURSIVE tree AS (
+    SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM departments
+    UNION ALL
+    SELECT t.ancestor_id, d.id, t.depth + 1
+    FROM tree t JOIN departments d ON d.parent_id = t.descendant_id
+    WHERE t.depth < 64  -- corta ciclos accidentales en parent_id
+)
+SELECT ancestor_id, descendant_id, MIN(depth) FROM tree GROUP BY ancestor_id, descendant_id
+"""
+
+
+async def rebuild_department_closure(db: AsyncSession) -> None:
+    """Recalcula department_closure desde parent_id. No hace commit (va en la transacción del cambio)."""
+    await db.flush()
+    await db.execute(text("LOCK TABLE department_closure IN EXCLUSIVE MODE"))
+    await db.execute(text("DELETE FROM department_closure"))
+    await db.execute(text(_REBUILD_CLOSURE_SQL))
+    await db.execute(text(_BUMP_VERSION_SQL))
+
+
+async def _hierarchy_version(db: AsyncSession) -> int:
+    """Versión confirmada de la jerarquía (lectura por clave primaria).
+
+    Se lee antes que el cierre: si una reconstrucción confirma entre medias, lo cacheado es
+    más nuevo que su clave, nunca al revés.
+    """
+    res = await db.execute(select(DepartmentHierarchyVersion.version).where(DepartmentHierarchyVersion.id == 1))
+    return res.scalar_one_or_none() or 0
+
+
+async def get_subtree_department_ids(db: AsyncSession, dep_ids: Iterable[int]) -> FrozenSet[int]:
+    """Departamentos en los subárboles de dep_ids (incluidos ellos mismos)."""
+    roots = frozenset(d for d in dep_ids if d is not None)
+    if not roots:
+        return frozenset()
+    key = (await _hierarchy_version(db), "subtree", roots)
+    cached = _subtree_cache.get(key)
+    if cached is not None:
+        return cached
+    res = await db.execute(
+        select(DepartmentClosure.descendant_id).where(DepartmentClosure.ancestor_id.in_(roots)).distinct()
+    )
+    subtree = frozenset(res.scalars().all())
+    _subtree_cache.set(key, subtree)
+    return subtree
+
+
+async def get_managed_department_ids(db: AsyncSession, manager_user_id: int) -> FrozenSet[int]:
+    """Departamentos gestionados por el usuario y todos sus descendientes."""
+    key = (await _hierarchy_version(db), "manager", manager_user_id)
+    cached = _subtree_cache.get(key)
+    if cached is not None:
+        return cached
+    res = await db.execute(
+        select(DepartmentClosure.descendant_id)
+        .join(Department, Department.id == DepartmentClosure.ancestor_id)
+        .where(Department.manager_id == manager_user_id)
+        .distinct()
+    )
+    managed = frozenset(res.scalars().all())
+    _subtree_cache.set(key, managed)
+    return managed
+
+
+async def is_department_in_subtree(db: AsyncSession, dep_id: int | None, root_id: int | None) -> bool:
+    if dep_id is None or root_id is None:
+        return False
+    return dep_id in await get_subtree_department_ids(db, [root_id])
+
+
+async def list_users_managed_by(db: AsyncSession, manager_user_id: int) -> List[User]:
+    """Usuarios de los departamentos (y subdepartamentos) que gestiona manager_user_id, en una consulta."""
+    managed = (
+        select(DepartmentClosure.descendant_id)
+        .join(Department, Department.id == DepartmentClosure.ancestor_id)
+        .where(Department.manager_id == manager_user_id)
+    )
+    res = await db.execute(select(User).where(User.department_id.in_(managed)))
+    return res.scalars().all()
+
+
+async def get_subordinate_user_ids(db: AsyncSession, manager_user_id: int) -> List[int]:
+    managed = (
+        select(DepartmentClosure.descendant_id)
+        .join(Department, Department.id == DepartmentClosure.ancestor_id)
+        .where(Department.manager_id == manager_user_id)
+    )
+    res = await db.execute(select(User.id).where(User.department_id.in_(managed)))
+    return list(res.scalars().all())
+
+
 async def create_department(db: AsyncSession, dep_in: DepartmentCreate) -> Department:
     dep = Department(
         name=dep_in.name,
@@ -17,6 +126,7 @@ async def create_department(db: AsyncSession, dep_in: DepartmentCreate) -> Depar
         is_active=dep_in.is_active if dep_in.is_active is not None else True,
     )
     db.add(dep)
+    await rebuild_department_closure(db)
     await db.commit()
     await db.refresh(dep)
     return dep
@@ -35,6 +145,8 @@ async def update_department(db: AsyncSession, dep_id: int, dep_in: DepartmentUpd
     data = dep_in.model_dump(exclude_unset=True)
     for k, v in data.items():
         setattr(dep, k, v)
+    if "parent_id" in data or "manager_id" in data:
+        await rebuild_department_closure(db)
     await db.commit()
     await db.refresh(dep)
     return dep
@@ -46,6 +158,7 @@ async def delete_department(db: AsyncSession, dep_id: int) -> bool:
     if not dep:
         return False
     await db.delete(dep)
+    await rebuild_department_closure(db)
     await db.commit()
     return True
 
@@ -75,22 +188,12 @@ async def get_department_tree(db: AsyncSession) -> List[Department]:
 
 
 async def list_users_in_department_subtree(db: AsyncSession, dep_id: int) -> List[User]:
-    # Get all departments first
-    result = await db.execute(select(Department))
-    deps = result.scalars().all()
-    # Build adjacency
-    by_parent: Dict[int | None, List[int]] = {}
-    for d in deps:
-        by_parent.setdefault(d.parent_id, []).append(d.id)
-
-    # Collect subtree ids
-    to_visit = [dep_id]
-    subtree_ids: List[int] = []
-    while to_visit:
-        cur = to_visit.pop()
-        subtree_ids.append(cur)
-        to_visit.extend(by_parent.get(cur, []))
-
-    # Query users with department_id in subtree
-    result_users = await db.execute(select(User).where(User.department_id.in_(subtree_ids)))
+    subtree = select(DepartmentClosure.descendant_id).where(DepartmentClosure.ancestor_id == dep_id)
+    result_users = await db.execute(select(User).where(User.department_id.in_(subtree)))
     return result_users.scalars().all()
+
+
+async def ensure_department_closure(db: AsyncSession) -> None:
+    """Reconstruye la tabla de cierre al arrancar (cubre departamentos creados fuera del controlador, p.ej. el seed)."""
+    await rebuild_department_closure(db)
+    await db.commit()
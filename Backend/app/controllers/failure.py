@@ -6,8 +6,11 @@ from app.models.component import Component
 from app.schemas.failure import FailureCreate, FailureRead, FailureUpdate
 from datetime import datetime, timezone
 import enum as _py_enum
-from app.models.enums import FailureStatus, FailureSeverity
+from app.models.enums import FailureStatus
 from sqlalchemy.orm import selectinload
+from app.controllers.kpi_rollup import record_failure_change, failure_snapshot
+from app.pagination import apply_keyset
+from app.controllers.search import search_filter
 
 async def create_failure(db: AsyncSession, failure_in: FailureCreate, reported_by: int):
     """Create a new failure report"""
@@ -37,18 +40,16 @@ async def create_failure(db: AsyncSession, failure_in: FailureCreate, reported_b
     
     failure_data = failure_in.model_dump(exclude_none=True)
     failure_data['reported_by'] = reported_by
-    # Ensure status and severity are stored as the enum value strings expected by the DB
+    # severity ya llega normalizada (FailureCreate); el estado inicial es siempre REPORTED
     failure_data['status'] = FailureStatus.REPORTED.value
 
-    sev = failure_data.get('severity')
-    if sev is not None:
-        if isinstance(sev, _py_enum.Enum):
-            failure_data['severity'] = sev.value
-        else:
-            failure_data['severity'] = str(sev).upper()
+    # Fijar reported_date en la app para poder registrar los acumulados de KPI en la misma transacción
+    failure_data.setdefault('reported_date', datetime.now(timezone.utc))
 
     new_failure = Failure(**failure_data)
     db.add(new_failure)
+    await db.flush()
+    await record_failure_change(db, None, await failure_snapshot(db, new_failure))
     await db.commit()
     await db.refresh(new_failure)
     return new_failure
@@ -66,7 +67,8 @@ async def get_failures(
     page_size: int = 20,
     search: str = None,
     status: str = None,
-    severity: str = None
+    severity: str = None,
+    cursor: str | None = None,
 ):
     """Get all failures with filters, pagination and search capability"""
     offset = (page - 1) * page_size
@@ -74,28 +76,29 @@ async def get_failures(
     query = select(Failure)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.where(
-            (Failure.description.ilike(search_term)) |
-            (Failure.resolution_notes.ilike(search_term))
-        )
+        # Documento de búsqueda con índice trigram (ver controllers/search.py): evita el seq scan de ILIKE
+        query = query.where(search_filter("failure", search))
     
     if status:
         # normalize incoming filter to enum value
         if isinstance(status, _py_enum.Enum):
             status_val = status.value
         else:
-            status_val = str(status).upper()
+            status_val = str(status).strip().upper()
         query = query.where(Failure.status == status_val)
 
     if severity:
         if isinstance(severity, _py_enum.Enum):
             severity_val = severity.value
         else:
-            severity_val = str(severity).upper()
+            severity_val = str(severity).strip().upper()
         query = query.where(Failure.severity == severity_val)
     
-    query = query.offset(offset).limit(page_size).order_by(Failure.reported_date.desc())
+    # Orden estable (reported_date, id); con cursor se continúa por keyset en lugar de OFFSET
+    query = apply_keyset(query, Failure.reported_date, Failure.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -140,56 +143,49 @@ async def get_failures_by_asset(db: AsyncSession, asset_id: int):
     )
     return result.scalars().all()
 
-async def update_failure(db: AsyncSession, failure_id: int, failure_in: FailureUpdate):
-    """Update a failure by ID"""
+async def _lock_failure(db: AsyncSession, failure_id: int) -> Failure | None:
+    """Carga el fallo con FOR UPDATE y valores frescos: el snapshot "old" de los acumulados KPI sale de la fila bloqueada."""
     result = await db.execute(
-        select(Failure).where(Failure.id == failure_id)
+        select(Failure).where(Failure.id == failure_id).with_for_update().execution_options(populate_existing=True)
     )
-    failure = result.scalar_one_or_none()
+    return result.scalar_one_or_none()
+
+async def update_failure(db: AsyncSession, failure_id: int, failure_in: FailureUpdate):
+    """Update a failure by ID"""
+    failure = await _lock_failure(db, failure_id)
     
     if failure is None:
         return None
     
+    old_snapshot = await failure_snapshot(db, failure)
     update_data = failure_in.model_dump(exclude_unset=True)
     
-    # Si se marca como resuelto y no tenía fecha de resolución, agregarla
-    status_in = update_data.get('status')
-    if status_in is not None:
-        if isinstance(status_in, _py_enum.Enum):
-            status_norm = status_in.value
-        else:
-            status_norm = str(status_in).upper()
-        update_data['status'] = status_norm
-        if status_norm == FailureStatus.RESOLVED.value and not failure.resolved_date:
-            update_data['resolved_date'] = datetime.now(timezone.utc)
-
-    # Normalize severity if present
-    sev_in = update_data.get('severity')
-    if sev_in is not None:
-        if isinstance(sev_in, _py_enum.Enum):
-            update_data['severity'] = sev_in.value
-        else:
-            update_data['severity'] = str(sev_in).upper()
+    # status/severity ya llegan normalizados (FailureUpdate). Si se marca como resuelto y no
+    # tenía fecha de resolución, agregarla
+    if update_data.get('status') == FailureStatus.RESOLVED.value and not failure.resolved_date:
+        update_data['resolved_date'] = datetime.now(timezone.utc)
 
     for key, value in update_data.items():
         setattr(failure, key, value)
     
     failure.updated_at = datetime.now(timezone.utc)
     
+    await db.flush()
+    await record_failure_change(db, old_snapshot, await failure_snapshot(db, failure))
     await db.commit()
     await db.refresh(failure)
     return failure
 
 async def delete_failure(db: AsyncSession, failure_id: int):
     """Delete a failure by ID"""
-    result = await db.execute(
-        select(Failure).where(Failure.id == failure_id)
-    )
-    failure = result.scalar_one_or_none()
+    failure = await _lock_failure(db, failure_id)
     
     if failure is None:
         return False
     
+    old_snapshot = await failure_snapshot(db, failure)
     await db.delete(failure)
+    await db.flush()
+    await record_failure_change(db, old_snapshot, None)
     await db.commit()
     return True
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Previsión de carga de trabajo frente a capacidad para las próximas semanas.
+
+La carga de cada usuario y día suma las horas estimadas de sus tareas pendientes con
+due_date ese día y las de las ocurrencias proyectadas de planes (plan_occurrences) cuyos
+activos tiene como responsable; las ocurrencias de activos sin responsable se devuelven
+aparte como carga sin asignar. La capacidad sale de compute_capacity_grid.
+
+Todo se calcula en una pasada sobre matrices densas usuarios × días (dos consultas
+agregadas + la rejilla de capacidad) y se guarda por semana en caché: una petición solo
+recalcula el tramo de semanas que falte. Las escrituras de tareas, días especiales y
+festivos descartan tras el commit las semanas que tocan (invalidate_forecast_days /
+invalidate_forecast_range); los cambios de planes, patrones o responsables de activos vacían
+la caché. En otros workers las semanas caducan con PLANNER_FORECAST_CACHE_TTL_SECONDS.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.config import settings
+from app.controllers.calendar import compute_capacity_grid
+from app.models.asset import Asset
+from app.models.enums import TaskStatus
+from app.models.maintenancePlan import PlanOccurrence
+from app.models.task import Task
+from app.models.user import User
+
+OPEN_TASK_STATUSES = (TaskStatus.PENDING.value, TaskStatus.IN_PROGRESS.value)
+
+# (usuarios del alcance, lunes de la semana) -> {user_id: semana, None: sin asignar}
+forecast_week_cache = TTLCache("planner_forecast_weeks", maxsize=2048, ttl=settings.PLANNER_FORECAST_CACHE_TTL_SECONDS)
+
+WeekBlock = Dict[str, float]
+
+
+def _monday(d: date) -> date:
+    if isinstance(d, datetime):
+        d = d.date()
+    return d - timedelta(days=d.weekday())
+
+
+def invalidate_forecast_range(start: date, end: date) -> None:
+    """Descarta las semanas en caché que solapan [start, end]. Llamar tras el commit."""
+    first, last = _monday(start), _monday(end)
+    forecast_week_cache.invalidate_where(lambda key: first <= key[2] <= last)
+
+
+def invalidate_forecast_days(*days: Optional[date]) -> None:
+    """Descarta las semanas en caché que contienen esos días (date o datetime; None se ignora). Tras el commit."""
+    mondays = {_monday(d) for d in days if d is not None}
+    if mondays:
+        forecast_week_cache.invalidate_where(lambda key: key[2] in mondays)
+
+
+def _week(capacity: Sequence[float], tasks: Sequence[float], projected: Sequence[float]) -> WeekBlock:
+    cap, task_h, proj_h = sum(capacity), sum(tasks), sum(projected)
+    load = task_h + proj_h
+    return {
+        "capacity_hours": round(cap, 2),
+        "task_hours": round(task_h, 2),
+        "projected_hours": round(proj_h, 2),
+        "load_hours": round(load, 2),
+        "free_hours": round(max(0.0, cap - load), 2),
+        "utilization": round(load / cap, 4) if cap > 0 else None,
+    }
+
+
+async def _compute_weeks(
+    db: AsyncSession,
+    user_ids: Tuple[int, ...],
+    include_unassigned: bool,
+    start: date,
+    weeks: int,
+) -> Dict[date, Dict[Optional[int], WeekBlock]]:
+    """Calcula `weeks` semanas desde `start` (lunes) para los usuarios dados en una pasada."""
+    days = weeks * 7
+    end = start + timedelta(days=days)
+    start_dt, end_dt = datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+    index = {uid: i for i, uid in enumerate(user_ids)}
+
+    capacity = [[0.0] * days for _ in user_ids]
+    tasks = [[0.0] * days for _ in user_ids]
+    projected = [[0.0] * days for _ in user_ids]
+    unassigned = [0.0] * days
+
+    grid = await compute_capacity_grid(db, user_ids, start, days)
+    for uid, rows in grid.items():
+        row = capacity[index[uid]]
+        for d, (_, hours, _, _) in enumerate(rows):
+            row[d] = hours or 0.0
+
+    if user_ids:
+        day = cast(Task.due_date, Date)
+        res = await db.execute(
+            select(Task.assigned_to, day, func.sum(func.coalesce(Task.estimated_hours, 0)))
+            .where(
+                Task.assigned_to.in_(user_ids),
+                Task.status.in_(OPEN_TASK_STATUSES),
+                Task.due_date >= start_dt,
+                Task.due_date < end_dt,
+            )
+            .group_by(Task.assigned_to, day)
+        )
+        for uid, d, hours in res.all():
+            tasks[index[uid]][(d - start).days] += float(hours or 0)
+
+    responsible = Asset.responsible_id
+    scope = responsible.in_(user_ids) if user_ids else None
+    if include_unassigned:
+        scope = responsible.is_(None) if scope is None else scope | responsible.is_(None)
+    if scope is not None:
+        day = cast(PlanOccurrence.due_date, Date)
+        res = await db.execute(
+            select(responsible, day, func.sum(func.coalesce(PlanOccurrence.estimated_duration, 0)))
+            .select_from(PlanOccurrence)
+            .outerjoin(Asset, Asset.id == PlanOccurrence.asset_id)
+            .where(PlanOccurrence.due_date >= start_dt, PlanOccurrence.due_date < end_dt, scope)
+            .group_by(responsible, day)
+        )
+        for uid, d, hours in res.all():
+            offset = (d - start).days
+            if uid is None:
+                unassigned[offset] += float(hours or 0)
+            else:
+                projected[index[uid]][offset] += float(hours or 0)
+
+    result: Dict[date, Dict[Optional[int], WeekBlock]] = {}
+    for w in range(weeks):
+        a, b = w * 7, w * 7 + 7
+        block: Dict[Optional[int], WeekBlock] = {
+            uid: _week(capacity[i][a:b], tasks[i][a:b], projected[i][a:b]) for uid, i in index.items()
+        }
+        if include_unassigned:
+            block[None] = _week([], [], unassigned[a:b])
+        result[start + timedelta(weeks=w)] = block
+    return result
+
+
+def _sum_weeks(blocks: Sequence[WeekBlock]) -> WeekBlock:
+    cap = sum(b["capacity_hours"] for b in blocks)
+    task_h = sum(b["task_hours"] for b in blocks)
+    proj_h = sum(b["projected_hours"] for b in blocks)
+    return _week([cap], [task_h], [proj_h])
+
+
+async def get_workload_forecast(
+    db: AsyncSession,
+    users: List[User],
+    start: date,
+    weeks: int = 12,
+    include_unassigned: bool = True,
+) -> Dict[str, Any]:
+    """Carga frente a capacidad por usuario, por departamento y total, semana a semana."""
+    user_ids = tuple(sorted(u.id for u in users))
+    week_starts = [start + timedelta(weeks=w) for w in range(weeks)]
+    cached = {ws: forecast_week_cache.get((user_ids, include_unassigned, ws)) for ws in week_starts}
+    missing = [ws for ws, block in cached.items() if block is None]
+    if missing:
+        # Un solo cálculo para el tramo que cubre todas las semanas que faltan
+        first, last = missing[0], missing[-1]
+        computed = await _compute_weeks(db, user_ids, include_unassigned, first, (last - first).days // 7 + 1)
+        for ws, block in computed.items():
+            forecast_week_cache.set((user_ids, include_unassigned, ws), block)
+            cached[ws] = block
+
+    user_rows = []
+    by_department: Dict[Optional[int], List[int]] = {}
+    for u in sorted(users, key=lambda u: u.id):
+        by_department.setdefault(u.department_id, []).append(u.id)
+        user_rows.append({
+            "user_id": u.id,
+            "name": f"{u.first_name} {u.last_name}",
+            "department_id": u.department_id,
+            "weeks": [{"week_start": ws, **cached[ws][u.id]} for ws in week_starts],
+        })
+    departments = [
+        {
+            "department_id": dep_id,
+            "users": len(member_ids),
+            "weeks": [{"week_start": ws, **_sum_weeks([cached[ws][uid] for uid in member_ids])} for ws in week_starts],
+        }
+        for dep_id, member_ids in sorted(by_department.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))
+    ]
+    totals = [
+        {"week_start": ws, **_sum_weeks(list(cached[ws].values()))}
+        for ws in week_starts
+    ]
+    return {
+        "start": start,
+        "weeks": weeks,
+        "users": user_rows,
+        "departments": departments,
+        "unassigned": [{"week_start": ws, **cached[ws][None]} for ws in week_starts] if include_unassigned else [],
+        "totals": totals,
+    }
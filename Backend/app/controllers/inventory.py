@@ -1,12 +1,44 @@
+from datetime import date, datetime, time, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import Date, delete, func, insert, literal, text, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from app.models.inventory import InventoryItem, TaskUsedComponent
+from app.models.inventory import InventoryItem, StockMovement, StockSnapshot, StockHealth, TaskUsedComponent
 from app.models.component import Component
+from app.controllers.stock_health import refresh_stock_health
+from app.pagination import apply_keyset
 from app.schemas.inventory import InventoryItemCreate, InventoryItemUpdate
 
+# Tipos de movimiento del libro de stock
+OPENING = "OPENING"
+RECEIPT = "RECEIPT"
+CONSUMPTION = "CONSUMPTION"
+ADJUSTMENT = "ADJUSTMENT"
+
+
+def _movement(
+    item: InventoryItem,
+    movement_type: str,
+    delta: float,
+    task_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> StockMovement:
+    """Movimiento con el saldo actual del item (ya actualizado) como balance_after."""
+    return StockMovement(
+        component_id=item.component_id,
+        movement_type=movement_type,
+        quantity=float(delta),
+        balance_after=float(item.quantity or 0),
+        unit_cost=item.unit_cost,
+        task_id=task_id,
+        user_id=user_id,
+        note=note[:255] if note else None,
+    )
+
 
 async def create_inventory_item(db: AsyncSession, item_in: InventoryItemCreate) -> InventoryItem:
     # Verificar componente existe
@@ -22,6 +54,8 @@ async def create_inventory_item(db: AsyncSession, item_in: InventoryItemCreate)
 
     item = InventoryItem(**item_in.model_dump())
     db.add(item)
+    db.add(_movement(item, OPENING, item.quantity or 0))
+    await refresh_stock_health(db, [item.component_id])
     await db.commit()
     await db.refresh(item)
     return item
@@ -45,46 +79,259 @@ async def get_inventory_by_component(db: AsyncSession, component_id: int) -> Opt
     return res.scalar_one_or_none()
 
 
-async def update_inventory_item(db: AsyncSession, item_id: int, item_in: InventoryItemUpdate) -> Optional[InventoryItem]:
-    res = await db.execute(select(InventoryItem).where(InventoryItem.id == item_id))
+async def update_inventory_item(
+    db: AsyncSession,
+    item_id: int,
+    item_in: InventoryItemUpdate,
+    user_id: Optional[int] = None,
+) -> Optional[InventoryItem]:
+    # FOR UPDATE: la variación registrada en el libro es respecto al saldo real
+    res = await db.execute(select(InventoryItem).where(InventoryItem.id == item_id).with_for_update())
     item = res.scalar_one_or_none()
     if not item:
         return None
+    before = (item.quantity or 0, item.unit_cost)
     data = item_in.model_dump(exclude_unset=True)
     for k, v in data.items():
         setattr(item, k, v)
+    # Un cambio solo de coste queda como ajuste de cantidad 0 (revalorización)
+    if (item.quantity or 0, item.unit_cost) != before:
+        db.add(_movement(item, ADJUSTMENT, (item.quantity or 0) - before[0], user_id=user_id, note="Edición manual"))
+        await refresh_stock_health(db, [item.component_id])
     await db.commit()
     await db.refresh(item)
     return item
 
 
-async def delete_inventory_item(db: AsyncSession, item_id: int) -> bool:
-    res = await db.execute(select(InventoryItem).where(InventoryItem.id == item_id))
+async def delete_inventory_item(db: AsyncSession, item_id: int, user_id: Optional[int] = None) -> bool:
+    res = await db.execute(select(InventoryItem).where(InventoryItem.id == item_id).with_for_update())
     item = res.scalar_one_or_none()
     if not item:
         return False
+    # El historial se conserva; el saldo del componente pasa a 0
+    delta = -(item.quantity or 0)
+    item.quantity = 0
+    db.add(_movement(item, ADJUSTMENT, delta, user_id=user_id, note="Item de inventario eliminado"))
     await db.delete(item)
+    await db.execute(delete(StockHealth).where(StockHealth.component_id == item.component_id))
     await db.commit()
     return True
 
 
-async def adjust_inventory_quantity(db: AsyncSession, item_id: int, delta: float) -> Optional[InventoryItem]:
-    res = await db.execute(select(InventoryItem).where(InventoryItem.id == item_id))
+async def adjust_inventory_quantity(
+    db: AsyncSession,
+    item_id: int,
+    delta: float,
+    movement_type: str = ADJUSTMENT,
+    reason: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> Optional[InventoryItem]:
+    # UPDATE condicional: la comprobación de stock y la escritura son atómicas (sin lost updates)
+    new_q = func.coalesce(InventoryItem.quantity, 0) + float(delta)
+    res = await db.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id, new_q >= 0)
+        .values(quantity=new_q)
+        .returning(InventoryItem)
+        .execution_options(synchronize_session=False)
+    )
     item = res.scalar_one_or_none()
-    if not item:
-        return None
-    new_q = (item.quantity or 0) + float(delta)
-    if new_q < 0:
+    if item is None:
+        exists = await db.execute(select(InventoryItem.id).where(InventoryItem.id == item_id))
+        if exists.scalar_one_or_none() is None:
+            return None
         raise ValueError("Stock cannot be negative")
-    item.quantity = new_q
+    db.add(_movement(item, movement_type, delta, user_id=user_id, note=reason))
+    await refresh_stock_health(db, [item.component_id])
     await db.commit()
-    await db.refresh(item)
     return item
 
 
-async def list_task_used_components(db: AsyncSession, component_id: Optional[int] = None):
+# Bloquea las filas en orden de id (sin deadlocks entre consumos de varios componentes) y
+# descuenta solo si queda stock suficiente; las filas sin stock no aparecen en RETURNING.
+_CONSUME_SQL = text("""
+    WITH wanted AS (
+        SELECT component_id, sum(qty) AS qty
+        FROM unnest(CAST(:component_ids AS integer[]), CAST(:quantities AS double precision[])) AS w(component_id, qty)
+        GROUP BY component_id
+    ),
+    locked AS MATERIALIZED (
+        SELECT i.id FROM inventory_items i
+        JOIN wanted ON wanted.component_id = i.component_id
+        ORDER BY i.id
+        FOR UPDATE OF i
+    )
+    UPDATE inventory_items AS i
+    SET quantity = i.quantity - wanted.qty, updated_at = now()
+    FROM locked, wanted
+    WHERE i.id = locked.id AND i.component_id = wanted.component_id AND i.quantity >= wanted.qty
+    RETURNING i.component_id, i.unit_cost, i.quantity
+""")
+
+
+async def consume_inventory(
+    db: AsyncSession,
+    items: Iterable[Tuple[int, float]],
+    task_id: Optional[int] = None,
+) -> Dict[int, Optional[float]]:
+    """Descuenta el stock de todos los componentes consumidos en una sola sentencia.
+
+    `items` son pares (component_id, cantidad); las cantidades de un mismo componente se suman.
+    No hace commit. Si algún componente no tiene inventario o stock suficiente lanza ValueError
+    y el llamador debe hacer rollback (las filas ya descontadas siguen en la transacción).
+    Registra un movimiento CONSUMPTION por componente en el libro de stock y recalcula su
+    estado de stock (alertas).
+    Devuelve {component_id: unit_cost} para congelar el coste en TaskUsedComponent.
+    """
+    wanted: Dict[int, float] = {}
+    for component_id, qty in items:
+        wanted[component_id] = wanted.get(component_id, 0.0) + float(qty)
+    if not wanted:
+        return {}
+    res = await db.execute(
+        _CONSUME_SQL,
+        {"component_ids": list(wanted), "quantities": list(wanted.values())},
+    )
+    rows = res.all()
+    unit_costs = {row.component_id: row.unit_cost for row in rows}
+    missing = sorted(set(wanted) - set(unit_costs))
+    if missing:
+        raise ValueError(f"Insufficient inventory for component {missing[0]}")
+    # created_at = clock_timestamp() (default de la columna): posterior al bloqueo de las filas,
+    # así el orden (created_at, id) del libro sigue el de los saldos
+    await db.execute(insert(StockMovement), [
+        {
+            "component_id": row.component_id,
+            "movement_type": CONSUMPTION,
+            "quantity": -wanted[row.component_id],
+            "balance_after": row.quantity,
+            "unit_cost": row.unit_cost,
+            "task_id": task_id,
+        }
+        for row in rows
+    ])
+    await refresh_stock_health(db, unit_costs)
+    return unit_costs
+
+
+# ---------------------------------------------------------------------------
+# Libro de stock
+# ---------------------------------------------------------------------------
+
+async def list_stock_movements(
+    db: AsyncSession,
+    component_id: Optional[int] = None,
+    movement_type: Optional[str] = None,
+    task_id: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> List[StockMovement]:
+    """Movimientos más recientes primero, paginados por cursor (created_at, id)."""
+    query = select(StockMovement)
+    if component_id:
+        query = query.where(StockMovement.component_id == component_id)
+    if movement_type:
+        query = query.where(StockMovement.movement_type == movement_type)
+    if task_id:
+        query = query.where(StockMovement.task_id == task_id)
+    query = apply_keyset(query, StockMovement.created_at, StockMovement.id, cursor).limit(limit)
+    res = await db.execute(query)
+    return res.scalars().all()
+
+
+async def list_task_used_components(
+    db: AsyncSession,
+    component_id: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> List[TaskUsedComponent]:
+    """Consumos por tarea, más recientes primero, paginados por cursor (created_at, id)."""
     query = select(TaskUsedComponent)
     if component_id:
         query = query.where(TaskUsedComponent.component_id == component_id)
+    query = apply_keyset(query, TaskUsedComponent.created_at, TaskUsedComponent.id, cursor).limit(limit)
     res = await db.execute(query)
     return res.scalars().all()
+
+
+async def get_stock_at(db: AsyncSession, component_id: int, at: datetime) -> float:
+    """Stock de un componente en un instante: saldo del último movimiento hasta `at` (0 si no hay)."""
+    res = await db.execute(
+        select(StockMovement.balance_after)
+        .where(StockMovement.component_id == component_id, StockMovement.created_at <= at)
+        .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        .limit(1)
+    )
+    return float(res.scalar_one_or_none() or 0)
+
+
+def _end_of_day(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+
+def _closing_balances_query(day: date):
+    """Saldo de cierre (UTC) de cada componente con movimientos: una búsqueda en índice por componente."""
+    last = (
+        select(StockMovement.balance_after, StockMovement.unit_cost)
+        .where(StockMovement.component_id == Component.id, StockMovement.created_at < _end_of_day(day))
+        .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        .limit(1)
+        .lateral("last_movement")
+    )
+    return (
+        select(Component.id.label("component_id"), last.c.balance_after.label("quantity"), last.c.unit_cost)
+        .select_from(Component)
+        .join(last, true())
+    )
+
+
+async def take_stock_snapshot(db: AsyncSession, day: Optional[date] = None) -> int:
+    """Guarda (o rehace) los saldos de cierre de `day` (por defecto ayer). Devuelve los componentes."""
+    day = day or (datetime.now(timezone.utc).date() - timedelta(days=1))
+    balances = _closing_balances_query(day).subquery()
+    stmt = pg_insert(StockSnapshot).from_select(
+        ["snapshot_date", "component_id", "quantity", "unit_cost"],
+        select(literal(day, Date), balances.c.component_id,
+               balances.c.quantity, balances.c.unit_cost),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockSnapshot.snapshot_date, StockSnapshot.component_id],
+        set_={"quantity": stmt.excluded.quantity, "unit_cost": stmt.excluded.unit_cost, "created_at": func.now()},
+    )
+    res = await db.execute(stmt)
+    await db.commit()
+    return res.rowcount or 0
+
+
+async def valuation_query(db: AsyncSession, as_of: Optional[date] = None):
+    """Consulta de valoración del inventario para exportar en streaming.
+
+    Sin fecha usa el stock actual; con fecha, la foto diaria si existe y si no los saldos de
+    cierre calculados desde el libro.
+    """
+    if as_of is None:
+        source = select(
+            InventoryItem.component_id, InventoryItem.quantity, InventoryItem.unit_cost
+        ).subquery()
+    else:
+        has_snapshot = await db.execute(
+            select(StockSnapshot.component_id).where(StockSnapshot.snapshot_date == as_of).limit(1)
+        )
+        if has_snapshot.scalar_one_or_none() is not None:
+            source = select(
+                StockSnapshot.component_id, StockSnapshot.quantity, StockSnapshot.unit_cost
+            ).where(StockSnapshot.snapshot_date == as_of).subquery()
+        else:
+            source = _closing_balances_query(as_of).subquery()
+    return (
+        select(
+            source.c.component_id,
+            Component.name.label("component_name"),
+            Component.component_type,
+            source.c.quantity,
+            source.c.unit_cost,
+            (source.c.quantity * func.coalesce(source.c.unit_cost, 0)).label("value"),
+        )
+        .join(Component, Component.id == source.c.component_id)
+        .order_by(source.c.component_id)
+    )
@@ -1,11 +1,17 @@
-from datetime import datetime, timedelta, timezone
-from typing import List
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Sequence, Tuple
 
-from sqlalchemy import func, case, and_, select, cast, String
+from sqlalchemy import func, case, select, cast, bindparam, Float, null, literal, or_, true
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.database.postgres import AsyncSessionLocal
+from app.controllers.kpi_rollup import trend_bucket_cache, week_label, month_label
 from app.models.workorder import WorkOrder
 from app.models.failure import Failure
+from app.models.component import Component
+from app.models.kpi import KpiDailyRollup, KpiCounter
 from app.models.enums import (
     AssetStatus, WorkOrderStatus, FailureStatus, FailureSeverity
 )
@@ -18,205 +24,206 @@ from app.schemas.kpi import (
     FailureKpi,
     MonthlyResponseSeries,
     MonthlyResponsePoint,
+    AssetReliability,
+    ReliabilityReport,
+    KpiDashboard,
 )
 from app.models.asset import Asset
 
 
-async def get_kpi_summary(db: AsyncSession) -> KpiSummary:
-    now = datetime.now(timezone.utc)
-    month_ago = now - timedelta(days=30)
+COUNTER_SCOPES = ("workorder_status", "failure_status", "failure_severity")
+# Debe coincidir con el predicado del índice parcial ix_workorders_overdue (ver apply_simple_migrations)
+OVERDUE_STATUSES = (WorkOrderStatus.OPEN.value, WorkOrderStatus.IN_PROGRESS.value)
 
-    # Convert timezone-aware datetimes to naive UTC for DB comparisons
-    def _to_db_naive(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        if dt.tzinfo is None:
-            return dt
-        return dt.astimezone(timezone.utc).replace(tzinfo=None)
-
-    naive_now = _to_db_naive(now)
-    naive_month_ago = _to_db_naive(month_ago)
-
-    # Totales por estado
-    # Helper to compare status robustly (trim + upper)
-    status_upper = func.upper(func.trim(cast(WorkOrder.status, String)))
-
-    totals_q = select(
-        func.count(WorkOrder.id),
-        func.sum(case((status_upper == WorkOrderStatus.OPEN.value, 1), else_=0)),
-        func.sum(case((status_upper == WorkOrderStatus.IN_PROGRESS.value, 1), else_=0)),
-        func.sum(case((and_(status_upper == WorkOrderStatus.COMPLETED.value, WorkOrder.completed_date >= naive_month_ago), 1), else_=0)),
-        func.sum(
-            case(
-                (
-                    and_(
-                        cast(WorkOrder.status, String).in_([WorkOrderStatus.OPEN.value, WorkOrderStatus.IN_PROGRESS.value]),
-                        WorkOrder.scheduled_date.isnot(None),
-                        WorkOrder.scheduled_date < naive_now,
-                    ),
-                    1,
-                ),
-                else_=0,
-            )
-        ),
-        func.avg(
-            case(
-                (
-                    and_(
-                        WorkOrder.completed_date.isnot(None),
-                        WorkOrder.started_date.isnot(None),
-                    ),
-                    func.extract('epoch', WorkOrder.completed_date - WorkOrder.started_date) / 3600.0,
-                ),
-                else_=None,
-            )
-        ),
-        # avg completion time from creation to completion: created_at is timestamptz, completed_date is timestamp
-        func.avg(
-            case(
-                (
-                    and_(
-                        WorkOrder.completed_date.isnot(None),
-                        WorkOrder.created_at.isnot(None),
-                    ),
-                    # Convert created_at (timestamptz) to timestamp (UTC) for safe subtraction
-                    func.extract('epoch', WorkOrder.completed_date - func.timezone('UTC', WorkOrder.created_at)) / 3600.0,
-                ),
-                else_=None,
-            )
-        ),
-        func.count().filter(WorkOrder.scheduled_date.isnot(None)),
+
+async def _get_counters(db: AsyncSession, *scopes: str) -> Dict[str, Dict[str, int]]:
+    res = await db.execute(
+        select(KpiCounter.scope, KpiCounter.key, KpiCounter.value).where(KpiCounter.scope.in_(scopes))
     )
+    out: Dict[str, Dict[str, int]] = {scope: {} for scope in scopes}
+    for scope, key, value in res.all():
+        out[scope][key] = int(value or 0)
+    return out
+
+
+def _overdue_query(naive_now: datetime):
+    # Depende del instante actual, así que no se acumula: consulta directa sobre workorders.
+    # Estados como literales (no parámetros) para que el planificador pueda usar el índice parcial.
+    return select(func.count()).select_from(WorkOrder).where(
+        WorkOrder.status.in_(bindparam("overdue_statuses", list(OVERDUE_STATUSES), expanding=True, literal_execute=True)),
+        WorkOrder.scheduled_date.isnot(None),
+        WorkOrder.scheduled_date < naive_now,
+    )
+
+
+async def _count_overdue_workorders(db: AsyncSession, naive_now: datetime) -> int:
+    res = await db.execute(_overdue_query(naive_now))
+    return int(res.scalar() or 0)
+
+
+def _ratio(total: float | None, count: int | None) -> float | None:
+    if not count:
+        return None
+    return float(total or 0.0) / float(count)
+
+
+def _naive_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _rollup_totals_columns(month_ago: date) -> list:
+    """Agregados globales de kpi_daily_rollups que necesita el resumen (orden fijo, ver _build_summary)."""
+    R = KpiDailyRollup
+    return [
+        func.sum(R.wo_planned).label("planned_count"),
+        func.sum(R.wo_completed).filter(R.day >= month_ago).label("completed_30d"),
+        func.sum(R.repair_hours_sum).label("repair_sum"),
+        func.sum(R.repair_count).label("repair_cnt"),
+        func.sum(R.completion_hours_sum).label("completion_sum"),
+        func.sum(R.completion_count).label("completion_cnt"),
+        func.sum(R.failures_resolved).label("resolved_cnt"),
+        func.min(R.first_resolved_at).label("first_resolved"),
+        func.max(R.last_resolved_at).label("last_resolved"),
+        func.sum(R.mttf_hours_sum).label("mttf_sum"),
+        func.sum(R.mttf_count).label("mttf_cnt"),
+    ]
+
+
+def _asset_columns() -> list:
+    is_status = lambda status: case((Asset.status == status.value, 1), else_=0)
+    return [
+        func.count(Asset.id).label("assets_total"),
+        func.sum(is_status(AssetStatus.ACTIVE)).label("assets_active"),
+        func.sum(is_status(AssetStatus.MAINTENANCE)).label("assets_maintenance"),
+        func.sum(is_status(AssetStatus.INACTIVE)).label("assets_inactive"),
+        func.sum(is_status(AssetStatus.RETIRED)).label("assets_retired"),
+        func.sum(Asset.current_value).label("assets_value"),
+    ]
+
+
+Bucket = Tuple[str, date, date]  # (etiqueta, inicio, fin exclusivo)
+
+_BUCKET_COLUMNS = {
+    # Como antes de los acumulados: completadas = con completed_date en la semana, sea cual sea su estado
+    "week": (KpiDailyRollup.wo_created, KpiDailyRollup.wo_closed),
+    "month": (KpiDailyRollup.response_hours_sum, KpiDailyRollup.response_count),
+}
+_BUCKET_LABELS = {"week": week_label, "month": month_label}
+
+
+def _week_buckets(now: datetime, weeks: int) -> List[Bucket]:
+    """Semanas ISO completas desde la que contiene now - weeks hasta la actual."""
+    start = (now - timedelta(weeks=weeks)).date()
+    monday = start - timedelta(days=start.weekday())
+    out: List[Bucket] = []
+    for i in range(weeks + 1):
+        week_start = monday + timedelta(weeks=i)
+        out.append((week_label(week_start), week_start, week_start + timedelta(weeks=1)))
+    return out
+
+
+def _month_buckets(now: datetime, months: int) -> List[Bucket]:
+    """Los últimos 'months' meses naturales más el actual."""
+    out: List[Bucket] = []
+    cursor = now.date().replace(day=1)
+    for _ in range(months + 1):
+        next_month = (cursor + timedelta(days=32)).replace(day=1)
+        out.append((month_label(cursor), cursor, next_month))
+        cursor = (cursor - timedelta(days=1)).replace(day=1)
+    out.reverse()
+    return out
+
+
+async def _load_buckets(db: AsyncSession, kind: str, buckets: List[Bucket]) -> Dict[str, Tuple]:
+    """Sumas por cubo servidas desde trend_bucket_cache; solo se consultan los cubos ausentes.
+
+    Los cubos cerrados solo cambian por ediciones: el proceso que edita los invalida tras el
+    commit y en el resto de workers caducan con KPI_CLOSED_BUCKET_TTL_SECONDS. El cubo en curso
+    usa un TTL corto.
+    """
+    today = datetime.now(timezone.utc).date()
+    out: Dict[str, Tuple] = {}
+    missing: List[Bucket] = []
+    for bucket in buckets:
+        cached = trend_bucket_cache.get((kind, bucket[0]))
+        if cached is None:
+            missing.append(bucket)
+        else:
+            out[bucket[0]] = cached
+    if not missing:
+        return out
+
+    R = KpiDailyRollup
+    first, second = _BUCKET_COLUMNS[kind]
+    q = select(R.day, func.sum(first), func.sum(second)).where(
+        R.day >= min(b[1] for b in missing),
+        R.day < max(b[2] for b in missing),
+    ).group_by(R.day)
+    res = await db.execute(q)
 
-    res = await db.execute(totals_q)
+    label_of = _BUCKET_LABELS[kind]
+    wanted = {b[0] for b in missing}
+    sums: Dict[str, List[float]] = {label: [0, 0] for label in wanted}
+    for day, a, b in res.all():
+        acc = sums.get(label_of(day))
+        if acc is not None:
+            acc[0] += a or 0
+            acc[1] += b or 0
+    for label, _start, end in missing:
+        value = tuple(sums[label])
+        ttl = settings.KPI_CLOSED_BUCKET_TTL_SECONDS if end <= today else settings.KPI_CURRENT_BUCKET_TTL_SECONDS
+        trend_bucket_cache.set((kind, label), value, ttl=ttl)
+        out[label] = value
+    return out
+
+
+def _build_summary(wo_status: Dict[str, int], totals: Sequence, overdue_cnt: int) -> KpiSummary:
     (
-        total,
-        open_cnt,
-        in_progress_cnt,
-        completed_30d,
-        overdue_cnt,
-        mttr_hours,  # avg from start to complete
-        avg_completion_time_hours,  # from creation to complete
         planned_count,
-    ) = res.one()
+        completed_30d,
+        repair_sum,
+        repair_cnt,
+        completion_sum,
+        completion_cnt,
+        resolved_cnt,
+        first_resolved,
+        last_resolved,
+        mttf_sum,
+        mttf_cnt,
+    ) = totals
+    total = sum(wo_status.values())
 
     planned_pct = float(planned_count or 0) / float(total or 1) * 100.0
 
-    # MTBF: media entre fechas de resolución consecutivas
-    failures_resolved_q = select(Failure.resolved_date).where(Failure.resolved_date.isnot(None)).order_by(Failure.resolved_date.asc())
-    res_resolved = await db.execute(failures_resolved_q)
-    resolved_dates: List[datetime] = [r[0] for r in res_resolved.all()]
+    # MTBF: la media de huecos entre resoluciones consecutivas es (última - primera) / (n - 1)
     mtbf_hours = None
-    if len(resolved_dates) >= 2:
-        mtbf_gaps = [ (resolved_dates[i]-resolved_dates[i-1]).total_seconds()/3600.0 for i in range(1,len(resolved_dates)) ]
-        if mtbf_gaps:
-            mtbf_hours = sum(mtbf_gaps)/len(mtbf_gaps)
-
-    # MTTF: media entre (resolved_date de fallo i) y (reported_date del fallo i+1) cuando el resuelto ocurre antes del siguiente reporte
-    failures_report_q = select(Failure.reported_date, Failure.resolved_date).where(Failure.reported_date.isnot(None)).order_by(Failure.reported_date.asc())
-    res_fail = await db.execute(failures_report_q)
-    failures_rows = res_fail.all()
-    mttf_hours = None
-    def _naive(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        return dt if dt.tzinfo is None else dt.astimezone(timezone.utc).replace(tzinfo=None)
-    if len(failures_rows) >= 2:
-        spans = []
-        for i in range(len(failures_rows)-1):
-            rep_i, res_i = failures_rows[i][0], failures_rows[i][1]
-            rep_next, _res_next = failures_rows[i+1][0], failures_rows[i+1][1]
-            rep_i_n = _naive(rep_i)
-            res_i_n = _naive(res_i)
-            rep_next_n = _naive(rep_next)
-            if res_i_n and rep_next_n and res_i_n <= rep_next_n:
-                spans.append((rep_next_n - res_i_n).total_seconds()/3600.0)
-        if spans:
-            mttf_hours = sum(spans)/len(spans)
+    if (resolved_cnt or 0) >= 2 and first_resolved and last_resolved:
+        mtbf_hours = (last_resolved - first_resolved).total_seconds() / 3600.0 / (resolved_cnt - 1)
 
     return KpiSummary(
         total_workorders=int(total or 0),
-        open_workorders=int(open_cnt or 0),
-        in_progress_workorders=int(in_progress_cnt or 0),
+        open_workorders=wo_status.get(WorkOrderStatus.OPEN.value, 0),
+        in_progress_workorders=wo_status.get(WorkOrderStatus.IN_PROGRESS.value, 0),
         completed_workorders_30d=int(completed_30d or 0),
-        overdue_workorders=int(overdue_cnt or 0),
+        overdue_workorders=overdue_cnt,
         planned_pct=round(planned_pct, 2),
-        avg_completion_time_hours=(float(avg_completion_time_hours) if avg_completion_time_hours is not None else None),
-        mttr_hours=(float(mttr_hours) if mttr_hours is not None else None),
-    mtbf_hours=(float(mtbf_hours) if mtbf_hours is not None else None),
-    mttf_hours=(float(mttf_hours) if mttf_hours is not None else None),
+        avg_completion_time_hours=_ratio(completion_sum, completion_cnt),
+        mttr_hours=_ratio(repair_sum, repair_cnt),
+        mtbf_hours=mtbf_hours,
+        mttf_hours=_ratio(mttf_sum, mttf_cnt),
     )
 
 
-async def get_kpi_trends(db: AsyncSession, weeks: int = 8) -> KpiTrends:
-    now = datetime.now(timezone.utc)
-    start = now - timedelta(weeks=weeks)
-
-    def _to_db_naive(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        if dt.tzinfo is None:
-            return dt
-        return dt.astimezone(timezone.utc).replace(tzinfo=None)
-
-    naive_start = _to_db_naive(start)
-
-    # Crear buckets semanales [start_of_week]
-    # Usamos date_trunc('week', ...) para agrupar
-    created_week = func.to_char(func.date_trunc('week', WorkOrder.created_at), 'IYYY-IW')
-    created_q = select(
-        created_week.label('label'),
-        func.count(WorkOrder.id),
-    ).where(
-        WorkOrder.created_at >= naive_start,
-    ).group_by(created_week).order_by(created_week)
-
-    completed_week = func.to_char(func.date_trunc('week', WorkOrder.completed_date), 'IYYY-IW')
-    completed_q = select(
-        completed_week.label('label'),
-        func.count(WorkOrder.id),
-    ).where(
-        and_(
-            WorkOrder.completed_date.isnot(None),
-            WorkOrder.completed_date >= naive_start,
-        )
-    ).group_by(completed_week).order_by(completed_week)
-
-    created_res = await db.execute(created_q)
-    completed_res = await db.execute(completed_q)
-
-    created_map = {row[0]: int(row[1]) for row in created_res.all()}
-    completed_map = {row[0]: int(row[1]) for row in completed_res.all()}
-
-    # Construir lista de semanas entre start y now en formato IYYY-IW
-    points: List[KpiTrendPoint] = []
-    week_cursor = start - timedelta(days=start.weekday())  # aprox alineación, no crítico
-    for i in range(weeks + 1):
-        week_dt = week_cursor + timedelta(weeks=i)
-        label = week_dt.strftime('%G-%V')  # ISO Year-Week
-        points.append(
-            KpiTrendPoint(
-                label=label,
-                created=created_map.get(label, 0),
-                completed=completed_map.get(label, 0),
-            )
-        )
-
+def _build_trends(buckets: List[Bucket], sums: Dict[str, Tuple], weeks: int) -> KpiTrends:
+    points = [
+        KpiTrendPoint(label=label, created=int(sums[label][0]), completed=int(sums[label][1]))
+        for label, _start, _end in buckets
+    ]
     return KpiTrends(period='week', window=weeks, points=points)
 
 
-async def get_assets_kpi(db: AsyncSession) -> AssetKpi:
-    # Aggregate counts by status and total value
-    q = select(
-        func.count(Asset.id),
-    func.sum(case((cast(Asset.status, String) == AssetStatus.ACTIVE.value, 1), else_=0)),
-    func.sum(case((cast(Asset.status, String) == AssetStatus.MAINTENANCE.value, 1), else_=0)),
-    func.sum(case((cast(Asset.status, String) == AssetStatus.INACTIVE.value, 1), else_=0)),
-    func.sum(case((cast(Asset.status, String) == AssetStatus.RETIRED.value, 1), else_=0)),
-        func.sum(Asset.current_value),
-    )
-    res = await db.execute(q)
-    total, active, maintenance, inactive, retired, total_value = res.one()
+def _build_assets(row: Sequence) -> AssetKpi:
+    total, active, maintenance, inactive, retired, total_value = row
     return AssetKpi(
         total=int(total or 0),
         active=int(active or 0),
@@ -227,123 +234,254 @@ async def get_assets_kpi(db: AsyncSession) -> AssetKpi:
     )
 
 
-async def get_workorders_kpi(db: AsyncSession) -> WorkOrderKpi:
-    now = datetime.now(timezone.utc)
-    def _to_db_naive(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        if dt.tzinfo is None:
-            return dt
-        return dt.astimezone(timezone.utc).replace(tzinfo=None)
-
-    naive_now = _to_db_naive(now)
-    status_upper = func.upper(func.trim(cast(WorkOrder.status, String)))
-    q = select(
-        func.count(WorkOrder.id),
-    func.sum(case((status_upper == WorkOrderStatus.OPEN.value, 1), else_=0)),
-    func.sum(case((status_upper == WorkOrderStatus.ASSIGNED.value, 1), else_=0)),
-    func.sum(case((status_upper == WorkOrderStatus.IN_PROGRESS.value, 1), else_=0)),
-    func.sum(case((status_upper == WorkOrderStatus.COMPLETED.value, 1), else_=0)),
-    func.sum(case((status_upper == WorkOrderStatus.CANCELLED.value, 1), else_=0)),
-        func.sum(
-            case(
-                (
-                    and_(
-                        cast(WorkOrder.status, String).in_([
-                            WorkOrderStatus.OPEN.value,
-                            WorkOrderStatus.IN_PROGRESS.value,
-                        ]),
-                        WorkOrder.scheduled_date.isnot(None),
-                        WorkOrder.scheduled_date < naive_now,
-                    ),
-                    1,
-                ),
-                else_=0,
-            )
-        ),
-    )
-    res = await db.execute(q)
-    total, draft, scheduled, in_progress, completed, cancelled, overdue = res.one()
+def _build_workorders(wo_status: Dict[str, int], overdue: int) -> WorkOrderKpi:
     return WorkOrderKpi(
-        total=int(total or 0),
-        draft=int(draft or 0),
-        scheduled=int(scheduled or 0),
-        in_progress=int(in_progress or 0),
-        completed=int(completed or 0),
-        cancelled=int(cancelled or 0),
-        overdue=int(overdue or 0),
+        total=sum(wo_status.values()),
+        draft=wo_status.get(WorkOrderStatus.OPEN.value, 0),
+        scheduled=wo_status.get(WorkOrderStatus.ASSIGNED.value, 0),
+        in_progress=wo_status.get(WorkOrderStatus.IN_PROGRESS.value, 0),
+        completed=wo_status.get(WorkOrderStatus.COMPLETED.value, 0),
+        cancelled=wo_status.get(WorkOrderStatus.CANCELLED.value, 0),
+        overdue=overdue,
     )
 
 
-async def get_failures_kpi(db: AsyncSession) -> FailureKpi:
-    q = select(
-        func.count(Failure.id),
-    func.sum(case((cast(Failure.status, String) == FailureStatus.PENDING.value, 1), else_=0)),
-    func.sum(case((cast(Failure.status, String) == FailureStatus.INVESTIGATING.value, 1), else_=0)),
-    func.sum(case((cast(Failure.status, String) == FailureStatus.RESOLVED.value, 1), else_=0)),
-    func.sum(case((cast(Failure.severity, String) == FailureSeverity.CRITICAL.value, 1), else_=0)),
-    )
-    res = await db.execute(q)
-    total, pending, in_progress, resolved, critical = res.one()
+def _build_failures(counters: Dict[str, Dict[str, int]]) -> FailureKpi:
+    f_status = counters["failure_status"]
     return FailureKpi(
-        total=int(total or 0),
-        pending=int(pending or 0),
-        in_progress=int(in_progress or 0),
-        resolved=int(resolved or 0),
-        critical=int(critical or 0),
+        total=sum(f_status.values()),
+        pending=f_status.get(FailureStatus.PENDING.value, 0),
+        in_progress=f_status.get(FailureStatus.INVESTIGATING.value, 0),
+        resolved=f_status.get(FailureStatus.RESOLVED.value, 0),
+        critical=counters["failure_severity"].get(FailureSeverity.CRITICAL.value, 0),
     )
 
 
+def _build_monthly(buckets: List[Bucket], sums: Dict[str, Tuple]) -> MonthlyResponseSeries:
+    points = [
+        MonthlyResponsePoint(month=label, avg_response_hours=_ratio(sums[label][0], sums[label][1]))
+        for label, _start, _end in buckets
+    ]
+    return MonthlyResponseSeries(points=points)
+
+
+async def get_kpi_summary(db: AsyncSession) -> KpiSummary:
+    """Resumen servido desde kpi_daily_rollups / kpi_counters (O(días), no O(histórico))."""
+    now = datetime.now(timezone.utc)
+    month_ago = now - timedelta(days=30)
+
+    counters = await _get_counters(db, "workorder_status")
+    totals = (await db.execute(select(*_rollup_totals_columns(month_ago.date())))).one()
+    overdue_cnt = await _count_overdue_workorders(db, _naive_now())
+    return _build_summary(counters["workorder_status"], totals, overdue_cnt)
+
+
+async def get_kpi_trends(db: AsyncSession, weeks: int = 8) -> KpiTrends:
+    """Creadas/completadas por semana ISO, desde la caché de cubos (solo se recalcula lo ausente).
+
+    "Completadas" cuenta las órdenes con completed_date en la semana aunque luego se reabran o
+    cancelen (wo_closed), igual que la consulta sobre workorders a la que sustituye.
+    """
+    buckets = _week_buckets(datetime.now(timezone.utc), weeks)
+    return _build_trends(buckets, await _load_buckets(db, "week", buckets), weeks)
+
+
+async def get_assets_kpi(db: AsyncSession) -> AssetKpi:
+    # Aggregate counts by status and total value
+    res = await db.execute(select(*_asset_columns()))
+    return _build_assets(res.one())
+
+
+async def get_workorders_kpi(db: AsyncSession) -> WorkOrderKpi:
+    wo_status = (await _get_counters(db, "workorder_status"))["workorder_status"]
+    overdue = await _count_overdue_workorders(db, _naive_now())
+    return _build_workorders(wo_status, overdue)
+
+
+async def get_failures_kpi(db: AsyncSession) -> FailureKpi:
+    counters = await _get_counters(db, "failure_status", "failure_severity")
+    return _build_failures(counters)
+
+
 async def get_monthly_response_times(db: AsyncSession, months: int = 6) -> MonthlyResponseSeries:
     """Media de tiempo de respuesta (started->completed si ambos existen, si no created->completed) agrupado por mes."""
+    buckets = _month_buckets(datetime.now(timezone.utc), months)
+    return _build_monthly(buckets, await _load_buckets(db, "month", buckets))
+
+
+async def get_kpi_dashboard(db: AsyncSession, weeks: int = 8, months: int = 6) -> KpiDashboard:
+    """Todos los KPIs del dashboard en dos sentencias independientes ejecutadas en paralelo.
+
+    - Fotografía actual: totales de rollups, assets y vencidas (una fila) cruzadas con los contadores.
+    - Series semanal/mensual: desde la caché de cubos, consultando solo los cubos ausentes.
+    """
     now = datetime.now(timezone.utc)
-    start = (now.replace(day=1) - timedelta(days=months*31)).replace(day=1)
-    def _naive(dt: datetime | None) -> datetime | None:
-        if dt is None:
-            return None
-        return dt if dt.tzinfo is None else dt.astimezone(timezone.utc).replace(tzinfo=None)
-    naive_start = _naive(start)
-    # Construir expresión de mes YYYY-MM
-    month_label = func.to_char(func.date_trunc('month', WorkOrder.completed_date), 'YYYY-MM')
-    duration_expr = case(
-        (
-            and_(WorkOrder.started_date.isnot(None), WorkOrder.completed_date.isnot(None)),
-            func.extract('epoch', WorkOrder.completed_date - WorkOrder.started_date)/3600.0
-        ),
-        else_=case(
-            (
-                and_(WorkOrder.created_at.isnot(None), WorkOrder.completed_date.isnot(None)),
-                func.extract('epoch', WorkOrder.completed_date - func.timezone('UTC', WorkOrder.created_at))/3600.0
-            ),
-            else_=None
+    month_ago = (now - timedelta(days=30)).date()
+    week_buckets = _week_buckets(now, weeks)
+    month_buckets = _month_buckets(now, months)
+
+    totals = select(*_rollup_totals_columns(month_ago)).subquery("totals")
+    assets = select(*_asset_columns()).subquery("assets")
+    counters = (
+        select(KpiCounter.scope, KpiCounter.key, KpiCounter.value)
+        .where(KpiCounter.scope.in_(COUNTER_SCOPES))
+        .subquery("counters")
+    )
+    snapshot_q = (
+        select(
+            totals,
+            assets,
+            _overdue_query(_naive_now()).scalar_subquery().label("overdue"),
+            counters.c.scope,
+            counters.c.key,
+            counters.c.value,
         )
+        .select_from(totals.join(assets, true()).outerjoin(counters, true()))
     )
-    q = select(
-        month_label.label('m'),
-        func.avg(duration_expr)
-    ).where(
-        and_(
-            WorkOrder.completed_date.isnot(None),
-            WorkOrder.completed_date >= naive_start,
+
+    async def _load_series():
+        # Sesión propia: una AsyncSession no admite sentencias concurrentes
+        async with AsyncSessionLocal() as session:
+            weekly = await _load_buckets(session, "week", week_buckets)
+            monthly = await _load_buckets(session, "month", month_buckets)
+            return weekly, monthly
+
+    snapshot_res, (weekly, monthly) = await asyncio.gather(db.execute(snapshot_q), _load_series())
+    snapshot = snapshot_res.all()
+
+    first = snapshot[0]
+    counter_map: Dict[str, Dict[str, int]] = {scope: {} for scope in COUNTER_SCOPES}
+    for row in snapshot:
+        if row.scope is not None:
+            counter_map[row.scope][row.key] = int(row.value or 0)
+    wo_status = counter_map["workorder_status"]
+    overdue = int(first.overdue or 0)
+
+    return KpiDashboard(
+        summary=_build_summary(wo_status, tuple(first)[:len(totals.c)], overdue),
+        trends=_build_trends(week_buckets, weekly, weeks),
+        assets=_build_assets(tuple(first)[len(totals.c):len(totals.c) + len(assets.c)]),
+        workorders=_build_workorders(wo_status, overdue),
+        failures=_build_failures(counter_map),
+        monthly_response=_build_monthly(month_buckets, monthly),
+    )
+
+
+async def get_reliability_report(db: AsyncSession, page: int = 1, page_size: int = 20) -> ReliabilityReport:
+    """MTBF/MTTF global y por asset calculados en SQL con ventanas LAG/LEAD, en una sola consulta.
+
+    - MTBF: media de huecos entre resoluciones consecutivas (LAG sobre resolved_date).
+    - MTTF: media entre la resolución de un fallo y el reporte del siguiente (LEAD sobre reported_date),
+      solo cuando la resolución es anterior al siguiente reporte.
+    Los assets se ordenan por peor MTBF (menor primero) y se paginan en la base de datos.
+    """
+    offset = (page - 1) * page_size
+
+    f = (
+        select(
+            Failure.id.label("id"),
+            func.coalesce(Failure.asset_id, Component.asset_id).label("asset_id"),
+            func.timezone('UTC', Failure.reported_date).label("reported"),
+            Failure.resolved_date.label("resolved"),
         )
-    ).group_by(month_label).order_by(month_label)
+        .select_from(Failure)
+        .outerjoin(Component, Component.id == Failure.component_id)
+        .cte("f")
+    )
+
+    def _hours(expr):
+        return func.extract('epoch', expr) / 3600.0
+
+    # Huecos MTBF por asset
+    prev_resolved = func.lag(f.c.resolved).over(partition_by=f.c.asset_id, order_by=(f.c.resolved, f.c.id))
+    mtbf_rows = select(
+        f.c.asset_id,
+        literal(0).label("failure"),
+        _hours(f.c.resolved - prev_resolved).label("mtbf_gap"),
+        cast(null(), Float).label("mttf_span"),
+    ).where(f.c.resolved.isnot(None))
+
+    # Tramos MTTF por asset
+    next_reported = func.lead(f.c.reported).over(partition_by=f.c.asset_id, order_by=(f.c.reported, f.c.id))
+    leads = select(f.c.asset_id, f.c.resolved, next_reported.label("next_reported")).where(f.c.reported.isnot(None)).subquery()
+    mttf_rows = select(
+        leads.c.asset_id,
+        literal(1).label("failure"),
+        cast(null(), Float).label("mtbf_gap"),
+        case((leads.c.resolved <= leads.c.next_reported, _hours(leads.c.next_reported - leads.c.resolved)), else_=None).label("mttf_span"),
+    )
+
+    rows = mtbf_rows.union_all(mttf_rows).subquery()
+    per_asset = (
+        select(
+            rows.c.asset_id,
+            func.sum(rows.c.failure).label("failures"),
+            func.avg(rows.c.mtbf_gap).label("mtbf_hours"),
+            func.avg(rows.c.mttf_span).label("mttf_hours"),
+        )
+        .where(rows.c.asset_id.isnot(None))
+        .group_by(rows.c.asset_id)
+        .subquery()
+    )
+    page_q = (
+        select(
+            per_asset.c.asset_id,
+            Asset.name.label("asset_name"),
+            per_asset.c.failures,
+            per_asset.c.mtbf_hours,
+            per_asset.c.mttf_hours,
+        )
+        .select_from(per_asset)
+        .outerjoin(Asset, Asset.id == per_asset.c.asset_id)
+        .order_by(per_asset.c.mtbf_hours.asc().nulls_last(), per_asset.c.asset_id)
+        .offset(offset)
+        .limit(page_size)
+        .subquery()
+    )
+
+    # Globales: (última - primera resolución) / (n - 1) y LEAD sin particionar
+    global_mtbf = select(
+        _hours(func.max(f.c.resolved) - func.min(f.c.resolved)) / func.nullif(func.count(f.c.resolved) - 1, 0)
+    ).scalar_subquery()
+    global_next = func.lead(f.c.reported).over(order_by=(f.c.reported, f.c.id))
+    global_leads = select(f.c.resolved, global_next.label("next_reported")).where(f.c.reported.isnot(None)).subquery()
+    global_mttf = select(
+        func.avg(_hours(global_leads.c.next_reported - global_leads.c.resolved))
+    ).where(global_leads.c.resolved <= global_leads.c.next_reported).scalar_subquery()
+    # Los mismos assets que per_asset (con algún fallo fechado), aunque la página salga vacía
+    total_assets_q = select(func.count(f.c.asset_id.distinct())).where(
+        f.c.asset_id.isnot(None), or_(f.c.reported.isnot(None), f.c.resolved.isnot(None))
+    ).scalar_subquery()
+    global_q = select(
+        global_mtbf.label("g_mtbf"), global_mttf.label("g_mttf"), total_assets_q.label("total_assets")
+    ).subquery()
+
+    q = select(global_q, page_q).select_from(global_q.outerjoin(page_q, true()))
     res = await db.execute(q)
-    rows = res.all()
-    # Crear mapa
-    avg_map = {r[0]: float(r[1]) if r[1] is not None else None for r in rows}
-    # Generar meses continuos hasta actual
-    points: list[MonthlyResponsePoint] = []
-    cursor = start.replace(day=1)
-    end_month = now.replace(day=1)
-    while cursor <= end_month:
-        key = cursor.strftime('%Y-%m')
-        points.append(MonthlyResponsePoint(month=key, avg_response_hours=avg_map.get(key)))
-        # avanzar un mes
-        if cursor.month == 12:
-            cursor = cursor.replace(year=cursor.year+1, month=1)
-        else:
-            cursor = cursor.replace(month=cursor.month+1)
-    # recortar a últimos 'months' + mes actual
-    if len(points) > months+1:
-        points = points[-(months+1):]
-    return MonthlyResponseSeries(points=points)
+
+    g_mtbf = g_mttf = None
+    total_assets = 0
+    assets: List[AssetReliability] = []
+    for row in res.mappings():
+        g_mtbf, g_mttf = row["g_mtbf"], row["g_mttf"]
+        total_assets = int(row["total_assets"] or 0)
+        if row["asset_id"] is None:
+            continue
+        assets.append(
+            AssetReliability(
+                asset_id=row["asset_id"],
+                asset_name=row["asset_name"],
+                failures=int(row["failures"] or 0),
+                mtbf_hours=float(row["mtbf_hours"]) if row["mtbf_hours"] is not None else None,
+                mttf_hours=float(row["mttf_hours"]) if row["mttf_hours"] is not None else None,
+            )
+        )
+
+    return ReliabilityReport(
+        mtbf_hours=float(g_mtbf) if g_mtbf is not None else None,
+        mttf_hours=float(g_mttf) if g_mttf is not None else None,
+        total_assets=total_assets,
+        page=page,
+        page_size=page_size,
+        assets=assets,
+    )
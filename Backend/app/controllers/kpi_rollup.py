@@ -0,0 +1,481 @@
+"""Mantenimiento incremental de los acumulados de KPI (kpi_daily_rollups / kpi_counters).
+
+Cada cambio de estado de una WorkOrder o un Failure se traduce en la diferencia entre la
+"contribución" del estado nuevo y la del anterior, que se aplica con upserts atómicos
+(INSERT ... ON CONFLICT DO UPDATE SET col = col + delta) dentro de la misma transacción
+que el cambio. rebuild_kpi_rollups recalcula todo desde cero como job de reparación.
+"""
+from datetime import datetime, timezone, date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import select, func, literal, text, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.models.kpi import KpiDailyRollup, KpiCounter
+from app.models.failure import Failure
+from app.models.component import Component
+from app.models.enums import WorkOrderStatus
+
+logger = logging.getLogger(__name__)
+
+NO_ASSET = 0
+
+RollupKey = Tuple[date, int]
+
+# Cubos de tendencias ya agregados: ("week", 'IYYY-IW') -> (creadas, completadas),
+# ("month", 'YYYY-MM') -> (suma horas respuesta, nº). Ver controllers/kpi._load_buckets.
+trend_bucket_cache = TTLCache("kpi_trend_buckets", maxsize=512)
+
+
+def week_label(day: date) -> str:
+    return day.strftime('%G-%V')
+
+
+def month_label(day: date) -> str:
+    return day.strftime('%Y-%m')
+
+
+def _naive_utc(dt: datetime | None) -> datetime | None:
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _norm(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    v = getattr(v, "value", v)
+    return str(v).strip().upper()
+
+
+def _aware_utc(dt: datetime | None) -> datetime | None:
+    """Para comparar contra columnas TIMESTAMPTZ (reported_date, created_at)."""
+    if dt is None or dt.tzinfo is not None:
+        return dt
+    return dt.replace(tzinfo=timezone.utc)
+
+
+def _hours(end: datetime | None, start: datetime | None) -> Optional[float]:
+    if end is None or start is None:
+        return None
+    return (end - start).total_seconds() / 3600.0
+
+
+# ---------------------------------------------------------------------------
+# Snapshots y contribuciones
+# ---------------------------------------------------------------------------
+
+def workorder_snapshot(wo) -> Dict[str, Any]:
+    """Campos de una WorkOrder que afectan a los acumulados de KPI."""
+    return {
+        "status": _norm(wo.status),
+        "asset_id": wo.asset_id,
+        "created_at": _naive_utc(wo.created_at) or datetime.now(timezone.utc).replace(tzinfo=None),
+        "scheduled_date": _naive_utc(wo.scheduled_date),
+        "started_date": _naive_utc(wo.started_date),
+        "completed_date": _naive_utc(wo.completed_date),
+    }
+
+
+def _workorder_contributions(state: Dict[str, Any] | None):
+    rollups: List[Tuple[RollupKey, Dict[str, Any]]] = []
+    counters: List[Tuple[Tuple[str, str], int]] = []
+    if not state:
+        return rollups, counters
+    asset_id = state["asset_id"] or NO_ASSET
+    created_at = state["created_at"]
+    rollups.append(((created_at.date(), asset_id), {
+        "wo_created": 1,
+        "wo_planned": 1 if state["scheduled_date"] is not None else 0,
+    }))
+    completed = state["completed_date"]
+    if completed is not None:
+        cols: Dict[str, Any] = {
+            "wo_completed": 1 if state["status"] == WorkOrderStatus.COMPLETED.value else 0,
+            "wo_closed": 1,
+        }
+        repair = _hours(completed, state["started_date"])
+        if repair is not None:
+            cols["repair_hours_sum"] = repair
+            cols["repair_count"] = 1
+        completion = _hours(completed, created_at)
+        if completion is not None:
+            cols["completion_hours_sum"] = completion
+            cols["completion_count"] = 1
+        response = repair if repair is not None else completion
+        if response is not None:
+            cols["response_hours_sum"] = response
+            cols["response_count"] = 1
+        rollups.append(((completed.date(), asset_id), cols))
+    if state["status"]:
+        counters.append((("workorder_status", state["status"]), 1))
+    return rollups, counters
+
+
+async def failure_snapshot(db: AsyncSession, failure) -> Dict[str, Any]:
+    """Campos de un Failure que afectan a los acumulados (asset resuelto vía componente si hace falta)."""
+    asset_id = failure.asset_id
+    if asset_id is None and failure.component_id is not None:
+        res = await db.execute(select(Component.asset_id).where(Component.id == failure.component_id))
+        asset_id = res.scalar_one_or_none()
+    return {
+        "id": failure.id,
+        "status": _norm(failure.status),
+        "severity": _norm(failure.severity),
+        "asset_id": asset_id or NO_ASSET,
+        "reported_date": _naive_utc(failure.reported_date) or datetime.now(timezone.utc).replace(tzinfo=None),
+        "resolved_date": _naive_utc(failure.resolved_date),
+    }
+
+
+def _failure_contributions(state: Dict[str, Any] | None):
+    rollups: List[Tuple[RollupKey, Dict[str, Any]]] = []
+    counters: List[Tuple[Tuple[str, str], int]] = []
+    if not state:
+        return rollups, counters
+    asset_id = state["asset_id"]
+    rollups.append(((state["reported_date"].date(), asset_id), {"failures_reported": 1}))
+    resolved = state["resolved_date"]
+    if resolved is not None:
+        rollups.append(((resolved.date(), asset_id), {
+            "failures_resolved": 1,
+            "first_resolved_at": resolved,
+            "last_resolved_at": resolved,
+        }))
+    if state["status"]:
+        counters.append((("failure_status", state["status"]), 1))
+    if state["severity"]:
+        counters.append((("failure_severity", state["severity"]), 1))
+    return rollups, counters
+
+
+# ---------------------------------------------------------------------------
+# Aplicación de deltas
+# ---------------------------------------------------------------------------
+
+async def _apply(db: AsyncSession, old, new) -> List[RollupKey]:
+    """Aplica new - old. Devuelve las claves cuyo min/max de resolución hay que recalcular."""
+    old_rollups, old_counters = old
+    new_rollups, new_counters = new
+
+    def _bounds(items):
+        return {(key, cols["first_resolved_at"]) for key, cols in items if "first_resolved_at" in cols}
+
+    old_bounds, new_bounds = _bounds(old_rollups), _bounds(new_rollups)
+    refresh_resolved: List[RollupKey] = sorted({key for key, _ in old_bounds - new_bounds})
+
+    deltas: Dict[RollupKey, Dict[str, Any]] = {}
+    for sign, items in ((-1, old_rollups), (1, new_rollups)):
+        for key, cols in items:
+            acc = deltas.setdefault(key, {})
+            for col, val in cols.items():
+                if col in ("first_resolved_at", "last_resolved_at"):
+                    if sign > 0 and (key, val) not in old_bounds:
+                        acc[col] = val
+                    continue
+                acc[col] = acc.get(col, 0) + sign * val
+
+    for (day, asset_id), cols in deltas.items():
+        cols = {k: v for k, v in cols.items() if v}
+        if not cols:
+            continue
+        stmt = pg_insert(KpiDailyRollup).values(day=day, asset_id=asset_id, **cols)
+        set_ = {}
+        for col in cols:
+            if col == "first_resolved_at":
+                set_[col] = func.least(KpiDailyRollup.first_resolved_at, stmt.excluded.first_resolved_at)
+            elif col == "last_resolved_at":
+                set_[col] = func.greatest(KpiDailyRollup.last_resolved_at, stmt.excluded.last_resolved_at)
+            else:
+                set_[col] = getattr(KpiDailyRollup, col) + getattr(stmt.excluded, col)
+        set_["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(constraint="uq_kpi_rollup_day_asset", set_=set_)
+        await db.execute(stmt)
+
+    counter_deltas: Dict[Tuple[str, str], int] = {}
+    for key, val in old_counters:
+        counter_deltas[key] = counter_deltas.get(key, 0) - val
+    for key, val in new_counters:
+        counter_deltas[key] = counter_deltas.get(key, 0) + val
+    for (scope, key), val in counter_deltas.items():
+        if not val:
+            continue
+        stmt = pg_insert(KpiCounter).values(scope=scope, key=key, value=val)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[KpiCounter.scope, KpiCounter.key],
+            set_={"value": KpiCounter.value + stmt.excluded.value},
+        )
+        await db.execute(stmt)
+    return refresh_resolved
+
+
+async def _refresh_resolved_bounds(db: AsyncSession, keys: List[RollupKey]) -> None:
+    """Recalcula first/last_resolved_at de un día/asset tras retirar una resolución (min/max no son restables)."""
+    asset_key = func.coalesce(Failure.asset_id, Component.asset_id, NO_ASSET)
+    for day, asset_id in keys:
+        start = datetime.combine(day, datetime.min.time())
+        end = datetime.combine(day, datetime.max.time())
+        res = await db.execute(
+            select(func.min(Failure.resolved_date), func.max(Failure.resolved_date))
+            .select_from(Failure)
+            .outerjoin(Component, Component.id == Failure.component_id)
+            .where(Failure.resolved_date >= start, Failure.resolved_date <= end, asset_key == asset_id)
+        )
+        first, last = res.one()
+        await db.execute(
+            KpiDailyRollup.__table__.update()
+            .where(and_(KpiDailyRollup.day == day, KpiDailyRollup.asset_id == asset_id))
+            .values(first_resolved_at=first, last_resolved_at=last)
+        )
+
+
+async def record_workorder_change(db: AsyncSession, old: Dict[str, Any] | None, new: Dict[str, Any] | None) -> None:
+    """Registra creación (old=None), modificación o borrado (new=None) de una WorkOrder. No hace commit."""
+    if old == new:
+        return
+    await _apply(db, _workorder_contributions(old), _workorder_contributions(new))
+
+
+async def record_workorder_changes(db: AsyncSession, changes: Iterable[Tuple[Dict[str, Any] | None, Dict[str, Any] | None]]) -> None:
+    """Versión en bloque de record_workorder_change: suma los deltas de todas las (old, new) y hace un upsert por clave."""
+    old_rollups, old_counters, new_rollups, new_counters = [], [], [], []
+    for old, new in changes:
+        if old == new:
+            continue
+        rollups, counters = _workorder_contributions(old)
+        old_rollups += rollups
+        old_counters += counters
+        rollups, counters = _workorder_contributions(new)
+        new_rollups += rollups
+        new_counters += counters
+    await _apply(db, (old_rollups, old_counters), (new_rollups, new_counters))
+
+
+def invalidate_trend_buckets(*states: Dict[str, Any] | None) -> None:
+    """Descarta los cubos semana/mes afectados por los snapshots dados. Llamar tras el commit."""
+    for state in states:
+        if not state:
+            continue
+        for dt in (state["created_at"], state["completed_date"]):
+            if dt is None:
+                continue
+            trend_bucket_cache.invalidate(("week", week_label(dt)))
+            trend_bucket_cache.invalidate(("month", month_label(dt)))
+
+
+async def record_failure_change(db: AsyncSession, old: Dict[str, Any] | None, new: Dict[str, Any] | None) -> None:
+    """Registra creación, modificación o borrado de un Failure, incluidos los tramos MTTF. No hace commit.
+
+    Llamar con el cambio ya volcado (flush): los vecinos del fallo se buscan en la tabla.
+    """
+    if old == new:
+        return
+    old_rollups, old_counters = _failure_contributions(old)
+    new_rollups, new_counters = _failure_contributions(new)
+    for state, current, replaced in ((old, old_rollups, new_rollups), (new, new_rollups, old_rollups)):
+        if state is None:
+            continue
+        with_spans, without_spans = await _mttf_spans(db, state)
+        current += with_spans
+        replaced += without_spans
+    refresh = await _apply(db, (old_rollups, old_counters), (new_rollups, new_counters))
+    if refresh:
+        await db.flush()
+        await _refresh_resolved_bounds(db, refresh)
+
+
+def _mttf_span(resolved: datetime | None, asset_id: int, next_reported: datetime | None) -> List[Tuple[RollupKey, Dict[str, Any]]]:
+    """Tramo MTTF de un fallo resuelto hasta el reporte del siguiente (lista vacía si no hay)."""
+    if resolved is None or next_reported is None or resolved > next_reported:
+        return []
+    return [((resolved.date(), asset_id), {"mttf_hours_sum": _hours(next_reported, resolved), "mttf_count": 1})]
+
+
+async def _mttf_spans(db: AsyncSession, state: Dict[str, Any]):
+    """Tramos MTTF que dependen de la posición de `state` en el orden (reported_date, id).
+
+    Con el resto de fallos fijo (la tabla sin `state`), su presencia aporta anterior→él y
+    él→siguiente y quita anterior→siguiente. Devuelve (tramos con él, tramos sin él): el
+    delta de un cambio es con(nuevo) - sin(nuevo) - con(viejo) + sin(viejo).
+    """
+    key = tuple_(Failure.reported_date, Failure.id)
+    position = tuple_(
+        literal(_aware_utc(state["reported_date"]), Failure.reported_date.type),
+        literal(state["id"], Failure.id.type),
+    )
+    others = Failure.id != state["id"]
+    prev = (await db.execute(
+        select(Failure.resolved_date, func.coalesce(Failure.asset_id, Component.asset_id, NO_ASSET))
+        .outerjoin(Component, Component.id == Failure.component_id)
+        .where(others, key < position)
+        .order_by(Failure.reported_date.desc(), Failure.id.desc())
+        .limit(1)
+    )).first()
+    next_reported = _naive_utc((await db.execute(
+        select(Failure.reported_date)
+        .where(others, key > position)
+        .order_by(Failure.reported_date, Failure.id)
+        .limit(1)
+    )).scalar())
+
+    with_spans = _mttf_span(state["resolved_date"], state["asset_id"], next_reported)
+    without_spans: List[Tuple[RollupKey, Dict[str, Any]]] = []
+    if prev is not None:
+        prev_resolved, prev_asset = _naive_utc(prev[0]), prev[1]
+        with_spans += _mttf_span(prev_resolved, prev_asset, state["reported_date"])
+        without_spans += _mttf_span(prev_resolved, prev_asset, next_reported)
+    return with_spans, without_spans
+
+
+# ---------------------------------------------------------------------------
+# Reconstrucción completa (reparación)
+# ---------------------------------------------------------------------------
+
+ROLLUP_COLUMNS = (
+    "wo_created", "wo_planned", "wo_completed", "wo_closed",
+    "repair_hours_sum", "repair_count", "completion_hours_sum", "completion_count",
+    "response_hours_sum", "response_count",
+    "failures_reported", "failures_resolved", "first_resolved_at", "last_resolved_at",
+    "mttf_hours_sum", "mttf_count",
+)
+
+# Acumulados esperados según workorders/failures (el rebuild los inserta; verify los compara)
+_EXPECTED_ROLLUPS_SQL = """
+SELECT day, asset_id,
+       SUM(wo_created), SUM(wo_planned), SUM(wo_completed), SUM(wo_closed),
+       SUM(repair_hours_sum), SUM(repair_count), SUM(completion_hours_sum), SUM(completion_count),
+       SUM(response_hours_sum), SUM(response_count),
+       SUM(failures_reported), SUM(failures_resolved), MIN(first_resolved_at), MAX(last_resolved_at),
+       SUM(mttf_hours_sum), SUM(mttf_count)
+FROM (
+    SELECT (w.created_at AT TIME ZONE 'UTC')::date AS day, w.asset_id,
+           1 AS wo_created, CASE WHEN w.scheduled_date IS NOT NULL THEN 1 ELSE 0 END AS wo_planned, 0 AS wo_completed, 0 AS wo_closed,
+           0.0 AS repair_hours_sum, 0 AS repair_count, 0.0 AS completion_hours_sum, 0 AS completion_count,
+           0.0 AS response_hours_sum, 0 AS response_count,
+           0 AS failures_reported, 0 AS failures_resolved,
+           NULL::timestamp AS first_resolved_at, NULL::timestamp AS last_resolved_at,
+           0.0 AS mttf_hours_sum, 0 AS mttf_count
+    FROM workorders w
+    WHERE w.created_at IS NOT NULL
+    UNION ALL
+    SELECT w.completed_date::date, w.asset_id,
+           0, 0, CASE WHEN w.status = 'COMPLETED' THEN 1 ELSE 0 END, 1,
+           COALESCE(EXTRACT(EPOCH FROM w.completed_date - w.started_date) / 3600.0, 0.0),
+           CASE WHEN w.started_date IS NOT NULL THEN 1 ELSE 0 END,
+           COALESCE(EXTRACT(EPOCH FROM w.completed_date - (w.created_at AT TIME ZONE 'UTC')) / 3600.0, 0.0),
+           CASE WHEN w.created_at IS NOT NULL THEN 1 ELSE 0 END,
+           COALESCE(EXTRACT(EPOCH FROM w.completed_date - COALESCE(w.started_date, w.created_at AT TIME ZONE 'UTC')) / 3600.0, 0.0),
+           CASE WHEN w.started_date IS NOT NULL OR w.created_at IS NOT NULL THEN 1 ELSE 0 END,
+           0, 0, NULL::timestamp, NULL::timestamp, 0.0, 0
+    FROM workorders w
+    WHERE w.completed_date IS NOT NULL
+    UNION ALL
+    SELECT (f.reported_date AT TIME ZONE 'UTC')::date, COALESCE(f.asset_id, c.asset_id, 0),
+           0, 0, 0, 0, 0.0, 0, 0.0, 0, 0.0, 0,
+           1, 0, NULL::timestamp, NULL::timestamp, 0.0, 0
+    FROM failures f LEFT JOIN components c ON c.id = f.component_id
+    WHERE f.reported_date IS NOT NULL
+    UNION ALL
+    SELECT f.resolved_date::date, COALESCE(f.asset_id, c.asset_id, 0),
+           0, 0, 0, 0, 0.0, 0, 0.0, 0, 0.0, 0,
+           0, 1, f.resolved_date, f.resolved_date, 0.0, 0
+    FROM failures f LEFT JOIN components c ON c.id = f.component_id
+    WHERE f.resolved_date IS NOT NULL
+    UNION ALL
+    SELECT s.resolved_date::date, s.asset_key,
+           0, 0, 0, 0, 0.0, 0, 0.0, 0, 0.0, 0,
+           0, 0, NULL::timestamp, NULL::timestamp,
+           EXTRACT(EPOCH FROM s.next_reported - s.resolved_date) / 3600.0, 1
+    FROM (
+        SELECT f.resolved_date, COALESCE(f.asset_id, c.asset_id, 0) AS asset_key,
+               LEAD(f.reported_date AT TIME ZONE 'UTC') OVER (ORDER BY f.reported_date, f.id) AS next_reported
+        FROM failures f LEFT JOIN components c ON c.id = f.component_id
+        WHERE f.reported_date IS NOT NULL
+    ) s
+    WHERE s.resolved_date IS NOT NULL AND s.next_reported IS NOT NULL AND s.resolved_date <= s.next_reported
+) contrib
+GROUP BY day, asset_id
+"""
+
+_REBUILD_ROLLUPS_SQL = f"""
+INSERT INTO kpi_daily_rollups (day, asset_id, {", ".join(ROLLUP_COLUMNS)})
+{_EXPECTED_ROLLUPS_SQL}
+"""
+
+# Claves normalizadas como _norm (trim + mayúsculas) para cuadrar con filas antiguas mal escritas
+_EXPECTED_COUNTERS_SQL = """
+SELECT 'workorder_status' AS scope, upper(btrim(status)) AS key, COUNT(*) AS value
+FROM workorders WHERE btrim(status) <> '' GROUP BY 2
+UNION ALL
+SELECT 'failure_status', upper(btrim(status)), COUNT(*) FROM failures WHERE btrim(status) <> '' GROUP BY 2
+UNION ALL
+SELECT 'failure_severity', upper(btrim(severity)), COUNT(*) FROM failures WHERE btrim(severity) <> '' GROUP BY 2
+"""
+
+_REBUILD_COUNTERS_SQL = f"""
+INSERT INTO kpi_counters (scope, key, value)
+{_EXPECTED_COUNTERS_SQL}
+"""
+
+# Claves cuyo acumulado incremental difiere del esperado (las filas a cero equivalen a no tener fila)
+_ROLLUP_DRIFT_SQL = f"""
+SELECT coalesce(e.day, r.day) AS day, coalesce(e.asset_id, r.asset_id) AS asset_id
+FROM ({_EXPECTED_ROLLUPS_SQL}) e
+FULL JOIN kpi_daily_rollups r ON r.day = e.day AND r.asset_id = e.asset_id
+WHERE {" OR ".join(
+    f"e.{c} IS DISTINCT FROM r.{c}" if c.endswith("_at")
+    else f"abs(coalesce(e.{c}, 0) - coalesce(r.{c}, 0)) > 1e-6 * greatest(1, abs(coalesce(e.{c}, 0)))"
+    for c in ROLLUP_COLUMNS
+)}
+ORDER BY 1, 2
+"""
+
+_COUNTER_DRIFT_SQL = f"""
+SELECT coalesce(e.scope, c.scope) AS scope, coalesce(e.key, c.key) AS key
+FROM ({_EXPECTED_COUNTERS_SQL}) e
+FULL JOIN kpi_counters c ON c.scope = e.scope AND c.key = e.key
+WHERE coalesce(e.value, 0) <> coalesce(c.value, 0)
+ORDER BY 1, 2
+"""
+
+
+async def rebuild_kpi_rollups(db: AsyncSession, commit: bool = True) -> None:
+    """Recalcula por completo kpi_daily_rollups y kpi_counters a partir de workorders/failures."""
+    await db.execute(text("LOCK TABLE kpi_daily_rollups, kpi_counters IN EXCLUSIVE MODE"))
+    await db.execute(text("DELETE FROM kpi_daily_rollups"))
+    await db.execute(text("DELETE FROM kpi_counters"))
+    await db.execute(text(_REBUILD_ROLLUPS_SQL))
+    await db.execute(text(_REBUILD_COUNTERS_SQL))
+    if commit:
+        await db.commit()
+    trend_bucket_cache.clear()
+
+
+async def verify_kpi_rollups(db: AsyncSession, sample: int = 20) -> Dict[str, Any]:
+    """Compara los acumulados incrementales con los de un rebuild, sin escribir nada.
+
+    Devuelve cuántas claves (día, asset) y contadores difieren y una muestra de cada.
+    """
+    rollups = (await db.execute(text(_ROLLUP_DRIFT_SQL))).all()
+    counters = (await db.execute(text(_COUNTER_DRIFT_SQL))).all()
+    return {
+        "rollup_keys": len(rollups),
+        "counter_keys": len(counters),
+        "rollups_sample": [{"day": day, "asset_id": asset_id} for day, asset_id in rollups[:sample]],
+        "counters_sample": [{"scope": scope, "key": key} for scope, key in counters[:sample]],
+    }
+
+
+async def ensure_kpi_rollups(db: AsyncSession) -> bool:
+    """Construye los acumulados si aún no existen (primer arranque tras desplegar). Devuelve True si los reconstruyó."""
+    has_counters = (await db.execute(select(KpiCounter.scope).limit(1))).first()
+    if has_counters:
+        return False
+    logger.info("Construyendo acumulados de KPI desde el histórico...")
+    await rebuild_kpi_rollups(db)
+    return True
@@ -3,6 +3,7 @@ from sqlalchemy.future import select
 from app.models.maintenance import Maintenance
 from app.schemas.maintenance import MaintenanceCreate, MaintenanceRead, MaintenanceUpdate
 from datetime import datetime, timezone
+from app.pagination import apply_keyset
 
 async def create_maintenance(db: AsyncSession, maintenance_in: MaintenanceCreate):
     """Create a new maintenance record"""
@@ -49,7 +50,8 @@ async def get_all_maintenance(
     db: AsyncSession,
     page: int = 1,
     page_size: int = 20,
-    search: str = None
+    search: str = None,
+    cursor: str | None = None,
 ):
     """Get all maintenance records with pagination and optional search"""
     offset = (page - 1) * page_size
@@ -63,15 +65,21 @@ async def get_all_maintenance(
             (Maintenance.status.ilike(search_term))
         )
     
-    query = query.offset(offset).limit(page_size)
+    # Orden estable (created_at, id); con cursor se continúa por keyset en lugar de OFFSET
+    query = apply_keyset(query, Maintenance.created_at, Maintenance.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
+def maintenance_by_asset_query(asset_id: int):
+    """Maintenance history query for an asset, shared by the list and the export"""
+    return select(Maintenance).where(Maintenance.asset_id == asset_id)
+
 async def get_maintenance_by_asset(db: AsyncSession, asset_id: int):
     """Get all maintenance records for a specific asset"""
-    result = await db.execute(
-        select(Maintenance).where(Maintenance.asset_id == asset_id)
-    )
+    result = await db.execute(maintenance_by_asset_query(asset_id))
     return result.scalars().all()
 
 async def update_maintenance(db: AsyncSession, maintenance_id: int, maintenance_in: MaintenanceUpdate):
@@ -7,6 +7,10 @@ from app.schemas.maintenance_plan import (
     MaintenancePlanUpdate,
 )
 from datetime import datetime, timezone
+from app.pagination import apply_keyset
+from app.controllers.stock_health import refresh_stock_health
+from app.controllers.plan_occurrences import refresh_plan_occurrences
+from app.controllers.forecast import forecast_week_cache
 
 
 def _naive_utc(dt: datetime | None) -> datetime | None:
@@ -49,7 +53,11 @@ async def create_maintenance_plan(db: AsyncSession, plan_in: MaintenancePlanCrea
         updated_at=now_aware,
     )
     db.add(new_plan)
+    await db.flush()
+    await refresh_plan_occurrences(db, [new_plan.id])
+    await refresh_stock_health(db, [new_plan.component_id])
     await db.commit()
+    forecast_week_cache.clear()
     await db.refresh(new_plan)
     return new_plan
 
@@ -59,7 +67,7 @@ async def get_maintenance_plan(db: AsyncSession, plan_id: int):
     return result.scalar_one_or_none()
 
 
-async def get_all_maintenance_plans(db: AsyncSession, page: int = 1, page_size: int = 20, search: str = None, asset_id: int = None):
+async def get_all_maintenance_plans(db: AsyncSession, page: int = 1, page_size: int = 20, search: str = None, asset_id: int = None, cursor: str | None = None):
     offset = (page - 1) * page_size
     query = select(MaintenancePlan)
     if search:
@@ -70,7 +78,10 @@ async def get_all_maintenance_plans(db: AsyncSession, page: int = 1, page_size:
         )
     if asset_id is not None:
         query = query.where(MaintenancePlan.asset_id == asset_id)
-    query = query.offset(offset).limit(page_size)
+    query = apply_keyset(query, MaintenancePlan.created_at, MaintenancePlan.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -80,6 +91,7 @@ async def update_maintenance_plan(db: AsyncSession, plan_id: int, plan_in: Maint
     plan = result.scalar_one_or_none()
     if plan is None:
         return None
+    previous_component_id = plan.component_id
     update_data = plan_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         if key == 'plan_type' and value is not None:
@@ -90,7 +102,11 @@ async def update_maintenance_plan(db: AsyncSession, plan_id: int, plan_in: Maint
         else:
             setattr(plan, key, value)
     plan.updated_at = datetime.now(timezone.utc)
+    # La demanda prevista de stock depende de componente, fechas, frecuencia y estado del plan
+    await refresh_plan_occurrences(db, [plan.id])
+    await refresh_stock_health(db, [previous_component_id, plan.component_id])
     await db.commit()
+    forecast_week_cache.clear()
     await db.refresh(plan)
     return plan
 
@@ -100,6 +116,9 @@ async def delete_maintenance_plan(db: AsyncSession, plan_id: int):
     plan = result.scalar_one_or_none()
     if plan is None:
         return False
+    component_id = plan.component_id
     await db.delete(plan)
+    await refresh_stock_health(db, [component_id])
     await db.commit()
+    forecast_week_cache.clear()
     return True
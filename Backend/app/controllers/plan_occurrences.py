@@ -0,0 +1,185 @@
+"""Motor de recurrencia de los planes de mantenimiento.
+
+La frecuencia de un plan (frequency_days/weeks/months) se interpreta como un único periodo
+de "meses + días" y las ocurrencias se calculan siempre desde el ancla next_due_date (la
+ocurrencia n es ancla + n periodos), así el recorte de fin de mes no se acumula.
+
+plan_occurrences guarda las próximas ocurrencias de cada plan activo (como mucho
+PLAN_OCCURRENCES_MAX dentro de PLAN_OCCURRENCES_HORIZON_DAYS). Un plan vencido se proyecta
+desde la primera ocurrencia a partir de hoy. La tabla se recalcula por plan en la misma
+transacción que su alta, edición o avance por el planificador, y entera una vez al día.
+"""
+import calendar
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+import logging
+
+from sqlalchemy import delete, func, insert, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.component import Component
+from app.models.maintenancePlan import MaintenancePlan, PlanOccurrence
+
+logger = logging.getLogger(__name__)
+
+_INSERT_CHUNK = 5000
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    """Suma meses de calendario; el día se recorta al último del mes destino (31 ene + 1 = 28/29 feb)."""
+    month_index = dt.month - 1 + months
+    year, month = dt.year + month_index // 12, month_index % 12 + 1
+    return dt.replace(year=year, month=month, day=min(dt.day, calendar.monthrange(year, month)[1]))
+
+
+def plan_step(frequency_days: Optional[int], frequency_weeks: Optional[int], frequency_months: Optional[int]):
+    """Periodo del plan como (meses, timedelta); None si no tiene frecuencia."""
+    months = frequency_months or 0
+    delta = timedelta(days=(frequency_days or 0) + 7 * (frequency_weeks or 0))
+    if months <= 0 and delta <= timedelta(0):
+        return None
+    return max(months, 0), max(delta, timedelta(0))
+
+
+def nth_occurrence(due: datetime, step, n: int) -> datetime:
+    """Ocurrencia n de la serie que empieza en `due` (n=0 es `due`), siempre calculada desde el ancla."""
+    months, delta = step
+    return (add_months(due, months * n) if months else due) + delta * n
+
+
+def next_occurrence(due: datetime, step, after: datetime) -> datetime:
+    """Primera ocurrencia de la serie que empieza en `due` estrictamente posterior a `after`.
+
+    Los periodos solo en días/semanas saltan directamente con aritmética entera; los que
+    llevan meses avanzan periodo a periodo desde `due` (sin acumular el recorte de fin de mes).
+    """
+    months, delta = step
+    if months == 0:
+        if due > after:
+            return due
+        return nth_occurrence(due, step, (after - due) // delta + 1)
+    n = 1
+    candidate = nth_occurrence(due, step, n)
+    while candidate <= after:
+        n += 1
+        candidate = nth_occurrence(due, step, n)
+    return candidate
+
+
+def project_occurrences(due: datetime, step, start: datetime, until: datetime, limit: int) -> List[datetime]:
+    """Ocurrencias de la serie en [start, until], como mucho `limit`; salta las anteriores a start."""
+    if step is None:
+        return [due] if start <= due <= until else []
+    months, delta = step
+    n = 0
+    if due < start:
+        if months == 0:
+            n = -(-(start - due) // delta)  # primer n con due + n·delta >= start
+        else:
+            while nth_occurrence(due, step, n) < start:
+                n += 1
+    result = []
+    while len(result) < limit:
+        when = nth_occurrence(due, step, n)
+        if when > until:
+            break
+        result.append(when)
+        n += 1
+    return result
+
+
+async def refresh_plan_occurrences(db: AsyncSession, plan_ids: Optional[Iterable[int]] = None) -> int:
+    """Recalcula las ocurrencias de los planes indicados (todos si None). No hace commit.
+
+    Devuelve el número de ocurrencias insertadas.
+    """
+    ids = None
+    if plan_ids is not None:
+        ids = sorted({pid for pid in plan_ids if pid is not None})
+        if not ids:
+            return 0
+        await db.execute(delete(PlanOccurrence).where(PlanOccurrence.plan_id.in_(ids)))
+    else:
+        await db.execute(delete(PlanOccurrence))
+
+    query = (
+        select(
+            MaintenancePlan.id,
+            MaintenancePlan.next_due_date,
+            MaintenancePlan.frequency_days,
+            MaintenancePlan.frequency_weeks,
+            MaintenancePlan.frequency_months,
+            MaintenancePlan.estimated_duration,
+            MaintenancePlan.component_id,
+            func.coalesce(MaintenancePlan.asset_id, Component.asset_id).label("asset_id"),
+        )
+        .outerjoin(Component, Component.id == MaintenancePlan.component_id)
+        .where(MaintenancePlan.active == true(), MaintenancePlan.next_due_date.is_not(None))
+    )
+    if ids is not None:
+        query = query.where(MaintenancePlan.id.in_(ids))
+
+    start = datetime.now(timezone.utc).replace(tzinfo=None)  # next_due_date es naive UTC
+    until = start + timedelta(days=settings.PLAN_OCCURRENCES_HORIZON_DAYS)
+    rows, inserted = [], 0
+    for plan in (await db.execute(query)).all():
+        step = plan_step(plan.frequency_days, plan.frequency_weeks, plan.frequency_months)
+        for seq, due in enumerate(project_occurrences(plan.next_due_date, step, start, until, settings.PLAN_OCCURRENCES_MAX)):
+            rows.append({
+                "plan_id": plan.id,
+                "seq": seq,
+                "due_date": due,
+                "asset_id": plan.asset_id,
+                "component_id": plan.component_id,
+                "estimated_duration": plan.estimated_duration,
+            })
+        if len(rows) >= _INSERT_CHUNK:
+            await db.execute(insert(PlanOccurrence), rows)
+            inserted += len(rows)
+            rows = []
+    if rows:
+        await db.execute(insert(PlanOccurrence), rows)
+        inserted += len(rows)
+    return inserted
+
+
+async def ensure_plan_occurrences(db: AsyncSession) -> bool:
+    """Proyecta todas las ocurrencias si la tabla está vacía (primer arranque). Devuelve True si la construyó."""
+    if (await db.execute(select(PlanOccurrence.plan_id).limit(1))).first():
+        return False
+    logger.info("Proyectando ocurrencias de planes...")
+    inserted = await refresh_plan_occurrences(db)
+    await db.commit()
+    return inserted > 0
+
+
+async def get_plan_occurrences(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    asset_ids: Optional[List[int]] = None,
+    limit: int = 1000,
+):
+    """Ocurrencias en [start, end] (naive UTC), opcionalmente de ciertos activos, por fecha."""
+    query = (
+        select(PlanOccurrence, MaintenancePlan.name)
+        .join(MaintenancePlan, MaintenancePlan.id == PlanOccurrence.plan_id)
+        .where(PlanOccurrence.due_date >= start, PlanOccurrence.due_date <= end)
+    )
+    if asset_ids:
+        query = query.where(PlanOccurrence.asset_id.in_(asset_ids))
+    query = query.order_by(PlanOccurrence.due_date, PlanOccurrence.plan_id).limit(limit)
+    res = await db.execute(query)
+    return [
+        {
+            "plan_id": occ.plan_id,
+            "plan_name": name,
+            "seq": occ.seq,
+            "due_date": occ.due_date,
+            "asset_id": occ.asset_id,
+            "component_id": occ.component_id,
+            "estimated_duration": occ.estimated_duration,
+        }
+        for occ, name in res.all()
+    ]
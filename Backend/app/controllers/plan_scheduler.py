@@ -0,0 +1,139 @@
+"""Generación de órdenes de trabajo a partir de los planes de mantenimiento vencidos.
+
+Cada pasada toma por lotes los planes activos con next_due_date vencida y sin WorkOrder
+activa (el mismo criterio de bloqueo que /maintenance/plans/upcoming), crea una orden por
+plan con un INSERT multi-fila y avanza next_due_date a la siguiente ocurrencia posterior a
+ahora: un plan atrasado varios periodos genera una sola orden, no una por periodo perdido.
+Los planes sin frecuencia son de una sola ejecución y quedan sin next_due_date.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import logging
+
+from sqlalchemy import exists, func, insert, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.component import Component
+from app.models.enums import PlanType, WorkOrderPriority, WorkOrderStatus, WorkOrderType
+from app.models.maintenancePlan import MaintenancePlan
+from app.models.user import User
+from app.models.workorder import WorkOrder
+from app.controllers.kpi_rollup import invalidate_trend_buckets, record_workorder_changes, workorder_snapshot
+from app.controllers.plan_occurrences import next_occurrence, plan_step, refresh_plan_occurrences
+from app.controllers.forecast import forecast_week_cache
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_WO_STATUSES = (
+    WorkOrderStatus.OPEN.value,
+    WorkOrderStatus.ASSIGNED.value,
+    WorkOrderStatus.IN_PROGRESS.value,
+)
+
+
+def _work_type(plan_type: Optional[str]) -> str:
+    if plan_type == PlanType.INSPECTION.value:
+        return WorkOrderType.INSPECTION.value
+    return WorkOrderType.MAINTENANCE.value
+
+
+async def _scheduler_user_id(db: AsyncSession) -> Optional[int]:
+    """Autor de las órdenes generadas: PLAN_SCHEDULER_USER_ID o el primer Admin activo."""
+    if settings.PLAN_SCHEDULER_USER_ID:
+        return settings.PLAN_SCHEDULER_USER_ID
+    res = await db.execute(
+        select(User.id).where(User.role == "Admin", User.is_active.is_not(False)).order_by(User.id).limit(1)
+    )
+    return res.scalar_one_or_none()
+
+
+def _due_plans_query(now: datetime, batch_size: int):
+    active_wo_exists = exists().where(
+        WorkOrder.plan_id == MaintenancePlan.id,
+        WorkOrder.status.in_(ACTIVE_WO_STATUSES),
+    )
+    # Índice parcial ix_maintenance_plans_next_due_active (next_due_date) WHERE active = true
+    return (
+        select(MaintenancePlan, func.coalesce(MaintenancePlan.asset_id, Component.asset_id).label("target_asset_id"))
+        .outerjoin(Component, Component.id == MaintenancePlan.component_id)
+        .where(
+            MaintenancePlan.active == true(),
+            MaintenancePlan.next_due_date.is_not(None),
+            MaintenancePlan.next_due_date <= now,
+            ~active_wo_exists,
+        )
+        .order_by(MaintenancePlan.next_due_date, MaintenancePlan.id)
+        .limit(batch_size)
+        # Varias pasadas simultáneas (p.ej. un job manual) no generan dos veces el mismo plan
+        .with_for_update(of=MaintenancePlan, skip_locked=True)
+    )
+
+
+async def generate_due_workorders(
+    db: AsyncSession,
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Genera las órdenes de todos los planes vencidos, un lote (y un commit) cada vez.
+
+    Devuelve un resumen: órdenes creadas, planes avanzados, planes omitidos (sin activo al que
+    asignar la orden), lotes y el retraso máximo (segundos) de los planes procesados.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)  # next_due_date es naive UTC
+    batch_size = batch_size or settings.PLAN_SCHEDULER_BATCH_SIZE
+    summary = {"workorders": 0, "plans": 0, "skipped": 0, "batches": 0, "max_lag_seconds": 0.0}
+    created_by = await _scheduler_user_id(db)
+    if created_by is None:
+        logger.warning("Planificador: no hay usuario Admin para firmar las órdenes generadas")
+        return summary
+
+    while True:
+        rows = (await db.execute(_due_plans_query(now, batch_size))).all()
+        if not rows:
+            break
+        summary["batches"] += 1
+        summary["max_lag_seconds"] = max(summary["max_lag_seconds"], (now - rows[0][0].next_due_date).total_seconds())
+
+        new_orders: List[Dict[str, Any]] = []
+        advances: List[Dict[str, Any]] = []
+        for plan, asset_id in rows:
+            step = plan_step(plan.frequency_days, plan.frequency_weeks, plan.frequency_months)
+            next_due = next_occurrence(plan.next_due_date, step, now) if step else None
+            advances.append({"id": plan.id, "next_due_date": next_due})
+            if asset_id is None:
+                # Sin activo no se puede crear la orden; se avanza igualmente para no bloquear el lote
+                summary["skipped"] += 1
+                continue
+            new_orders.append({
+                "title": plan.name[:200],
+                "description": plan.description,
+                "status": WorkOrderStatus.OPEN.value,
+                "work_type": _work_type(plan.plan_type),
+                "priority": WorkOrderPriority.MEDIUM.value,
+                "estimated_hours": plan.estimated_duration,
+                "estimated_cost": plan.estimated_cost,
+                "scheduled_date": plan.next_due_date,
+                "asset_id": asset_id,
+                "created_by": created_by,
+                "plan_id": plan.id,
+            })
+
+        snapshots = []
+        if new_orders:
+            result = await db.execute(insert(WorkOrder).returning(WorkOrder), new_orders)
+            snapshots = [workorder_snapshot(wo) for wo in result.scalars().all()]
+            await record_workorder_changes(db, [(None, snap) for snap in snapshots])
+        await db.execute(
+            update(MaintenancePlan).execution_options(synchronize_session=False),
+            [{**a, "updated_at": datetime.now(timezone.utc)} for a in advances],
+        )
+        await refresh_plan_occurrences(db, [a["id"] for a in advances])
+        await db.commit()
+        invalidate_trend_buckets(*snapshots)
+        forecast_week_cache.clear()
+        summary["workorders"] += len(new_orders)
+        summary["plans"] += len(rows)
+        if len(rows) < batch_size:
+            break
+    return summary
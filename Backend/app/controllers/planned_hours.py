@@ -0,0 +1,144 @@
+"""Horas planificadas por (usuario, día) para validar capacidad con una lectura por clave.
+
+La validación de una tarea bloquea antes su fila (lock_planned_hours), así que dos altas
+concurrentes para el mismo día no pueden pasar las dos con el mismo total.
+
+user_day_planned_hours acumula, por responsable y día de due_date, la suma de
+estimated_hours y el número de tareas (de cualquier estado, igual que la validación de
+capacidad de siempre). Cada escritura de tareas registra su delta (old → new) en la misma
+transacción con un upsert por clave; las filas que se quedan sin tareas se borran.
+rebuild_planned_hours lo recalcula desde tasks y devuelve cuántas claves estaban
+descuadradas (escrituras fuera de estos controladores, borrados de usuarios...).
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.task import UserDayLoad
+
+logger = logging.getLogger(__name__)
+
+TaskLoad = Tuple[int, date, float]
+
+
+def task_load(assigned_to: Optional[int], due_date: Optional[datetime], estimated_hours: Optional[float]) -> Optional[TaskLoad]:
+    """Aportación de una tarea: (usuario, día, horas), o None si no tiene responsable o fecha."""
+    if not assigned_to or due_date is None:
+        return None
+    day = due_date.date() if isinstance(due_date, datetime) else due_date
+    return assigned_to, day, float(estimated_hours or 0.0)
+
+
+async def record_task_loads(db: AsyncSession, changes: Iterable[Tuple[Optional[TaskLoad], Optional[TaskLoad]]]) -> None:
+    """Aplica los cambios (old, new) de varias tareas: un upsert multi-fila con la suma por clave. No hace commit."""
+    deltas: Dict[Tuple[int, date], list] = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        for sign, load in ((-1, old), (1, new)):
+            if load is None:
+                continue
+            acc = deltas.setdefault(load[:2], [0.0, 0])
+            acc[0] += sign * load[2]
+            acc[1] += sign
+    rows = [
+        {"user_id": uid, "day": day, "planned_hours": hours, "task_count": count}
+        for (uid, day), (hours, count) in sorted(deltas.items())  # orden fijo de bloqueo entre transacciones
+        if hours or count
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(UserDayLoad).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserDayLoad.user_id, UserDayLoad.day],
+        set_={
+            "planned_hours": UserDayLoad.planned_hours + stmt.excluded.planned_hours,
+            "task_count": UserDayLoad.task_count + stmt.excluded.task_count,
+            "updated_at": func.now(),
+        },
+    ))
+    await db.execute(
+        delete(UserDayLoad)
+        .where(
+            tuple_(UserDayLoad.user_id, UserDayLoad.day).in_([(r["user_id"], r["day"]) for r in rows]),
+            UserDayLoad.task_count <= 0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_planned_hours_map(
+    db: AsyncSession, user_ids: Sequence[int], start: date, end: date
+) -> Dict[Tuple[int, date], float]:
+    """Horas planificadas de cada (usuario, día) con día en [start, end]."""
+    if not user_ids:
+        return {}
+    res = await db.execute(
+        select(UserDayLoad.user_id, UserDayLoad.day, UserDayLoad.planned_hours)
+        .where(UserDayLoad.user_id.in_(user_ids), UserDayLoad.day >= start, UserDayLoad.day <= end)
+    )
+    return {(uid, day): float(hours) for uid, day, hours in res.all()}
+
+
+async def lock_planned_hours(db: AsyncSession, keys: Iterable[Tuple[int, date]]) -> Dict[Tuple[int, date], float]:
+    """Bloquea las filas (usuario, día) y devuelve sus horas planificadas. No hace commit.
+
+    Un upsert vacío (ON CONFLICT DO UPDATE) crea la fila si falta y la deja bloqueada hasta el
+    commit: dos validaciones de capacidad concurrentes sobre el mismo día se serializan en vez
+    de leer las dos el mismo total. Las claves se bloquean en orden fijo, como en record_task_loads.
+    """
+    rows = [{"user_id": uid, "day": day, "planned_hours": 0.0, "task_count": 0} for uid, day in sorted(set(keys))]
+    if not rows:
+        return {}
+    stmt = pg_insert(UserDayLoad).values(rows)
+    res = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserDayLoad.user_id, UserDayLoad.day],
+            set_={"planned_hours": UserDayLoad.planned_hours},
+        ).returning(UserDayLoad.user_id, UserDayLoad.day, UserDayLoad.planned_hours)
+    )
+    return {(uid, day): float(hours or 0.0) for uid, day, hours in res.all()}
+
+
+_ACTUAL_SQL = """
+    SELECT assigned_to AS user_id, CAST(due_date AS date) AS day,
+           coalesce(sum(estimated_hours), 0) AS planned_hours, count(*) AS task_count
+    FROM tasks
+    WHERE assigned_to IS NOT NULL AND due_date IS NOT NULL
+    GROUP BY assigned_to, CAST(due_date AS date)
+"""
+
+_DRIFT_SQL = f"""
+    SELECT count(*)
+    FROM ({_ACTUAL_SQL}) a
+    FULL JOIN user_day_planned_hours l ON l.user_id = a.user_id AND l.day = a.day
+    WHERE a.user_id IS NULL OR l.user_id IS NULL
+       OR l.task_count <> a.task_count OR abs(l.planned_hours - a.planned_hours) > 1e-6
+"""
+
+
+async def rebuild_planned_hours(db: AsyncSession) -> int:
+    """Recalcula user_day_planned_hours desde tasks y hace commit. Devuelve las claves que estaban mal."""
+    # Las transacciones que escriben tareas esperan al lock y aplican su delta sobre lo reconstruido
+    await db.execute(text("LOCK TABLE user_day_planned_hours IN EXCLUSIVE MODE"))
+    drift = (await db.execute(text(_DRIFT_SQL))).scalar() or 0
+    if drift:
+        await db.execute(text("DELETE FROM user_day_planned_hours"))
+        await db.execute(text(
+            "INSERT INTO user_day_planned_hours (user_id, day, planned_hours, task_count, updated_at) "
+            f"SELECT user_id, day, planned_hours, task_count, now() FROM ({_ACTUAL_SQL}) a"
+        ))
+        logger.info("Horas planificadas reconstruidas: %s claves descuadradas", drift)
+    await db.commit()
+    return drift
+
+
+async def ensure_planned_hours(db: AsyncSession) -> bool:
+    """Construye el agregado si aún no existe (primer arranque). Devuelve True si lo construyó."""
+    if (await db.execute(select(UserDayLoad.user_id).limit(1))).first():
+        return False
+    return bool(await rebuild_planned_hours(db))
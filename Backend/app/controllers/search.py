@@ -0,0 +1,120 @@
+"""Búsqueda de texto sobre órdenes de trabajo, tareas, fallos, activos y componentes.
+
+Cada entidad tiene un "documento" de búsqueda: la concatenación de sus columnas de texto,
+indexada con un GIN pg_trgm sobre exactamente la misma expresión (ver SEARCH_INDEXES, que
+aplica apply_simple_migrations). Así tanto `documento ILIKE '%término%'` como el operador de
+similitud `documento %> término` se resuelven con el índice en lugar de un seq scan, y
+word_similarity() sirve para ordenar por relevancia.
+"""
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Integer, cast, func, literal, literal_column, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.asset import Asset
+from app.models.component import Component
+from app.models.failure import Failure
+from app.models.task import Task
+from app.models.workorder import WorkOrder
+
+# entidad -> (modelo, columna de título, columnas del documento)
+SEARCH_ENTITIES = {
+    "workorder": (WorkOrder, WorkOrder.title, (WorkOrder.title, WorkOrder.description)),
+    "task": (Task, Task.title, (Task.title, Task.description)),
+    "failure": (Failure, Failure.description, (Failure.description, Failure.resolution_notes)),
+    "asset": (Asset, Asset.name, (Asset.name, Asset.description)),
+    "component": (Component, Component.name, (Component.name, Component.description)),
+}
+
+# Las constantes van como literales (no parámetros) para que la expresión coincida con la del índice
+_EMPTY = literal_column("''")
+_SPACE = literal_column("' '")
+
+
+def _document(columns: Sequence):
+    expr = func.coalesce(columns[0], _EMPTY)
+    for col in columns[1:]:
+        expr = expr.op("||")(_SPACE).op("||")(func.coalesce(col, _EMPTY))
+    return expr
+
+
+def search_document(entity: str):
+    """Expresión SQL del documento de búsqueda de una entidad (la misma que indexa su GIN)."""
+    return _document(SEARCH_ENTITIES[entity][2])
+
+
+def _index_sql(entity: str) -> str:
+    model, _, columns = SEARCH_ENTITIES[entity]
+    table = model.__tablename__
+    parts = " || ' ' || ".join(f"coalesce({c.key}, '')" for c in columns)
+    return (
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm "
+        f"ON {table} USING gin (({parts}) gin_trgm_ops)"
+    )
+
+
+SEARCH_INDEXES = [_index_sql(entity) for entity in SEARCH_ENTITIES]
+
+
+def like_pattern(term: str) -> str:
+    """Patrón '%término%' con los comodines de LIKE escapados (usar con escape='\\\\')."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_filter(entity: str, term: str):
+    """Filtro por subcadena para los listados; usa el índice trigram de la entidad."""
+    return search_document(entity).ilike(like_pattern(term), escape="\\")
+
+
+async def search_all(
+    db: AsyncSession,
+    term: str,
+    entities: Optional[List[str]] = None,
+    limit: int = 20,
+):
+    """Busca `term` en las entidades indicadas y devuelve los resultados más relevantes.
+
+    Coinciden las filas que contienen el término como subcadena o que tienen una palabra
+    parecida (tolera erratas). Cada entidad aporta como mucho `limit` candidatos, ordenados
+    por word_similarity, y el conjunto se vuelve a ordenar y recortar.
+    """
+    term = term.strip()
+    entities = entities or list(SEARCH_ENTITIES)
+    pattern = like_pattern(term)
+    selects = []
+    for entity in entities:
+        model, title_col, _ = SEARCH_ENTITIES[entity]
+        doc = search_document(entity)
+        # Las coincidencias exactas por subcadena puntúan 1 para no quedar por debajo de las aproximadas
+        score = func.greatest(
+            func.word_similarity(term, doc),
+            cast(doc.ilike(pattern, escape="\\"), Integer),
+        )
+        selects.append(
+            select(
+                literal(entity).label("type"),
+                model.id.label("id"),
+                title_col.label("title"),
+                func.left(doc, 200).label("snippet"),
+                score.label("score"),
+            )
+            .where(or_(doc.ilike(pattern, escape="\\"), doc.op("%>")(term)))
+            .order_by(score.desc())
+            .limit(limit)
+        )
+    if not selects:
+        return []
+    combined = union_all(*selects).subquery()
+    query = combined.select().order_by(combined.c.score.desc(), combined.c.type, combined.c.id.desc()).limit(limit)
+    result = await db.execute(query)
+    return [
+        {
+            "type": row.type,
+            "id": row.id,
+            "title": row.title,
+            "snippet": row.snippet,
+            "score": round(float(row.score or 0), 4),
+        }
+        for row in result.all()
+    ]
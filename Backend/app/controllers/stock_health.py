@@ -0,0 +1,143 @@
+"""Motor de salud de stock: consumo medio, demanda de planes y días hasta rotura.
+
+inventory_stock_health guarda una fila por item de inventario con el ritmo de consumo
+(medias móviles de 30 y 90 días sobre los movimientos CONSUMPTION del libro de stock), la
+demanda prevista de los planes activos en el horizonte (ocurrencias según next_due_date y
+frecuencia × consumo medio por uso) y los días hasta rotura. Se recalcula solo para los
+componentes afectados en la misma transacción que el consumo, ajuste o cambio de plan;
+refresh_stock_health sin componentes lo rehace todo (las medias avanzan con los días).
+"""
+from typing import Iterable, List, Optional
+import logging
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.component import Component
+from app.models.inventory import StockHealth
+
+logger = logging.getLogger(__name__)
+
+ALERT_STATUSES = ("OUT", "CRITICAL", "LOW")
+
+# El ritmo es el mayor de las dos medias (reacciona a picos sin olvidar el histórico).
+# Las fechas de planes son TIMESTAMP sin zona en UTC; los planes vencidos cuentan como "ahora".
+_REFRESH_SQL = text("""
+    INSERT INTO inventory_stock_health (component_id, quantity, avg_daily_30d, avg_daily_90d, daily_rate,
+                                        planned_demand, days_to_stockout, status, updated_at)
+    SELECT i.component_id, i.quantity, c.avg30, c.avg90, r.rate, d.demand, s.days,
+           CASE
+               WHEN i.quantity <= 0 THEN 'OUT'
+               WHEN s.days < :lead_days THEN 'CRITICAL'
+               WHEN s.days < :low_days THEN 'LOW'
+               ELSE 'OK'
+           END,
+           now()
+    FROM inventory_items i
+    CROSS JOIN LATERAL (
+        SELECT coalesce(sum(-m.quantity) FILTER (WHERE m.created_at >= now() - interval '30 days'), 0) / 30.0 AS avg30,
+               coalesce(sum(-m.quantity), 0) / 90.0 AS avg90,
+               coalesce(avg(-m.quantity), 0) AS per_use
+        FROM stock_movements m
+        WHERE m.component_id = i.component_id
+          AND m.movement_type = 'CONSUMPTION'
+          AND m.created_at >= now() - interval '90 days'
+    ) c
+    CROSS JOIN LATERAL (SELECT greatest(c.avg30, c.avg90) AS rate) r
+    CROSS JOIN LATERAL (
+        SELECT coalesce(sum(
+                   CASE WHEN o.step > 0
+                        THEN 1 + floor(extract(epoch FROM (o.horizon_end - o.first_due)) / 86400 / o.step)
+                        ELSE 1 END
+               ), 0) * c.per_use AS demand
+        FROM (
+            SELECT greatest(p.next_due_date, timezone('UTC', now())) AS first_due,
+                   timezone('UTC', now()) + make_interval(days => :horizon_days) AS horizon_end,
+                   coalesce(p.frequency_days, 0) + 7 * coalesce(p.frequency_weeks, 0)
+                       + 30 * coalesce(p.frequency_months, 0) AS step
+            FROM maintenance_plans p
+            WHERE p.component_id = i.component_id AND p.active AND p.next_due_date IS NOT NULL
+        ) o
+        WHERE o.first_due <= o.horizon_end
+    ) d
+    CROSS JOIN LATERAL (
+        SELECT CASE
+                   WHEN i.quantity - d.demand <= 0 THEN 0
+                   WHEN r.rate > 0 THEN (i.quantity - d.demand) / r.rate
+               END AS days
+    ) s
+    WHERE CAST(:component_ids AS integer[]) IS NULL OR i.component_id = ANY(CAST(:component_ids AS integer[]))
+    ON CONFLICT (component_id) DO UPDATE SET
+        quantity = excluded.quantity,
+        avg_daily_30d = excluded.avg_daily_30d,
+        avg_daily_90d = excluded.avg_daily_90d,
+        daily_rate = excluded.daily_rate,
+        planned_demand = excluded.planned_demand,
+        days_to_stockout = excluded.days_to_stockout,
+        status = excluded.status,
+        updated_at = excluded.updated_at
+""")
+
+
+async def refresh_stock_health(db: AsyncSession, component_ids: Optional[Iterable[Optional[int]]] = None) -> None:
+    """Recalcula el estado de los componentes indicados (todos si None). No hace commit."""
+    ids = None
+    if component_ids is not None:
+        ids = sorted({cid for cid in component_ids if cid is not None})
+        if not ids:
+            return
+    else:
+        # Un rebuild completo también limpia componentes que ya no tienen inventario
+        await db.execute(text(
+            "DELETE FROM inventory_stock_health h WHERE NOT EXISTS "
+            "(SELECT 1 FROM inventory_items i WHERE i.component_id = h.component_id)"
+        ))
+    await db.execute(_REFRESH_SQL, {
+        "component_ids": ids,
+        "horizon_days": settings.INVENTORY_FORECAST_DAYS,
+        "lead_days": settings.INVENTORY_LEAD_TIME_DAYS,
+        "low_days": settings.INVENTORY_LOW_STOCK_DAYS,
+    })
+
+
+async def ensure_stock_health(db: AsyncSession) -> bool:
+    """Calcula el estado de stock completo si aún no existe (primer arranque). Devuelve True si lo construyó."""
+    if (await db.execute(select(StockHealth.component_id).limit(1))).first():
+        return False
+    logger.info("Calculando estado de stock desde el histórico...")
+    await refresh_stock_health(db)
+    await db.commit()
+    return True
+
+
+async def get_stock_alerts(db: AsyncSession, statuses: Optional[List[str]] = None, limit: int = 100):
+    """Componentes en alerta, los más urgentes primero (índice por estado y días hasta rotura)."""
+    statuses = statuses or list(ALERT_STATUSES)
+    res = await db.execute(
+        select(
+            StockHealth,
+            Component.name.label("component_name"),
+            Component.component_type,
+        )
+        .join(Component, Component.id == StockHealth.component_id)
+        .where(StockHealth.status.in_(statuses))
+        .order_by(StockHealth.days_to_stockout.asc().nulls_last(), StockHealth.component_id)
+        .limit(limit)
+    )
+    return [
+        {
+            "component_id": health.component_id,
+            "component_name": component_name,
+            "component_type": component_type,
+            "quantity": health.quantity,
+            "avg_daily_30d": health.avg_daily_30d,
+            "avg_daily_90d": health.avg_daily_90d,
+            "daily_rate": health.daily_rate,
+            "planned_demand": health.planned_demand,
+            "days_to_stockout": health.days_to_stockout,
+            "status": health.status,
+            "updated_at": health.updated_at,
+        }
+        for health, component_name, component_type in res.all()
+    ]
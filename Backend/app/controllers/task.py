@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import insert
 from app.models.task import Task
 from app.models.asset import Asset
 from app.models.component import Component
@@ -7,7 +8,13 @@ from app.models.workorder import WorkOrder
 from app.schemas.task import TaskCreate, TaskRead, TaskUpdate, TaskCompleteRequest, TaskUsedComponentIn
 from app.models.inventory import InventoryItem, TaskUsedComponent
 from app.models.enums import TaskStatus
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+from typing import List
+from app.pagination import apply_keyset
+from app.controllers.search import search_filter
+from app.controllers.inventory import consume_inventory
+from app.controllers.planned_hours import get_planned_hours_map, lock_planned_hours, record_task_loads, task_load
+from app.controllers.forecast import invalidate_forecast_days
 
 
 def _naive_utc(dt: datetime | None) -> datetime | None:
@@ -51,29 +58,13 @@ async def create_task(db: AsyncSession, task_in: TaskCreate, created_by_id: int)
     if task_data.get("assigned_to"):
         # Cargar creador
         from app.models.user import User
-        from app.models.department import Department
+        from app.controllers.department import get_managed_department_ids
         creator_res = await db.execute(select(User).where(User.id == created_by_id))
         creator = creator_res.scalar_one_or_none()
         if creator and creator.role == "Supervisor":
-            # Obtener deps que gestiona
-            dep_res = await db.execute(select(Department).where(Department.manager_id == created_by_id))
-            managed = dep_res.scalars().all()
-            if managed:
-                # construir set de departamentos bajo su gestión
-                all_deps_res = await db.execute(select(Department))
-                all_deps = all_deps_res.scalars().all()
-                by_parent = {}
-                for d in all_deps:
-                    by_parent.setdefault(d.parent_id, []).append(d)
-                target = set()
-                stack = [d.id for d in managed]
-                while stack:
-                    cur = stack.pop()
-                    if cur in target:
-                        continue
-                    target.add(cur)
-                    for ch in by_parent.get(cur, []):
-                        stack.append(ch.id)
+            # Departamentos bajo su gestión (incluidos subdepartamentos)
+            target = await get_managed_department_ids(db, created_by_id)
+            if target:
                 # Usuario asignado
                 assigned_res = await db.execute(select(User).where(User.id == task_data["assigned_to"]))
                 assigned_user = assigned_res.scalar_one_or_none()
@@ -81,61 +72,137 @@ async def create_task(db: AsyncSession, task_in: TaskCreate, created_by_id: int)
                     raise ValueError("Supervisor cannot assign task to user outside managed departments")
         # Validar día laborable si due_date
         if task_data.get("due_date"):
-            from datetime import date as _date
-            from app.controllers.calendar import is_non_working
+            from app.controllers.calendar import compute_capacity_week
             assigned_id = task_data["assigned_to"]
             due_d = task_data["due_date"].date() if hasattr(task_data["due_date"], 'date') else task_data["due_date"]
-            if await is_non_working(db, assigned_id, due_d):
+            # Capacidad del día, una sola vez para las dos validaciones (0 = no laborable)
+            cap_hours = (await compute_capacity_week(db, assigned_id, due_d, 1))[0][1]
+            if cap_hours == 0.0:
                 raise ValueError("Cannot assign task on non-working day for user")
             # Validar no exceder capacidad diaria (si estimated_hours)
             if task_data.get("estimated_hours"):
-                from app.controllers.calendar import compute_capacity_week
-                # capacidad del día: compute_capacity_week(due_d,1)
-                cap_rows = await compute_capacity_week(db, task_data["assigned_to"], due_d, 1)
-                cap_hours = cap_rows[0][1]
-                # sumar horas ya planificadas ese día
-                existing_q = await db.execute(
-                    select(Task).where(
-                        Task.assigned_to == task_data["assigned_to"],
-                        Task.due_date >= task_data["due_date"].replace(hour=0, minute=0, second=0, microsecond=0),
-                        Task.due_date <  task_data["due_date"].replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1),
-                    )
-                )
-                existing_tasks = existing_q.scalars().all()
-                planned = sum(filter(None, [t.estimated_hours or 0 for t in existing_tasks]))
-                if planned + float(task_data["estimated_hours"]) - 1e-6 > cap_hours and cap_hours > 0:
+                # Horas ya planificadas ese día, con la fila del agregado bloqueada hasta el commit
+                planned = (await lock_planned_hours(db, [(assigned_id, due_d)]))[(assigned_id, due_d)]
+                if planned + float(task_data["estimated_hours"]) - 1e-6 > cap_hours:
                     raise ValueError("Daily capacity exceeded for user on that date")
     new_task = Task(**task_data)
     db.add(new_task)
+    await record_task_loads(db, [(None, task_load(new_task.assigned_to, new_task.due_date, new_task.estimated_hours))])
     await db.commit()
+    invalidate_forecast_days(new_task.due_date)
     await db.refresh(new_task)
     return new_task
 
+async def create_tasks_bulk(db: AsyncSession, tasks_in: List[TaskCreate], created_by_id: int, atomic: bool = False):
+    """Crea varias tareas con las mismas reglas que create_task, validadas en bloque.
+
+    Las referencias se comprueban con una consulta IN por tipo, la capacidad y las horas ya
+    planificadas (user_day_planned_hours) de todos los (usuario, día) implicados se leen una
+    sola vez y las filas válidas se insertan con un único INSERT multi-fila. Las horas de las
+    filas del propio lote cuentan para la capacidad de las siguientes. Devuelve (tareas
+    creadas, errores por fila); con atomic=True un solo error impide crear ninguna.
+    """
+    from app.models.user import User
+    from app.controllers.department import get_managed_department_ids
+    from app.controllers.calendar import compute_capacity_grid
+
+    rows = []
+    for task_in in tasks_in:
+        data = task_in.model_dump()
+        if data.get("due_date") is not None:
+            data["due_date"] = _naive_utc(data["due_date"])
+        data["created_by_id"] = created_by_id
+        rows.append(data)
+
+    async def existing_ids(model, key):
+        ids = {r[key] for r in rows if r.get(key)}
+        if not ids:
+            return set()
+        res = await db.execute(select(model.id).where(model.id.in_(ids)))
+        return set(res.scalars().all())
+
+    assets = await existing_ids(Asset, "asset_id")
+    components = await existing_ids(Component, "component_id")
+    workorders = await existing_ids(WorkOrder, "workorder_id")
+
+    # Responsables existentes (con su departamento) para todos los creadores; la jerarquía solo
+    # se restringe a los supervisores con departamentos gestionados
+    assigned_ids = {r["assigned_to"] for r in rows if r.get("assigned_to")}
+    managed = None
+    user_departments = {}
+    if assigned_ids:
+        dep_res = await db.execute(select(User.id, User.department_id).where(User.id.in_(assigned_ids)))
+        user_departments = dict(dep_res.all())
+        creator_res = await db.execute(select(User.role).where(User.id == created_by_id))
+        if creator_res.scalar_one_or_none() == "Supervisor":
+            managed = await get_managed_department_ids(db, created_by_id) or None
+
+    # Capacidad y horas ya planificadas de cada (usuario, día) del lote
+    capacity = {}
+    planned = {}
+    dated = [r for r in rows if r.get("assigned_to") in user_departments and r.get("due_date")]
+    if dated:
+        days = [r["due_date"].date() for r in dated]
+        start, end = min(days), max(days)
+        users = {r["assigned_to"] for r in dated}
+        grid = await compute_capacity_grid(db, users, start, (end - start).days + 1)
+        capacity = {(uid, d): hours for uid, cap_rows in grid.items() for d, hours, _, _ in cap_rows}
+        planned = await get_planned_hours_map(db, list(users), start, end)
+
+    valid, errors = [], []
+    for index, data in enumerate(rows):
+        try:
+            if data.get("asset_id") and data["asset_id"] not in assets:
+                raise ValueError(f"Asset with ID {data['asset_id']} does not exist")
+            if data.get("component_id") and data["component_id"] not in components:
+                raise ValueError(f"Component with ID {data['component_id']} does not exist")
+            if data.get("workorder_id") and data["workorder_id"] not in workorders:
+                raise ValueError(f"WorkOrder with ID {data['workorder_id']} does not exist")
+            assigned_id = data.get("assigned_to")
+            if assigned_id and assigned_id not in user_departments:
+                raise ValueError(f"User with ID {assigned_id} does not exist")
+            if assigned_id and managed is not None and user_departments.get(assigned_id) not in managed:
+                raise ValueError("Supervisor cannot assign task to user outside managed departments")
+            if assigned_id and data.get("due_date"):
+                key = (assigned_id, data["due_date"].date())
+                cap_hours = capacity.get(key, 0.0)
+                if cap_hours == 0.0:
+                    raise ValueError("Cannot assign task on non-working day for user")
+                hours = float(data.get("estimated_hours") or 0.0)
+                if hours and planned.get(key, 0.0) + hours - 1e-6 > cap_hours:
+                    raise ValueError("Daily capacity exceeded for user on that date")
+                planned[key] = planned.get(key, 0.0) + hours
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        valid.append(data)
+
+    if not valid or (atomic and errors):
+        return [], errors
+    result = await db.execute(insert(Task).returning(Task, sort_by_parameter_order=True), valid)
+    created = result.scalars().all()
+    await record_task_loads(db, [(None, task_load(t.assigned_to, t.due_date, t.estimated_hours)) for t in created])
+    await db.commit()
+    invalidate_forecast_days(*(t.due_date for t in created))
+    return created, errors
+
 async def get_task(db: AsyncSession, task_id: int):
     """Get a task by ID"""
     result = await db.execute(select(Task).where(Task.id == task_id))
     return result.scalar_one_or_none()
 
-async def get_tasks(
-    db: AsyncSession,
-    page: int = 1,
-    page_size: int = 20,
+def tasks_query(
     search: str = None,
     status: str = None,
     priority: str = None,
-    assigned_to: int = None
+    assigned_to: int = None,
 ):
-    """Get all tasks with filters, pagination and search capability within organization"""
-    offset = (page - 1) * page_size
-    
+    """Build the filtered task query shared by the list and the export"""
     query = select(Task)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.where(
-            (Task.title.ilike(search_term)) |
-            (Task.description.ilike(search_term))
-        )
+        # Documento de búsqueda con índice trigram (ver controllers/search.py): evita el seq scan de ILIKE
+        query = query.where(search_filter("task", search))
     
     if status:
         query = query.where(Task.status == status)
@@ -145,8 +212,27 @@ async def get_tasks(
     
     if assigned_to:
         query = query.where(Task.assigned_to == assigned_to)
-    
-    query = query.offset(offset).limit(page_size).order_by(Task.created_at.desc())
+    return query
+
+async def get_tasks(
+    db: AsyncSession,
+    page: int = 1,
+    page_size: int = 20,
+    search: str = None,
+    status: str = None,
+    priority: str = None,
+    assigned_to: int = None,
+    cursor: str | None = None,
+):
+    """Get all tasks with filters, pagination and search capability within organization"""
+    offset = (page - 1) * page_size
+    query = tasks_query(search, status, priority, assigned_to)
+
+    # Orden estable (created_at, id); con cursor se continúa por keyset en lugar de OFFSET
+    query = apply_keyset(query, Task.created_at, Task.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -160,10 +246,20 @@ async def get_tasks_by_workorder(db: AsyncSession, workorder_id: int):
     result = await db.execute(select(Task).where(Task.workorder_id == workorder_id).order_by(Task.created_at.desc()))
     return result.scalars().all()
 
+async def _lock_task(db: AsyncSession, task_id: int) -> Task | None:
+    """Carga la tarea con FOR UPDATE y valores frescos (el router puede haberla leído ya en la sesión).
+
+    Así el delta de horas planificadas parte de lo que hay en la fila y no de una lectura previa.
+    """
+    result = await db.execute(
+        select(Task).where(Task.id == task_id).with_for_update().execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
 async def update_task(db: AsyncSession, task_id: int, task_in: TaskUpdate):
     """Update a task by ID"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await _lock_task(db, task_id)
     
     if task is None:
         return None
@@ -178,84 +274,84 @@ async def update_task(db: AsyncSession, task_id: int, task_in: TaskUpdate):
     maybe_assigned = update_data.get("assigned_to", task.assigned_to)
     if maybe_due and maybe_assigned:
         try:
-            from app.controllers.calendar import is_non_working  # import local para evitar ciclos tempranos
+            from app.controllers.calendar import compute_capacity_week  # import local para evitar ciclos tempranos
             due_d = maybe_due.date() if hasattr(maybe_due, 'date') else maybe_due
-            if await is_non_working(db, maybe_assigned, due_d):
+            # Capacidad del día, una sola vez para las dos validaciones (0 = no laborable)
+            cap_hours = (await compute_capacity_week(db, maybe_assigned, due_d, 1))[0][1]
+            if cap_hours == 0.0:
                 raise ValueError("Cannot assign/update task on non-working day for user")
             # Validar capacidad si cambia estimated_hours, due_date o assigned_to
             if any(k in update_data for k in ("estimated_hours", "due_date", "assigned_to")) and (update_data.get("estimated_hours") or task.estimated_hours):
-                from app.controllers.calendar import compute_capacity_week
-                cap_rows = await compute_capacity_week(db, maybe_assigned, due_d, 1)
-                cap_hours = cap_rows[0][1]
-                # Query tareas día
-                start_day = maybe_due.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_day = start_day + timedelta(days=1)
-                existing_q = await db.execute(
-                    select(Task).where(
-                        Task.assigned_to == maybe_assigned,
-                        Task.due_date >= start_day,
-                        Task.due_date < end_day,
-                        Task.id != task.id,
-                    )
-                )
-                existing_tasks = existing_q.scalars().all()
-                planned = sum(filter(None, [t.estimated_hours or 0 for t in existing_tasks]))
+                # Bloquear el día destino y el de origen (el delta de record_task_loads toca los dos)
+                current = task_load(task.assigned_to, task.due_date, task.estimated_hours)
+                keys = [(maybe_assigned, due_d)] + ([current[:2]] if current else [])
+                planned = (await lock_planned_hours(db, keys))[(maybe_assigned, due_d)]
+                # Horas del día sin contar las de la propia tarea
+                if current and current[:2] == (maybe_assigned, due_d):
+                    planned -= current[2]
                 new_est = update_data.get("estimated_hours", task.estimated_hours) or 0
-                if cap_hours > 0 and planned + float(new_est) - 1e-6 > cap_hours:
+                if planned + float(new_est) - 1e-6 > cap_hours:
                     raise ValueError("Daily capacity exceeded for user on that date")
         except ModuleNotFoundError:
             # Si el módulo de calendario no existe (deployment antiguo) ignorar validación
             pass
     # Procesar componentes usados si se completa la tarea
     used = update_data.pop("used_components", None)
+    old_load = task_load(task.assigned_to, task.due_date, task.estimated_hours)
+    old_due = task.due_date
     for key, value in update_data.items():
         setattr(task, key, value)
+    await record_task_loads(db, [(old_load, task_load(task.assigned_to, task.due_date, task.estimated_hours))])
 
-    # Si se proveen componentes usados, validar y descontar inventario
+    # Si se proveen componentes usados, descontar inventario (una sentencia atómica para todos)
     if used:
-        for item in used:
-            comp_id = item["component_id"] if isinstance(item, dict) else item.component_id
-            qty = float(item["quantity"] if isinstance(item, dict) else item.quantity)
-            # Obtener inventario
-            inv_res = await db.execute(select(InventoryItem).where(InventoryItem.component_id == comp_id))
-            inv = inv_res.scalar_one_or_none()
-            if inv is None or inv.quantity is None or inv.quantity < qty:
-                raise ValueError(f"Insufficient inventory for component {comp_id}")
-            # Descontar
-            inv.quantity = inv.quantity - qty
-            # Registrar uso
-            tuc = TaskUsedComponent(
+        items = [
+            (
+                item["component_id"] if isinstance(item, dict) else item.component_id,
+                float(item["quantity"] if isinstance(item, dict) else item.quantity),
+            )
+            for item in used
+        ]
+        try:
+            unit_costs = await consume_inventory(db, items, task_id=task.id)
+        except ValueError:
+            await db.rollback()
+            raise
+        # Registrar uso
+        for comp_id, qty in items:
+            db.add(TaskUsedComponent(
                 task_id=task.id,
                 component_id=comp_id,
                 quantity=qty,
-                unit_cost_snapshot=inv.unit_cost,
-            )
-            db.add(tuc)
+                unit_cost_snapshot=unit_costs[comp_id],
+            ))
     
     task.updated_at = datetime.now(timezone.utc)
     
     await db.commit()
+    invalidate_forecast_days(old_due, task.due_date)
     await db.refresh(task)
     return task
 
 async def delete_task(db: AsyncSession, task_id: int):
     """Delete a task by ID"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await _lock_task(db, task_id)
     
     if task is None:
         return False
     
+    await record_task_loads(db, [(task_load(task.assigned_to, task.due_date, task.estimated_hours), None)])
+    due_date = task.due_date
     await db.delete(task)
     await db.commit()
+    invalidate_forecast_days(due_date)
     return True
 
 
 async def complete_task(db: AsyncSession, task_id: int, data: TaskCompleteRequest):
     """Mark task as completed, attach notes/description/actual_hours and consume inventory via used_components."""
     # Cargar tarea para validar existencia
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await _lock_task(db, task_id)
     if task is None:
         return None
 
@@ -4,9 +4,9 @@ from sqlalchemy import or_
 from sqlalchemy.orm import selectinload
 from app.models.user import User
 from app.schemas.user import UserCreate, UserRead, UserUpdate
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.auth.dependencies import invalidate_user_status
+from app.auth.security import get_password_hash_async
+from app.pagination import apply_keyset
 
 async def create_user(db: AsyncSession, user_in: UserCreate):
     """Create a new user"""
@@ -26,13 +26,14 @@ async def create_user(db: AsyncSession, user_in: UserCreate):
         first_name=user_in.first_name,
         last_name=user_in.last_name,
         email=user_in.email,
-        hashed_password=pwd_context.hash(user_in.password),
+        hashed_password=await get_password_hash_async(user_in.password),
         role=user_in.role,
         department_id=user_in.department_id,
         is_active=1  # Activo por defecto
     )
     db.add(new_user)
     await db.commit()
+    invalidate_user_status(new_user.email)
     await db.refresh(new_user)
     return new_user
 
@@ -66,6 +67,7 @@ async def get_users(
     search: str = None,
     role: str | None = None,
     is_active: bool | None = None,
+    cursor: str | None = None,
 ):
     """
     Get all users with pagination and search capability
@@ -75,6 +77,7 @@ async def get_users(
     - page: Page number (starts from 1)
     - page_size: Number of records per page
     - search: Search string to filter users by email, username, first_name, last_name or role
+    - cursor: Keyset cursor (X-Next-Cursor of the previous page); replaces page when provided
     """
     # Calculate offset based on page and page_size
     offset = (page - 1) * page_size
@@ -99,8 +102,11 @@ async def get_users(
     if is_active is not None:
         query = query.where(User.is_active.is_(bool(is_active)))
     
-    # Apply pagination
-    query = query.offset(offset).limit(page_size)
+    # Apply pagination: stable (created_at, id) order, keyset when a cursor is given
+    query = apply_keyset(query, User.created_at, User.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     
     # Execute query
     result = await db.execute(query)
@@ -115,11 +121,13 @@ async def update_user(db: AsyncSession, user_id: int, user_in: UserUpdate):
         return None
     
     # Update fields using model_dump to handle optional fields
+    old_email = user.email
     update_data = user_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(user, key, value)
     
     await db.commit()
+    invalidate_user_status(old_email, user.email)
     await db.refresh(user)
     return user
 
@@ -131,7 +139,7 @@ async def update_password(db: AsyncSession, user_id: int, new_password: str):
     if user is None:
         return None
     
-    user.hashed_password = pwd_context.hash(new_password)
+    user.hashed_password = await get_password_hash_async(new_password)
     await db.commit()
     await db.refresh(user)
     return user
@@ -146,6 +154,7 @@ async def deactivate_user(db: AsyncSession, user_id: int):
     
     user.is_active = 0
     await db.commit()
+    invalidate_user_status(user.email)
     await db.refresh(user)
     return user
 
@@ -159,6 +168,7 @@ async def activate_user(db: AsyncSession, user_id: int):
     
     user.is_active = 1
     await db.commit()
+    invalidate_user_status(user.email)
     await db.refresh(user)
     return user
 
@@ -170,8 +180,10 @@ async def delete_user(db: AsyncSession, user_id: int):
     if user is None:
         return False
     
+    email = user.email
     await db.delete(user)
     await db.commit()
+    invalidate_user_status(email)
     return True
 
 async def get_department_managers(db: AsyncSession):
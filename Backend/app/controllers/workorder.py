@@ -1,16 +1,29 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from fastapi import HTTPException
 from app.models.workorder import WorkOrder
 from app.models.asset import Asset
 from app.models.failure import Failure
-from app.models.enums import WorkOrderStatus
+from app.models.enums import WorkOrderStatus, MaintenanceType
+from app.models.maintenance import Maintenance
+from app.models.task import Task
+from app.models.inventory import TaskUsedComponent, InventoryItem
 from app.schemas.workorder import WorkOrderCreate, WorkOrderRead, WorkOrderUpdate
 from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import logging
+import time
 from app.models.user import User
 from app.models.department import Department
+from app.models.maintenancePlan import MaintenancePlan
+from app.controllers.kpi_rollup import record_workorder_change, record_workorder_changes, workorder_snapshot, invalidate_trend_buckets
+from app.pagination import apply_keyset
+from app.controllers.search import search_filter
+
+logger = logging.getLogger(__name__)
 
 async def create_workorder(db: AsyncSession, workorder_in: WorkOrderCreate, created_by: int):
     """Create a new work order"""
@@ -50,7 +63,10 @@ async def create_workorder(db: AsyncSession, workorder_in: WorkOrderCreate, crea
     
     new_workorder = WorkOrder(**workorder_data)
     db.add(new_workorder)
+    new_snapshot = workorder_snapshot(new_workorder)
+    await record_workorder_change(db, None, new_snapshot)
     await db.commit()
+    invalidate_trend_buckets(new_snapshot)
     await db.refresh(new_workorder)
     return new_workorder
 
@@ -61,27 +77,36 @@ async def get_workorder(db: AsyncSession, workorder_id: int):
     )
     return result.scalar_one_or_none()
 
-async def get_workorders(
-    db: AsyncSession,
-    page: int = 1,
-    page_size: int = 20,
+async def _lock_workorders(db: AsyncSession, workorder_ids: List[int]) -> List[WorkOrder]:
+    """Carga las órdenes con FOR UPDATE (en orden de id) y valores frescos aunque ya estén en la sesión.
+
+    El snapshot "old" de los acumulados KPI sale de la fila bloqueada: dos cambios de estado
+    concurrentes de la misma orden se serializan en vez de restar los dos el mismo estado.
+    """
+    if not workorder_ids:
+        return []
+    res = await db.execute(
+        select(WorkOrder)
+        .where(WorkOrder.id.in_(workorder_ids))
+        .order_by(WorkOrder.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    return res.scalars().all()
+
+def workorders_query(
     search: str = None,
     status: str = None,
     work_type: str = None,
     priority: str = None,
-    assigned_to: int = None
+    assigned_to: int = None,
 ):
-    """Get all work orders with filters, pagination and search capability"""
-    offset = (page - 1) * page_size
-    
+    """Build the filtered work order query shared by the list and the export"""
     query = select(WorkOrder)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.where(
-            (WorkOrder.title.ilike(search_term)) |
-            (WorkOrder.description.ilike(search_term))
-        )
+        # Documento de búsqueda con índice trigram (ver controllers/search.py): evita el seq scan de ILIKE
+        query = query.where(search_filter("workorder", search))
     
     if status:
         query = query.where(WorkOrder.status == status)
@@ -94,8 +119,28 @@ async def get_workorders(
     
     if assigned_to:
         query = query.where(WorkOrder.assigned_to == assigned_to)
-    
-    query = query.offset(offset).limit(page_size).order_by(WorkOrder.created_at.desc())
+    return query
+
+async def get_workorders(
+    db: AsyncSession,
+    page: int = 1,
+    page_size: int = 20,
+    search: str = None,
+    status: str = None,
+    work_type: str = None,
+    priority: str = None,
+    assigned_to: int = None,
+    cursor: str | None = None,
+):
+    """Get all work orders with filters, pagination and search capability"""
+    offset = (page - 1) * page_size
+    query = workorders_query(search, status, work_type, priority, assigned_to)
+
+    # Orden estable (created_at, id); con cursor se continúa por keyset en lugar de OFFSET
+    query = apply_keyset(query, WorkOrder.created_at, WorkOrder.id, cursor)
+    if not cursor:
+        query = query.offset(offset)
+    query = query.limit(page_size)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -113,130 +158,289 @@ async def get_workorders_by_user(db: AsyncSession, user_id: int):
     )
     return result.scalars().all()
 
+# ---------------------------------------------------------------------------
+# Cierre de órdenes: costes reales y maintenance generado
+# ---------------------------------------------------------------------------
+
+DEFAULT_LABOR_RATE = 50.0
+
+MAINTENANCE_TYPE_BY_WORK_TYPE = {
+    'MAINTENANCE': MaintenanceType.PREVENTIVE,
+    'REPAIR': MaintenanceType.CORRECTIVE,
+    'INSPECTION': MaintenanceType.PREVENTIVE,
+}
+
+
+def _to_naive_utc(dt: datetime | None) -> datetime | None:
+    if dt is None:
+        return None
+    if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+async def _completion_totals(db: AsyncSession, workorder_ids: List[int]) -> Dict[int, Tuple[float, float]]:
+    """(horas, coste) reales de varias órdenes con una única consulta agregada.
+
+    Mano de obra: horas reales de cada tarea a la tarifa del técnico (o DEFAULT_LABOR_RATE).
+    Piezas: cantidad al coste congelado en el consumo o, si falta, al coste actual del inventario.
+    Las piezas se agregan por tarea antes del join para no multiplicar la mano de obra.
+    """
+    totals: Dict[int, Tuple[float, float]] = {wo_id: (0.0, 0.0) for wo_id in workorder_ids}
+    if not workorder_ids:
+        return totals
+    parts = (
+        select(
+            TaskUsedComponent.task_id.label("task_id"),
+            func.sum(
+                TaskUsedComponent.quantity * func.coalesce(
+                    func.nullif(TaskUsedComponent.unit_cost_snapshot, 0),
+                    func.nullif(InventoryItem.unit_cost, 0),
+                    0,
+                )
+            ).label("cost"),
+        )
+        .outerjoin(InventoryItem, InventoryItem.component_id == TaskUsedComponent.component_id)
+        .where(TaskUsedComponent.task_id.in_(select(Task.id).where(Task.workorder_id.in_(workorder_ids))))
+        .group_by(TaskUsedComponent.task_id)
+        .subquery()
+    )
+    hours = func.coalesce(Task.actual_hours, 0)
+    rate = func.coalesce(func.nullif(User.hourly_rate, 0), DEFAULT_LABOR_RATE)
+    result = await db.execute(
+        select(
+            Task.workorder_id,
+            func.sum(hours),
+            func.sum(hours * rate) + func.sum(func.coalesce(parts.c.cost, 0)),
+        )
+        .outerjoin(User, User.id == Task.assigned_to)
+        .outerjoin(parts, parts.c.task_id == Task.id)
+        .where(Task.workorder_id.in_(workorder_ids))
+        .group_by(Task.workorder_id)
+    )
+    for wo_id, total_hours, total_cost in result.all():
+        totals[wo_id] = (float(total_hours or 0.0), float(total_cost or 0.0))
+    return totals
+
+
+def _maintenance_for_completed(workorder: WorkOrder, notes: str | None = None) -> Maintenance:
+    """Registro Maintenance generado al completar una orden (mismos campos que create_maintenance)."""
+    now = datetime.now(timezone.utc)
+    m_type = MAINTENANCE_TYPE_BY_WORK_TYPE.get((workorder.work_type or '').upper(), MaintenanceType.PREVENTIVE)
+    return Maintenance(
+        description=workorder.title or f"WorkOrder {workorder.id}",
+        asset_id=workorder.asset_id,
+        user_id=workorder.assigned_to or workorder.created_by,
+        maintenance_type=m_type.value,
+        scheduled_date=_to_naive_utc(workorder.scheduled_date),
+        completed_date=_to_naive_utc(workorder.completed_date),
+        duration_hours=workorder.actual_hours,
+        cost=workorder.actual_cost,
+        notes=notes,
+        workorder_id=workorder.id,
+        plan_id=workorder.plan_id,
+        status="SCHEDULED",
+        created_at=now,
+        updated_at=now,
+    )
+
+
 async def update_workorder(db: AsyncSession, workorder_id: int, update_data: dict, maintenance_notes: str | None = None, _created_maintenance: dict | None = None) -> WorkOrder:
     """Actualiza una orden de trabajo y crea automáticamente un maintenance al completarse.
-    - Calcula horas y coste reales al pasar a COMPLETED.
-    - Si el estado cambia a COMPLETED (y antes no lo estaba) crea registro Maintenance (si no existe) usando datos de la WO.
+    - Calcula horas y coste reales al pasar a COMPLETED (una consulta agregada).
+    - Si el estado cambia a COMPLETED (y antes no lo estaba) crea registro Maintenance (si no existe) en la misma transacción.
     - Puede añadir notas al maintenance (maintenance_notes).
     """
-    workorder = await get_workorder(db, workorder_id)
+    started = time.perf_counter()
+    locked = await _lock_workorders(db, [workorder_id])
+    workorder = locked[0] if locked else None
     if not workorder:
         raise HTTPException(status_code=404, detail="Orden de trabajo no encontrada")
 
     old_status = workorder.status
+    old_snapshot = workorder_snapshot(workorder)
+    completing = update_data.get("status") == WorkOrderStatus.COMPLETED.value and old_status != WorkOrderStatus.COMPLETED.value
 
     # Si el estado cambia a COMPLETED, calcular automáticamente los valores reales
-    if update_data.get("status") == WorkOrderStatus.COMPLETED.value and old_status != WorkOrderStatus.COMPLETED.value:
-        print(f"DEBUG: Calculando valores automáticos para workorder {workorder_id}")
-
-        from sqlalchemy.orm import joinedload
-        from sqlalchemy import select
-        from app.models.task import Task
-        from app.models.inventory import TaskUsedComponent, InventoryItem
-
-        tasks_query = select(Task).options(
-            joinedload(Task.assignee),
-            joinedload(Task.used_components).joinedload(TaskUsedComponent.component)
-        ).where(Task.workorder_id == workorder_id)
-
-        result = await db.execute(tasks_query)
-        tasks = result.scalars().unique().all()
-
-        total_hours = 0.0
-        total_cost = 0.0
-
-        for task in tasks:
-            if task.actual_hours:
-                total_hours += task.actual_hours
-                if task.assignee and task.assignee.hourly_rate:
-                    labor_cost = task.actual_hours * task.assignee.hourly_rate
-                else:
-                    labor_cost = task.actual_hours * 50.0  # default rate
-                total_cost += labor_cost
-                print(f"DEBUG: Task {task.id} labor cost agregado = {labor_cost}")
-
-            for used_component in task.used_components:
-                if used_component.unit_cost_snapshot and used_component.quantity:
-                    component_cost = used_component.unit_cost_snapshot * used_component.quantity
-                elif used_component.component and used_component.component.inventory_item and used_component.quantity and used_component.component.inventory_item.unit_cost:
-                    component_cost = used_component.component.inventory_item.unit_cost * used_component.quantity
-                else:
-                    component_cost = 0
-                total_cost += component_cost
-                if component_cost:
-                    print(f"DEBUG: Task {task.id} component cost agregado = {component_cost}")
-
+    cost_ms = 0.0
+    if completing:
+        t0 = time.perf_counter()
+        total_hours, total_cost = (await _completion_totals(db, [workorder_id]))[workorder_id]
+        cost_ms = (time.perf_counter() - t0) * 1000
         update_data["actual_hours"] = total_hours
         update_data["actual_cost"] = total_cost
         update_data["completed_date"] = datetime.now(timezone.utc).replace(tzinfo=None)
-        print(f"DEBUG: Totales calculados - Horas: {total_hours}, Costo: {total_cost}")
 
     # Aplicar updates
     for key, value in update_data.items():
         setattr(workorder, key, value)
 
+    maintenance = None
     try:
+        if completing:
+            existing = await db.execute(
+                select(Maintenance.id).where(Maintenance.workorder_id == workorder.id).limit(1)
+            )
+            if existing.scalar() is None:
+                maintenance = _maintenance_for_completed(workorder, maintenance_notes)
+                db.add(maintenance)
+        new_snapshot = workorder_snapshot(workorder)
+        await record_workorder_change(db, old_snapshot, new_snapshot)
         await db.commit()
+        invalidate_trend_buckets(old_snapshot, new_snapshot)
         await db.refresh(workorder)
     except Exception as e:
         await db.rollback()
-        print(f"ERROR: Fallo al actualizar workorder: {e}")
+        logger.exception("workorder_update_failed id=%s", workorder_id)
         raise HTTPException(status_code=500, detail=f"Error al actualizar la orden de trabajo: {str(e)}")
 
-    # Auto-create maintenance si recién se completó
-    if workorder.status == WorkOrderStatus.COMPLETED.value and old_status != WorkOrderStatus.COMPLETED.value:
-        try:
-            from sqlalchemy import select as _select
-            from app.models.maintenance import Maintenance as _MaintenanceModel
-            existing = await db.execute(
-                _select(_MaintenanceModel.id).where(_MaintenanceModel.workorder_id == workorder.id).limit(1)
-            )
-            if existing.scalar() is None:
-                print(f"DEBUG: Creando maintenance para WO {workorder.id}")
-                from app.controllers.maintenance import create_maintenance
-                from app.schemas.maintenance import MaintenanceCreate
-                from app.models.enums import MaintenanceType
-
-                mtype_map = {
-                    'MAINTENANCE': MaintenanceType.PREVENTIVE,
-                    'REPAIR': MaintenanceType.CORRECTIVE,
-                    'INSPECTION': MaintenanceType.PREVENTIVE,
-                }
-                m_type = mtype_map.get((workorder.work_type or '').upper(), MaintenanceType.PREVENTIVE)
-                maintenance_in = MaintenanceCreate(
-                    description=workorder.title or f"WorkOrder {workorder.id}",
-                    asset_id=workorder.asset_id,
-                    user_id=workorder.assigned_to or workorder.created_by,
-                    maintenance_type=m_type,
-                    scheduled_date=workorder.scheduled_date,
-                    completed_date=workorder.completed_date,
-                    duration_hours=workorder.actual_hours,
-                    cost=workorder.actual_cost,
-                    notes=maintenance_notes,
-                    workorder_id=workorder.id,
-                    plan_id=getattr(workorder, 'plan_id', None)
-                )
-                maint = await create_maintenance(db=db, maintenance_in=maintenance_in)
-                if _created_maintenance is not None:
-                    _created_maintenance['maintenance'] = maint
-                print(f"DEBUG: Maintenance creado para WO {workorder.id}")
-            else:
-                print(f"DEBUG: Ya existía maintenance para WO {workorder.id}, no se crea otro")
-        except Exception as me:
-            print(f"WARNING: Fallo creando maintenance automático para WO {workorder.id}: {me}")
-
+    if maintenance is not None and _created_maintenance is not None:
+        _created_maintenance['maintenance'] = maintenance
+    if completing:
+        logger.info(
+            "workorder_completed id=%s hours=%.2f cost=%.2f maintenance_id=%s cost_ms=%.1f total_ms=%.1f",
+            workorder.id, workorder.actual_hours or 0.0, workorder.actual_cost or 0.0,
+            maintenance.id if maintenance is not None else None,
+            cost_ms, (time.perf_counter() - started) * 1000,
+        )
     return workorder
 
 async def delete_workorder(db: AsyncSession, workorder_id: int):
     """Delete a work order by ID"""
-    result = await db.execute(
-        select(WorkOrder).where(WorkOrder.id == workorder_id)
-    )
-    workorder = result.scalar_one_or_none()
+    locked = await _lock_workorders(db, [workorder_id])
+    workorder = locked[0] if locked else None
     
     if workorder is None:
         return False
     
+    old_snapshot = workorder_snapshot(workorder)
+    await record_workorder_change(db, old_snapshot, None)
     await db.delete(workorder)
     await db.commit()
-    return True
\ No newline at end of file
+    invalidate_trend_buckets(old_snapshot)
+    return True
+
+# ---------------------------------------------------------------------------
+# Operaciones en bloque
+# ---------------------------------------------------------------------------
+
+async def create_workorders_bulk(db: AsyncSession, workorders_in: List[WorkOrderCreate], created_by: int, atomic: bool = False):
+    """Crea varias órdenes con las validaciones de create_workorder hechas con consultas IN.
+
+    También comprueba que existan responsable, departamento y plan: una FK inválida es un error
+    de su fila y no aborta el INSERT del lote.
+
+    Inserta las válidas con un único INSERT multi-fila y un commit. Devuelve (órdenes creadas,
+    errores por fila); con atomic=True un solo error impide crear ninguna.
+    """
+    rows = []
+    for workorder_in in workorders_in:
+        data = workorder_in.model_dump()
+        data['scheduled_date'] = _to_naive_utc(data.get('scheduled_date'))
+        data['created_by'] = created_by
+        rows.append(data)
+
+    asset_ids = {r['asset_id'] for r in rows}
+    res = await db.execute(select(Asset.id).where(Asset.id.in_(asset_ids)))
+    assets = set(res.scalars().all())
+
+    failure_ids = {r['failure_id'] for r in rows if r.get('failure_id')}
+    failures, taken = set(), set()
+    if failure_ids:
+        res = await db.execute(select(Failure.id).where(Failure.id.in_(failure_ids)))
+        failures = set(res.scalars().all())
+        res = await db.execute(select(WorkOrder.failure_id).where(WorkOrder.failure_id.in_(failure_ids)))
+        taken = set(res.scalars().all())
+
+    async def existing_ids(model, key):
+        ids = {r[key] for r in rows if r.get(key)}
+        if not ids:
+            return set()
+        res = await db.execute(select(model.id).where(model.id.in_(ids)))
+        return set(res.scalars().all())
+
+    users = await existing_ids(User, 'assigned_to')
+    departments = await existing_ids(Department, 'department_id')
+    plans = await existing_ids(MaintenancePlan, 'plan_id')
+
+    valid, errors = [], []
+    for index, data in enumerate(rows):
+        failure_id = data.get('failure_id')
+        if data['asset_id'] not in assets:
+            error = f"Asset with ID {data['asset_id']} does not exist in this organization"
+        elif failure_id and failure_id not in failures:
+            error = f"Failure with ID {failure_id} does not exist in this organization"
+        elif failure_id and failure_id in taken:
+            error = f"A work order already exists for failure ID {failure_id}"
+        elif data.get('assigned_to') and data['assigned_to'] not in users:
+            error = f"User with ID {data['assigned_to']} does not exist"
+        elif data.get('department_id') and data['department_id'] not in departments:
+            error = f"Department with ID {data['department_id']} does not exist"
+        elif data.get('plan_id') and data['plan_id'] not in plans:
+            error = f"Maintenance plan with ID {data['plan_id']} does not exist"
+        else:
+            error = None
+        if error:
+            errors.append({"index": index, "error": error})
+            continue
+        if failure_id:
+            # Una sola orden por fallo, también dentro del lote
+            taken.add(failure_id)
+        valid.append(data)
+
+    if not valid or (atomic and errors):
+        return [], errors
+    result = await db.execute(insert(WorkOrder).returning(WorkOrder, sort_by_parameter_order=True), valid)
+    created = result.scalars().all()
+    snapshots = [workorder_snapshot(wo) for wo in created]
+    await record_workorder_changes(db, [(None, snap) for snap in snapshots])
+    await db.commit()
+    invalidate_trend_buckets(*snapshots)
+    return created, errors
+
+
+async def transition_workorders_bulk(db: AsyncSession, workorder_ids: List[int], status: str, maintenance_notes: str | None = None):
+    """Cambia el estado de varias órdenes en una transacción.
+
+    Las que pasan a COMPLETED reciben horas/coste reales (calculados para todas a la vez) y su
+    Maintenance, creado en la misma transacción si aún no existe. Devuelve (órdenes actualizadas,
+    maintenances creados, errores por id).
+    """
+    workorder_ids = list(dict.fromkeys(workorder_ids))
+    by_id = {wo.id: wo for wo in await _lock_workorders(db, workorder_ids)}
+    errors = [{"id": wo_id, "error": "Orden de trabajo no encontrada"} for wo_id in workorder_ids if wo_id not in by_id]
+    workorders = [by_id[wo_id] for wo_id in workorder_ids if wo_id in by_id]
+
+    completing = []
+    if status == WorkOrderStatus.COMPLETED.value:
+        completing = [wo for wo in workorders if wo.status != WorkOrderStatus.COMPLETED.value]
+    totals = await _completion_totals(db, [wo.id for wo in completing])
+    completed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    changes = []
+    for wo in workorders:
+        old_snapshot = workorder_snapshot(wo)
+        wo.status = status
+        if wo.id in totals:
+            wo.actual_hours, wo.actual_cost = totals[wo.id]
+            wo.completed_date = completed_at
+        changes.append((old_snapshot, workorder_snapshot(wo)))
+
+    maintenances = []
+    if completing:
+        res = await db.execute(
+            select(Maintenance.workorder_id).where(Maintenance.workorder_id.in_([wo.id for wo in completing]))
+        )
+        with_maintenance = set(res.scalars().all())
+        maintenances = [_maintenance_for_completed(wo, maintenance_notes) for wo in completing if wo.id not in with_maintenance]
+        db.add_all(maintenances)
+
+    await record_workorder_changes(db, changes)
+    await db.commit()
+    invalidate_trend_buckets(*[state for change in changes for state in change])
+    if workorders:
+        # updated_at lo fija la BD: recargar todas en una consulta (equivale al refresh de update_workorder)
+        await db.execute(
+            select(WorkOrder).where(WorkOrder.id.in_(list(by_id))).execution_options(populate_existing=True)
+        )
+    return workorders, maintenances, errors
@@ -857,117 +857,31 @@ async def _adjust_task_due_dates(session: AsyncSession):
 async def _rebalance_task_capacity(session: AsyncSession):
     """Redistribuye tareas que exceden la capacidad diaria moviéndolas a días siguientes con hueco.
 
-    Estrategia greedy:
-      - Agrupar tareas por (user, fecha) ordenadas por due_date y luego id.
-      - Calcular carga acumulada; si se excede capacidad, desplazar tareas excedentes
-        al siguiente día laborable con hueco (respetando días no laborables / especiales)
-        hasta 30 días hacia adelante para evitar loops infinitos.
+    Usa el planificador automático (controllers/auto_scheduler.py) sin reasignar: cada tarea
+    sigue con su responsable y solo se mueve a su siguiente día laborable con hueco.
     """
-    from app.models.calendar import UserSpecialDay, UserWorkingDay
-    tasks = (await session.execute(select(Task).where(Task.assigned_to.isnot(None), Task.due_date.isnot(None)))).scalars().all()
-    if not tasks:
+    from app.controllers.auto_scheduler import auto_schedule_tasks
+    bounds = (await session.execute(
+        select(func.min(Task.due_date), func.max(Task.due_date))
+        .where(Task.assigned_to.isnot(None), Task.due_date.isnot(None))
+    )).one()
+    if bounds[0] is None:
         return
-    # Cache patrones y especiales
-    specials = (await session.execute(select(UserSpecialDay))).scalars().all()
-    special_map = {(s.user_id, s.date): s for s in specials}
-    working_by_user: dict[int, dict[int, float]] = {}
-    # Agrupar por usuario y ordenar por fecha
-    tasks.sort(key=lambda x: (x.assigned_to, x.due_date, x.id))
-    by_user: dict[int, list[Task]] = {}
-    for t in tasks:
-        by_user.setdefault(t.assigned_to, []).append(t)
-    moved = 0
-    for uid, user_tasks in by_user.items():
-        # patrón
-        if uid not in working_by_user:
-            rows = (await session.execute(select(UserWorkingDay).where(UserWorkingDay.user_id==uid))).scalars().all()
-            if not rows:
-                for wd in range(7):
-                    session.add(UserWorkingDay(user_id=uid, weekday=wd, hours=(8.0 if wd < 5 else 0.0), is_active=True))
-                await session.flush()
-                rows = (await session.execute(select(UserWorkingDay).where(UserWorkingDay.user_id==uid))).scalars().all()
-            working_by_user[uid] = {r.weekday: (r.hours if r.is_active else 0.0) for r in rows}
-        pattern = working_by_user[uid]
-        # Recalcular iterativamente hasta que ningún día se exceda (máx 3 pasadas)
-        for _pass in range(3):
-            overload_found = False
-            # Reagrupar por fecha
-            day_map: dict[datetime.date, list[Task]] = {}
-            for t in user_tasks:
-                day_map.setdefault(t.due_date.date(), []).append(t)
-            for d, tlist in list(day_map.items()):
-                # Obtener capacidad día
-                spec = special_map.get((uid, d))
-                weekday = d.weekday()
-                base_hours = pattern.get(weekday, 0.0)
-                if spec:
-                    if not spec.is_working or (spec.is_working and spec.hours is not None and spec.hours <= 0):
-                        cap = 0.0
-                    else:
-                        cap = spec.hours if spec.hours is not None else base_hours
-                else:
-                    cap = base_hours
-                if cap <= 0:
-                    # mover todas las tareas de este día
-                    moving = tlist
-                else:
-                    # comprobar carga
-                    total = sum((t.estimated_hours or 0.0) for t in tlist)
-                    if total <= cap + 1e-6:
-                        continue
-                    overload_found = True
-                    # ordenar por id descendente para mover las más recientes primero
-                    tlist_sorted = sorted(tlist, key=lambda x: (x.due_date, x.id), reverse=True)
-                    moving = []
-                    current = total
-                    for mt in tlist_sorted:
-                        moving.append(mt)
-                        current -= (mt.estimated_hours or 0.0)
-                        if current <= cap + 1e-6:
-                            break
-                # Reubicar tareas en moving
-                for mt in moving:
-                    attempts = 0
-                    new_due = mt.due_date + timedelta(days=1)
-                    while attempts < 30:
-                        nd = new_due.date()
-                        spec2 = special_map.get((uid, nd))
-                        weekday2 = nd.weekday()
-                        base2 = pattern.get(weekday2, 0.0)
-                        if spec2:
-                            if not spec2.is_working or (spec2.is_working and spec2.hours is not None and spec2.hours <= 0):
-                                new_due += timedelta(days=1)
-                                attempts += 1
-                                continue
-                            cap2 = spec2.hours if spec2.hours is not None else base2
-                        else:
-                            cap2 = base2
-                        if cap2 <= 0:
-                            new_due += timedelta(days=1)
-                            attempts += 1
-                            continue
-                        # calcular carga ya planificada allí (incluyendo tareas movidas anteriormente en este loop)
-                        load2 = 0.0
-                        for oth in user_tasks:
-                            if oth is mt:
-                                continue
-                            if oth.due_date.date() == nd:
-                                load2 += (oth.estimated_hours or 0.0)
-                        if load2 + (mt.estimated_hours or 0.0) <= cap2 + 1e-6:
-                            mt.due_date = new_due
-                            moved += 1
-                            break
-                        new_due += timedelta(days=1)
-                        attempts += 1
-            if not overload_found:
-                break
+    user_ids = select(Task.assigned_to).where(Task.assigned_to.isnot(None), Task.due_date.isnot(None)).distinct()
+    users = (await session.execute(select(User).where(User.id.in_(user_ids)))).scalars().all()
+    start = bounds[0].date()
+    result = await auto_schedule_tasks(
+        session, users, start, (bounds[1].date() - start).days + 31,
+        include_unscheduled=False, reassign=False, statuses=None, dry_run=False,
+    )
+    moved = result["stats"]["moved"]
     if moved:
         logger.info("Rebalanceo de capacidad: %s tareas movidas a días posteriores", moved)
-        await session.flush()
 
 
 async def seed_database():
     """Puebla la base de datos con un conjunto amplio de datos (idempotente por umbrales)."""
+    from app.controllers.planned_hours import rebuild_planned_hours
     async with AsyncSessionLocal() as session:
         try:
             # Normalizar estados existentes siempre
@@ -996,6 +910,8 @@ async def seed_database():
                 await _adjust_task_due_dates(session)
                 await _rebalance_task_capacity(session)
                 await session.commit()
+                # El seed escribe tareas sin pasar por los controladores
+                await rebuild_planned_hours(session)
                 return
 
             # 4) Activos, componentes e inventario
@@ -1009,6 +925,7 @@ async def seed_database():
             await _rebalance_task_capacity(session)
 
             await session.commit()
+            await rebuild_planned_hours(session)
             logger.info("✅ Base de datos poblada y due_date ajustadas evitando días no laborables")
         except Exception as e:
             await session.rollback()
@@ -44,7 +44,7 @@ async def create_tables():
     Crea todas las tablas definidas en los modelos.
     """
     try:
-        from app.models import user, asset, failure, maintenance, task, workorder, department, calendar
+        from app.models import user, asset, failure, maintenance, task, workorder, department, calendar, kpi, revoked_token
         
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
@@ -114,17 +114,186 @@ async def apply_simple_migrations():
                     CONSTRAINT uq_user_date UNIQUE (user_id, date)
                 );
             """))
+            # Estados normalizados: los KPIs comparan por igualdad directa para poder usar índices
+            await conn.execute(text("""
+                UPDATE workorders SET status = upper(trim(status))
+                WHERE status IS DISTINCT FROM upper(trim(status));
+            """))
+            await conn.execute(text("""
+                UPDATE failures SET status = upper(trim(status)), severity = upper(trim(severity))
+                WHERE status IS DISTINCT FROM upper(trim(status))
+                   OR severity IS DISTINCT FROM upper(trim(severity));
+            """))
+            # Índices para agregados de KPI
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_workorders_status_completed
+                ON workorders (status, completed_date);
+            """))
+            # Vencidas: el predicado debe coincidir con OVERDUE_STATUSES en controllers/kpi.py
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_workorders_overdue
+                ON workorders (scheduled_date)
+                WHERE status IN ('OPEN', 'IN_PROGRESS') AND scheduled_date IS NOT NULL;
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_workorders_created_at
+                ON workorders (created_at);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_failures_status_severity
+                ON failures (status, severity);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_failures_reported
+                ON failures (reported_date, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_failures_resolved
+                ON failures (resolved_date) WHERE resolved_date IS NOT NULL;
+            """))
+            # Paginación keyset de los listados: orden (created_at, id) recorrido hacia atrás
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_workorders_created_id
+                ON workorders (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tasks_created_id
+                ON tasks (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_assets_created_id
+                ON assets (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_maintenance_created_id
+                ON maintenance (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_maintenance_plans_created_id
+                ON maintenance_plans (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_components_created_id
+                ON components (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_created_id
+                ON users (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_stock_movements_created_id
+                ON stock_movements (created_at, id);
+            """))
+            await conn.execute(text("""
+                ALTER TABLE stock_movements ALTER COLUMN created_at SET DEFAULT clock_timestamp();
+            """))
+            # Tendencia semanal de completadas (cualquier estado con completed_date): al añadir la
+            # columna se vacían los contadores para que ensure_kpi_rollups reconstruya al arrancar
+            await conn.execute(text("""
+                DO $$
+                BEGIN
+                    IF to_regclass('kpi_daily_rollups') IS NOT NULL AND NOT EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'kpi_daily_rollups' AND column_name = 'wo_closed'
+                    ) THEN
+                        ALTER TABLE kpi_daily_rollups ADD COLUMN wo_closed INTEGER NOT NULL DEFAULT 0;
+                        DELETE FROM kpi_counters;
+                    END IF;
+                END $$;
+            """))
+            # /inventory/usage/: orden (created_at, id), con o sin filtro de componente
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_task_used_components_created_id
+                ON task_used_components (created_at, id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_task_used_components_component_created
+                ON task_used_components (component_id, created_at, id);
+            """))
+            # Coste real al completar órdenes (agregado por workorder_id y task_id)
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tasks_workorder_id
+                ON tasks (workorder_id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_task_used_components_task_id
+                ON task_used_components (task_id);
+            """))
+            # Planificador: planes activos vencidos por fecha y WO activas por plan
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_maintenance_plans_next_due_active
+                ON maintenance_plans (next_due_date) WHERE active = true;
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_workorders_plan_status
+                ON workorders (plan_id, status) WHERE plan_id IS NOT NULL;
+            """))
+            # Jerarquía: "usuarios bajo el manager X" vía department_closure
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_departments_manager_id
+                ON departments (manager_id);
+            """))
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_department_id
+                ON users (department_id);
+            """))
+            # Libro de stock: items sin movimientos (anteriores al libro o creados por el seed)
+            # reciben su saldo inicial + sus consumos históricos. El saldo inicial se reconstruye
+            # como stock actual + todo lo consumido (los ajustes manuales anteriores no quedaron
+            # registrados). Las aperturas se insertan antes para que, a igual created_at, el id
+            # ordene aperturas antes que consumos.
+            pending = await conn.execute(text("""
+                SELECT array_agg(i.component_id) FROM inventory_items i
+                WHERE NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.component_id = i.component_id)
+            """))
+            pending_ids = pending.scalar()
+            if pending_ids:
+                await conn.execute(text("""
+                    INSERT INTO stock_movements (component_id, movement_type, quantity, balance_after, unit_cost, note, created_at)
+                    SELECT i.component_id, 'OPENING', i.quantity + coalesce(u.total, 0),
+                           i.quantity + coalesce(u.total, 0), i.unit_cost, 'Saldo inicial reconstruido',
+                           least(coalesce(i.created_at, now()), coalesce(u.first_at, now()))
+                    FROM inventory_items i
+                    LEFT JOIN (
+                        SELECT component_id, sum(quantity) AS total, min(created_at) AS first_at
+                        FROM task_used_components GROUP BY component_id
+                    ) u ON u.component_id = i.component_id
+                    WHERE i.component_id = ANY(:ids)
+                    ORDER BY i.component_id;
+                """), {"ids": pending_ids})
+                await conn.execute(text("""
+                    INSERT INTO stock_movements (component_id, movement_type, quantity, balance_after, unit_cost, task_id, created_at)
+                    SELECT t.component_id, 'CONSUMPTION', -t.quantity,
+                           i.quantity + sum(t.quantity) OVER (PARTITION BY t.component_id)
+                               - sum(t.quantity) OVER (PARTITION BY t.component_id ORDER BY t.created_at, t.id
+                                                       ROWS UNBOUNDED PRECEDING),
+                           t.unit_cost_snapshot, t.task_id, coalesce(t.created_at, now())
+                    FROM task_used_components t
+                    JOIN inventory_items i ON i.component_id = t.component_id
+                    WHERE t.component_id = ANY(:ids)
+                    ORDER BY t.created_at, t.id;
+                """), {"ids": pending_ids})
         logger.info("✅ Migraciones simples aplicadas")
     except Exception as e:
         logger.warning(f"⚠️ Error aplicando migraciones simples: {e}")
         # No elevar para no romper el arranque; se registró la advertencia
+    try:
+        # Búsqueda: pg_trgm puede requerir privilegios, va en su propia transacción
+        from app.controllers.search import SEARCH_INDEXES
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for ddl in SEARCH_INDEXES:
+                await conn.execute(text(ddl))
+        logger.info("✅ Índices de búsqueda (pg_trgm) aplicados")
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron crear los índices de búsqueda (pg_trgm): {e}")
 
 async def drop_tables():
     """
     Elimina todas las tablas de la base de datos.
     """
     try:
-        from app.models import user, asset, failure, maintenance, task, workorder, department, calendar
+        from app.models import user, asset, failure, maintenance, task, workorder, department, calendar, kpi, revoked_token
         
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
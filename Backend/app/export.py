@@ -0,0 +1,84 @@
+"""Exportación en streaming (NDJSON o CSV) de consultas completas.
+
+Las filas se leen con un cursor de servidor (`session.stream` + `yield_per`) como columnas
+planas, sin instanciar modelos ORM ni validarlos con Pydantic, y se emiten por bloques: la
+memoria usada no depende del número de filas exportadas.
+
+La consulta se ejecuta en una sesión propia: la sesión de `get_db` se cierra antes de que
+StreamingResponse termine de enviar el cuerpo.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, AsyncIterator, Literal
+
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.database.postgres import AsyncSessionLocal
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def export_columns(query, model):
+    """Sustituye las entidades de `query` por las columnas de la tabla del modelo (filtros intactos)."""
+    return query.with_only_columns(*model.__table__.columns)
+
+
+async def _stream_rows(query, fmt: ExportFormat) -> AsyncIterator[str]:
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+        async for batch in result.partitions():
+            for row in batch:
+                if fmt == "csv":
+                    writer.writerow([_csv_value(v) for v in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+def stream_export(query, fmt: ExportFormat, filename: str) -> StreamingResponse:
+    """StreamingResponse que exporta todas las filas de `query` en el formato pedido."""
+    return StreamingResponse(
+        _stream_rows(query, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -5,11 +5,22 @@ from contextlib import asynccontextmanager
 import logging
 
 from app.config import settings
-from app.database.postgres import check_connection, create_tables, apply_simple_migrations
+from app.cache import cache_stats
+from app.auth.security import password_hashing_stats
+from app.auth.revocation import get_revocation_store
+from app.pagination import NEXT_CURSOR_HEADER
+from app.scheduler import scheduler_stats, start_scheduler, stop_scheduler
+from app.auth.dependencies import require_role
+from app.database.postgres import check_connection, create_tables, apply_simple_migrations, AsyncSessionLocal
+from app.controllers.kpi_rollup import ensure_kpi_rollups
+from app.controllers.department import ensure_department_closure
+from app.controllers.stock_health import ensure_stock_health
+from app.controllers.plan_occurrences import ensure_plan_occurrences
+from app.controllers.planned_hours import ensure_planned_hours
 from app.database.data_seed import seed_database
 from app.routers import (
     auth, users, assets,
-    failures, maintenance, maintenance_plan, tasks, workorders, components, department, kpi, inventory, planner, calendar
+    failures, maintenance, maintenance_plan, tasks, workorders, components, department, kpi, inventory, planner, calendar, search
 )
 
 # Configurar logging
@@ -45,6 +56,22 @@ async def lifespan(app: FastAPI):
             logger.info("🌱 Verificando/poblando datos iniciales...")
             await seed_database()
             logger.info("✅ Datos iniciales listos")
+
+            # Acumulados de KPI (solo se construyen si aún no existen)
+            async with AsyncSessionLocal() as session:
+                if await ensure_kpi_rollups(session):
+                    logger.info("✅ Acumulados de KPI construidos")
+                # Jerarquía de departamentos (tabla de cierre)
+                await ensure_department_closure(session)
+                # Estado de stock para /inventory/alerts
+                if await ensure_stock_health(session):
+                    logger.info("✅ Estado de stock calculado")
+                # Ocurrencias proyectadas de los planes
+                if await ensure_plan_occurrences(session):
+                    logger.info("✅ Ocurrencias de planes proyectadas")
+                # Horas planificadas por usuario y día (validación de capacidad)
+                if await ensure_planned_hours(session):
+                    logger.info("✅ Horas planificadas por usuario y día calculadas")
             
         except Exception as e:
             logger.warning(f"⚠️ Error durante la inicialización de datos: {e}")
@@ -53,12 +80,16 @@ async def lifespan(app: FastAPI):
         logger.error("❌ No se pudo conectar a la base de datos")
         raise HTTPException(status_code=500, detail="Database connection failed")
     
+    # Planificador de planes en segundo plano (solo actúa el worker con el lock de líder)
+    scheduler_task = start_scheduler()
+
     logger.info("✅ Aplicación iniciada correctamente")
     
     yield
     
     # Shutdown
     logger.info("🛑 Cerrando aplicación...")
+    await stop_scheduler(scheduler_task)
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -76,6 +107,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Incluir routers
@@ -93,6 +125,7 @@ app.include_router(kpi.router, prefix=f"{settings.API_V1_STR}/kpi")
 app.include_router(inventory.router, prefix=f"{settings.API_V1_STR}/inventory")
 app.include_router(planner.router, prefix=f"{settings.API_V1_STR}/planner")
 app.include_router(calendar.router, prefix=f"{settings.API_V1_STR}/calendar")
+app.include_router(search.router, prefix=f"{settings.API_V1_STR}/search")
 
 @app.get("/")
 async def root():
@@ -119,6 +152,18 @@ async def health_check():
         "version": settings.VERSION
     }
 
+@app.get("/metrics")
+async def metrics(current = Depends(require_role(["Admin"]))):
+    """
+    Métricas internas de proceso (cachés en memoria, planificador). Solo Admin.
+    """
+    return {
+        "caches": cache_stats(),
+        "password_hashing": password_hashing_stats(),
+        "token_revocation": get_revocation_store().stats(),
+        "plan_scheduler": scheduler_stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
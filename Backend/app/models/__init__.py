@@ -9,10 +9,12 @@ from app.models.asset import Asset
 from app.models.component import Component
 from app.models.failure import Failure
 from app.models.maintenance import Maintenance
-from app.models.task import Task
+from app.models.task import Task, UserDayLoad
 from app.models.workorder import WorkOrder
-from app.models.inventory import InventoryItem, TaskUsedComponent
-from app.models.department import Department
+from app.models.inventory import InventoryItem, TaskUsedComponent, StockMovement, StockSnapshot, StockHealth
+from app.models.department import Department, DepartmentClosure, DepartmentHierarchyVersion
+from app.models.kpi import KpiDailyRollup, KpiCounter
+from app.models.revoked_token import RevokedToken
 
 __all__ = [
     "User",
@@ -21,8 +23,17 @@ __all__ = [
     "Failure",
     "Maintenance",
     "Task",
+    "UserDayLoad",
     "WorkOrder",
     "InventoryItem",
     "TaskUsedComponent",
-    "Department"
+    "StockMovement",
+    "StockSnapshot",
+    "StockHealth",
+    "Department",
+    "DepartmentClosure",
+    "DepartmentHierarchyVersion",
+    "KpiDailyRollup",
+    "KpiCounter",
+    "RevokedToken",
 ]
\ No newline at end of file
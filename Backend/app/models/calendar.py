@@ -26,3 +26,14 @@ class UserSpecialDay(Base):
     __table_args__ = (
         UniqueConstraint('user_id', 'date', name='uq_user_date'),
     )
+
+
+class CompanyHoliday(Base):
+    """Festivo de empresa: no laborable para todos los usuarios sin una fila por usuario.
+
+    Un UserSpecialDay del usuario para esa fecha tiene prioridad (p.ej. guardia en festivo).
+    """
+    __tablename__ = "company_holidays"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False, unique=True)
+    reason = Column(String(120), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.postgres import Base
@@ -22,3 +22,30 @@ class Department(Base):
     children = relationship("Department", back_populates="parent")
     manager = relationship("User", foreign_keys=[manager_id])
     users = relationship("User", back_populates="department", foreign_keys="User.department_id")
+
+
+class DepartmentClosure(Base):
+    """Tabla de cierre de la jerarquía: una fila por cada par (ancestro, descendiente), incluido (d, d).
+
+    Se reconstruye desde departments.parent_id con controllers.department.rebuild_department_closure.
+    """
+    __tablename__ = "department_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("departments.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("departments.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_department_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+
+class DepartmentHierarchyVersion(Base):
+    """Fila única con la versión de la jerarquía; sube en la misma transacción que reconstruye el cierre.
+
+    Las cachés de subárboles de todos los workers la leen y la llevan en la clave.
+    """
+    __tablename__ = "department_hierarchy_version"
+
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
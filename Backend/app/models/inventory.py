@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Date, String, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.postgres import Base
@@ -29,3 +29,60 @@ class TaskUsedComponent(Base):
 
     task = relationship("Task", back_populates="used_components")
     component = relationship("Component", back_populates="used_in_tasks")
+
+
+class StockMovement(Base):
+    """Libro de movimientos de stock (solo inserciones).
+
+    `quantity` es la variación con signo y `balance_after` el saldo del componente tras el
+    movimiento: el stock en un instante es el `balance_after` del último movimiento anterior,
+    una búsqueda en el índice (component_id, created_at, id).
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_component_created", "component_id", "created_at", "id"),
+        Index("ix_stock_movements_created_id", "created_at", "id"),  # listado sin filtro de componente
+        Index("ix_stock_movements_task_id", "task_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    component_id = Column(Integer, ForeignKey("components.id", ondelete="CASCADE"), nullable=False)
+    movement_type = Column(String(20), nullable=False)  # OPENING, RECEIPT, CONSUMPTION, ADJUSTMENT
+    quantity = Column(Float, nullable=False)
+    balance_after = Column(Float, nullable=False)
+    unit_cost = Column(Float, nullable=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    note = Column(String(255), nullable=True)
+    # clock_timestamp() y no now() (inicio de la transacción): el movimiento se inserta tras
+    # bloquear la fila del item, así que created_at sigue el mismo orden que balance_after
+    created_at = Column(DateTime(timezone=True), server_default=func.clock_timestamp(), nullable=False)
+
+
+class StockSnapshot(Base):
+    """Saldo de cierre diario por componente, para valorar el inventario a una fecha."""
+    __tablename__ = "stock_snapshots"
+
+    snapshot_date = Column(Date, primary_key=True)
+    component_id = Column(Integer, ForeignKey("components.id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Float, nullable=False)
+    unit_cost = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class StockHealth(Base):
+    """Estado de stock precalculado por componente (ver controllers/stock_health.py)."""
+    __tablename__ = "inventory_stock_health"
+    __table_args__ = (
+        Index("ix_stock_health_status_days", "status", "days_to_stockout"),
+    )
+
+    component_id = Column(Integer, ForeignKey("components.id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Float, nullable=False)
+    avg_daily_30d = Column(Float, nullable=False, default=0)
+    avg_daily_90d = Column(Float, nullable=False, default=0)
+    daily_rate = Column(Float, nullable=False, default=0)
+    planned_demand = Column(Float, nullable=False, default=0)
+    days_to_stockout = Column(Float, nullable=True)  # NULL: sin consumo previsto
+    status = Column(String(10), nullable=False)  # OK, LOW, CRITICAL, OUT
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
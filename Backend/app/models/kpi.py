@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.database.postgres import Base
+
+
+class KpiDailyRollup(Base):
+    """Acumulados diarios por asset para servir KPIs sin recorrer el histórico.
+
+    asset_id = 0 agrupa los registros sin asset asociado (p.ej. fallos de componentes huérfanos).
+    """
+    __tablename__ = "kpi_daily_rollups"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    asset_id = Column(Integer, nullable=False, default=0)
+
+    # Work orders
+    wo_created = Column(Integer, nullable=False, default=0, server_default="0")
+    wo_planned = Column(Integer, nullable=False, default=0, server_default="0")
+    wo_completed = Column(Integer, nullable=False, default=0, server_default="0")  # completed_date y estado COMPLETED
+    wo_closed = Column(Integer, nullable=False, default=0, server_default="0")  # completed_date, cualquier estado (tendencia semanal)
+    repair_hours_sum = Column(Float, nullable=False, default=0.0, server_default="0")  # started -> completed
+    repair_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completion_hours_sum = Column(Float, nullable=False, default=0.0, server_default="0")  # created -> completed
+    completion_count = Column(Integer, nullable=False, default=0, server_default="0")
+    response_hours_sum = Column(Float, nullable=False, default=0.0, server_default="0")  # started|created -> completed
+    response_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Failures
+    failures_reported = Column(Integer, nullable=False, default=0, server_default="0")
+    failures_resolved = Column(Integer, nullable=False, default=0, server_default="0")
+    first_resolved_at = Column(DateTime, nullable=True)
+    last_resolved_at = Column(DateTime, nullable=True)
+    mttf_hours_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    mttf_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('day', 'asset_id', name='uq_kpi_rollup_day_asset'),
+        Index('ix_kpi_rollups_asset_day', 'asset_id', 'day'),
+    )
+
+
+class KpiCounter(Base):
+    """Contadores de estado actuales (workorder_status, failure_status, failure_severity)."""
+    __tablename__ = "kpi_counters"
+
+    scope = Column(String(40), primary_key=True)
+    key = Column(String(40), primary_key=True)
+    value = Column(Integer, nullable=False, default=0, server_default="0")
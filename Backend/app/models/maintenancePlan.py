@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.postgres import Base
@@ -42,3 +42,23 @@ class MaintenancePlan(Base):
 
     # Un plan tiene múltiples ejecuciones registradas en Maintenance
     maintenances = relationship("Maintenance", back_populates="plan", cascade="all, delete-orphan")
+
+
+class PlanOccurrence(Base):
+    """Próximas ocurrencias proyectadas de cada plan activo (ver controllers/plan_occurrences.py).
+
+    asset_id es el del plan o, si solo tiene componente, el activo del componente: "qué vence
+    en los próximos N días para estos activos" es un rango sobre ix_plan_occurrences_asset_due.
+    """
+    __tablename__ = "plan_occurrences"
+    __table_args__ = (
+        Index("ix_plan_occurrences_asset_due", "asset_id", "due_date"),
+        Index("ix_plan_occurrences_due", "due_date"),
+    )
+
+    plan_id = Column(Integer, ForeignKey("maintenance_plans.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # 0 = next_due_date (o la primera tras hoy si está vencido)
+    due_date = Column(DateTime, nullable=False)  # naive UTC, como next_due_date
+    asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=True)
+    component_id = Column(Integer, ForeignKey("components.id", ondelete="CASCADE"), nullable=True)
+    estimated_duration = Column(Float, nullable=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime, Index
+from app.database.postgres import Base
+
+
+class RevokedToken(Base):
+    """Tokens JWT revocados (logout), por jti. Las filas caducadas se purgan periódicamente."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_revoked_tokens_expires_at', 'expires_at'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.postgres import Base
@@ -35,4 +35,18 @@ class Task(Base):
     component = relationship("Component", back_populates="tasks")  # Reemplaza machine
     workorder = relationship("WorkOrder", back_populates="tasks")
     # organization = relationship("Organization", back_populates="tasks")
-    used_components = relationship("TaskUsedComponent", back_populates="task", cascade="all, delete-orphan")
\ No newline at end of file
+    used_components = relationship("TaskUsedComponent", back_populates="task", cascade="all, delete-orphan")
+
+class UserDayLoad(Base):
+    """Horas planificadas por (usuario, día): suma de estimated_hours de sus tareas con due_date ese día.
+
+    Se mantiene con deltas en la misma transacción que crea, modifica o borra la tarea
+    (controllers/planned_hours.py), así la validación de capacidad es una lectura por clave.
+    """
+    __tablename__ = "user_day_planned_hours"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    planned_hours = Column(Float, nullable=False, default=0.0, server_default="0")
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
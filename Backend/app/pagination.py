@@ -0,0 +1,90 @@
+"""Paginación por cursor (keyset) para los listados.
+
+El cursor es opaco para el cliente: codifica los valores de la clave de orden (p.ej.
+created_at, id) del último elemento devuelto. La página siguiente se obtiene con
+`WHERE (clave) < (cursor)` (comparación de filas) sobre el índice, sin OFFSET, así que su coste no crece con la
+profundidad. Los listados siguen devolviendo una lista; el cursor de la página siguiente
+viaja en la cabecera X-Next-Cursor.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, literal, or_, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(v: Any) -> Any:
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    return v
+
+
+def _decode_value(v: Any) -> Any:
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+    return v
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+
+def apply_keyset(query, sort_column, id_column, cursor: Optional[str] = None, descending: bool = True):
+    """Ordena por (sort_column, id) (DESC por defecto) y, si hay cursor, continúa tras él.
+
+    El corte es una comparación de filas `(sort_column, id) < (v, id_v)` (`>` en ascendente),
+    que PostgreSQL usa como límite del recorrido del índice (sort_column, id): las páginas
+    profundas cuestan lo mismo que la primera. DESC pone los NULL primero y ASC al final:
+    tras un cursor con sort_column NULL quedan el resto de NULL en orden de id y, en DESC,
+    después todas las filas con valor.
+    """
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    if not cursor:
+        return query
+    sort_value, id_value = decode_cursor(cursor, 2)
+    if sort_value is None:
+        if not descending:
+            return query.where(sort_column.is_(None), id_column > id_value)
+        return query.where(or_(
+            and_(sort_column.is_(None), id_column < id_value),
+            sort_column.is_not(None),
+        ))
+    # Los valores se ligan con el tipo de su columna (p.ej. TIMESTAMP WITH TIME ZONE)
+    key = tuple_(sort_column, id_column)
+    after = tuple_(literal(sort_value, sort_column.type), literal(id_value, id_column.type))
+    if descending:
+        return query.where(key < after)
+    # En ASC los NULL van detrás de todas las filas con valor
+    return query.where(or_(key > after, sort_column.is_(None)))
+
+
+def set_next_cursor(response: Response, items: Sequence[Any], page_size: int, sort_attr: str = "created_at") -> None:
+    """Publica en X-Next-Cursor el cursor tras el último elemento si la página vino llena."""
+    if len(items) < page_size or not items:
+        return
+    last = items[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, sort_attr), last.id])
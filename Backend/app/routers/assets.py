@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
 from app.schemas.asset import AssetCreate, AssetRead, AssetUpdate
 from app.controllers.asset import create_asset, get_asset, get_assets, update_asset, delete_asset
 from app.auth.dependencies import get_current_user, require_role
@@ -29,12 +30,16 @@ async def read_asset(
 
 @router.get("/", response_model=List[AssetRead])
 async def read_assets(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
-    page_size: int = Query(20, ge=1, description="Número de elementos por página"),
+    page_size: int = Query(20, ge=1, le=1000, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar activos"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    return await get_assets(db=db, page=page, page_size=page_size, search=search)
+    items = await get_assets(db=db, page=page, page_size=page_size, search=search, cursor=cursor)
+    set_next_cursor(response, items, page_size)
+    return items
 
 @router.put("/{asset_id}", response_model=AssetRead)
 async def update_existing_asset(
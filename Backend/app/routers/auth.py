@@ -3,7 +3,6 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func, or_
-from passlib.context import CryptContext
 
 from app.database.postgres import get_db
 from app.models.user import User
@@ -18,7 +17,6 @@ from app.auth.auth import (
 )
 
 router = APIRouter(tags=["Auth"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.post("/login")
 async def login(
@@ -31,7 +29,7 @@ async def login(
 @router.post("/logout")
 async def logout(token: str = Depends(oauth2_scheme)):
     """Cerrar sesión invalidando el token"""
-    logout_token(token)
+    await logout_token(token)
     return {"message": "Successfully logged out"}
 
 @router.post("/refresh")
@@ -4,42 +4,22 @@ from datetime import date, timedelta
 from typing import List
 from app.database.postgres import get_db
 from app.auth.dependencies import get_current_user, require_role
-from app.schemas.calendar import WorkingDayPattern, SpecialDay, SpecialDayCreate, UserCalendarWeek, UserCalendarDay, VacationRangeCreate, TeamVacationDay
+from app.schemas.calendar import (
+    WorkingDayPattern, SpecialDay, SpecialDayCreate, UserCalendarWeek, UserCalendarDay, VacationRangeCreate, TeamVacationDay,
+    BulkSpecialDaysCreate, BulkSpecialDaysResult, CompanyHoliday, CompanyHolidayCreate,
+)
 from app.controllers.calendar import (
     list_pattern, set_pattern, add_special_day, list_special_days, delete_special_day, compute_capacity_week,
-    add_vacation_range, list_team_vacations
+    add_vacation_range, list_team_vacations, bulk_upsert_special_days,
+    list_company_holidays, upsert_company_holidays, delete_company_holiday,
 )
-from app.models.department import Department
+from app.controllers.department import get_subordinate_user_ids, get_subtree_department_ids
 from app.models.user import User
 from sqlalchemy.future import select
 
 router = APIRouter(tags=["Calendar"])
 
 
-async def _get_subordinate_user_ids(db, manager_user_id: int):
-    """Devuelve los ids de usuarios en departamentos hijos (incluyendo raíces gestionadas)."""
-    dep_res = await db.execute(select(Department).where(Department.manager_id == manager_user_id))
-    managed = dep_res.scalars().all()
-    if not managed:
-        return []
-    all_dep_res = await db.execute(select(Department))
-    all_deps = all_dep_res.scalars().all()
-    by_parent = {}
-    for d in all_deps:
-        by_parent.setdefault(d.parent_id, []).append(d)
-    target = set()
-    stack = [d.id for d in managed]
-    while stack:
-        cur = stack.pop()
-        if cur in target:
-            continue
-        target.add(cur)
-        for ch in by_parent.get(cur, []):
-            stack.append(ch.id)
-    user_res = await db.execute(select(User).where(User.department_id.in_(target)))
-    users = user_res.scalars().all()
-    return [u.id for u in users]
-
 def _ensure_access(user_ctx, target_user_id: int, subordinate_ids):
     if user_ctx["role"] == "Admin":
         return
@@ -53,7 +33,7 @@ async def get_pattern(user_id: int, db: AsyncSession = Depends(get_db), current=
     if current["role"] == "Tecnico" and current["id"] != user_id:
         raise HTTPException(status_code=403, detail="Acceso denegado")
     if current["role"] == "Supervisor":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     rows = await list_pattern(db, user_id)
     return [WorkingDayPattern(weekday=r.weekday, hours=r.hours, is_active=r.is_active) for r in rows]
@@ -61,7 +41,7 @@ async def get_pattern(user_id: int, db: AsyncSession = Depends(get_db), current=
 @router.put("/{user_id}/pattern", response_model=List[WorkingDayPattern])
 async def put_pattern(user_id: int, payload: List[WorkingDayPattern], db: AsyncSession = Depends(get_db), current=Depends(require_role(["Admin","Supervisor"]))):
     if current["role"] != "Admin":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     rows = await set_pattern(db, user_id, payload)
     return [WorkingDayPattern(weekday=r.weekday, hours=r.hours, is_active=r.is_active) for r in rows]
@@ -72,7 +52,7 @@ async def get_special_days(user_id: int, start: date = Query(...), end: date = Q
     if current["role"] == "Tecnico" and current["id"] != user_id:
         raise HTTPException(status_code=403, detail="Acceso denegado")
     if current["role"] == "Supervisor":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     rows = await list_special_days(db, user_id, start, end)
     return rows
@@ -83,7 +63,7 @@ async def post_special_day(user_id: int, data: SpecialDayCreate, db: AsyncSessio
     if current["role"] == "Tecnico" and current["id"] != user_id:
         raise HTTPException(status_code=403, detail="Acceso denegado")
     if current["role"] == "Supervisor":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     row = await add_special_day(db, user_id, data)
     return row
@@ -94,7 +74,7 @@ async def delete_special(user_id: int, special_id: int, db: AsyncSession = Depen
     if current["role"] == "Tecnico" and current["id"] != user_id:
         raise HTTPException(status_code=403, detail="Acceso denegado")
     if current["role"] == "Supervisor":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     ok = await delete_special_day(db, user_id, special_id)
     if not ok:
@@ -109,7 +89,7 @@ async def get_calendar_week(user_id: int, start: date = Query(None), days: int =
         start = today - timedelta(days=today.weekday())
     start = start - timedelta(days=start.weekday())
     if current["role"] == "Supervisor" and current["id"] != user_id:
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     rows = await compute_capacity_week(db, user_id, start, days)
     return UserCalendarWeek(
@@ -124,7 +104,7 @@ async def post_vacation_range(user_id: int, data: VacationRangeCreate, db: Async
     if current["role"] == "Tecnico" and current["id"] != user_id:
         raise HTTPException(status_code=403, detail="Acceso denegado")
     if current["role"] == "Supervisor":
-        subs = await _get_subordinate_user_ids(db, current["id"])
+        subs = await get_subordinate_user_ids(db, current["id"])
         _ensure_access(current, user_id, subs)
     rows = await add_vacation_range(db, user_id, data.start_date, data.end_date, data.reason)
     return rows
@@ -135,3 +115,37 @@ async def get_team_vacations(manager_id: int, start: date = Query(...), end: dat
         raise HTTPException(status_code=403, detail="Solo puede consultar su propio equipo")
     raw = await list_team_vacations(db, manager_id, start, end)
     return [TeamVacationDay(id=i, user_id=uid, first_name=fn, last_name=ln, date=d, reason=r) for i, uid, fn, ln, d, r in raw]
+
+
+@router.post("/bulk/special-days", response_model=BulkSpecialDaysResult)
+async def post_bulk_special_days(data: BulkSpecialDaysCreate, db: AsyncSession = Depends(get_db), current=Depends(require_role(["Admin","Supervisor"]))):
+    """Vacaciones, cierres o jornadas especiales de varios usuarios o de un departamento entero en un solo upsert."""
+    user_ids = set(data.user_ids)
+    if data.department_id is not None:
+        subtree = await get_subtree_department_ids(db, [data.department_id])
+        res = await db.execute(select(User.id).where(User.department_id.in_(subtree)))
+        user_ids.update(res.scalars().all())
+    if current["role"] != "Admin":
+        subs = set(await get_subordinate_user_ids(db, current["id"]))
+        if not user_ids <= subs:
+            raise HTTPException(status_code=403, detail="Usuario fuera de su ámbito de gestión")
+    hours = data.hours if data.is_working else 0.0
+    rows = await bulk_upsert_special_days(db, sorted(user_ids), data.start_date, data.end_date, data.is_working, hours, data.reason)
+    return BulkSpecialDaysResult(users=len(user_ids), days=(data.end_date - data.start_date).days + 1, rows=rows)
+
+
+@router.get("/holidays", response_model=List[CompanyHoliday])
+async def get_company_holidays(start: date = Query(...), end: date = Query(...), db: AsyncSession = Depends(get_db), current=Depends(require_role(["Admin","Supervisor","Tecnico"]))):
+    return await list_company_holidays(db, start, end)
+
+@router.post("/holidays", response_model=List[CompanyHoliday])
+async def post_company_holidays(payload: List[CompanyHolidayCreate], db: AsyncSession = Depends(get_db), current=Depends(require_role(["Admin"]))):
+    # Festivos de empresa: aplican a todos los usuarios sin crear días especiales por usuario
+    return await upsert_company_holidays(db, payload)
+
+@router.delete("/holidays/{holiday_id}")
+async def delete_holiday(holiday_id: int, db: AsyncSession = Depends(get_db), current=Depends(require_role(["Admin"]))):
+    ok = await delete_company_holiday(db, holiday_id)
+    if not ok:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"detail": "Deleted"}
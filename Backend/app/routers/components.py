@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
 from app.auth.dependencies import get_current_user
 from app.controllers.component import (
     create_component, get_components, get_component, 
@@ -30,9 +31,11 @@ async def create_component_endpoint(
 
 @router.get("/", response_model=List[ComponentRead])
 async def get_components_endpoint(
+    response: Response,
     asset_id: int = Query(None, description="Filter by asset ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -40,8 +43,10 @@ async def get_components_endpoint(
         db=db,
         asset_id=asset_id,
         skip=skip, 
-        limit=limit
+        limit=limit,
+        cursor=cursor,
     )
+    set_next_cursor(response, components, limit)
     return components
 
 @router.get("/asset/{asset_id}", response_model=List[ComponentRead])
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.controllers.failure import get_failures_with_workorder_ids
 from app.schemas.failure import FailureWithWorkOrder
 
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
 from app.schemas.failure import FailureCreate, FailureRead, FailureUpdate
 from app.controllers.failure import (
     create_failure,
@@ -45,21 +46,26 @@ async def read_failure(
 
 @router.get("/", response_model=List[FailureRead])
 async def read_failures(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar fallos"),
     status: str = Query(None, description="Filtrar por estado"),
     severity: str = Query(None, description="Filtrar por severidad"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    return await get_failures(
+    items = await get_failures(
         db=db,
         page=page,
         page_size=page_size,
         search=search,
         status=status,
-        severity=severity
+        severity=severity,
+        cursor=cursor,
     )
+    set_next_cursor(response, items, page_size, "reported_date")
+    return items
 
 @router.get("/asset/{asset_id}", response_model=List[FailureRead])
 async def read_failures_by_asset(
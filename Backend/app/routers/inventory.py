@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.postgres import get_db
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, require_role
+from app.export import ExportFormat, stream_export
 from app.models.user import User
+from app.pagination import set_next_cursor
 from app.schemas.inventory import (
     InventoryItemCreate, InventoryItemRead, InventoryItemUpdate,
-    AdjustQuantityRequest, TaskUsedComponentRead, InventoryItemReadWithComponent
+    AdjustQuantityRequest, TaskUsedComponentRead, InventoryItemReadWithComponent,
+    StockMovementRead, StockMovementType, StockAtRead, StockSnapshotResult,
+    StockAlertRead, StockHealthStatus
 )
 from app.controllers.inventory import (
     create_inventory_item, get_inventory_items, get_inventory_item,
     update_inventory_item, delete_inventory_item, adjust_inventory_quantity,
-    get_inventory_by_component, list_task_used_components
+    get_inventory_by_component, list_task_used_components,
+    list_stock_movements, get_stock_at, take_stock_snapshot, valuation_query
 )
+from app.controllers.stock_health import get_stock_alerts, refresh_stock_health
 
 
 router = APIRouter(tags=["Inventory"])
@@ -40,6 +47,65 @@ async def list_items(
     return await get_inventory_items(db, component_type)
 
 
+@router.get("/alerts", response_model=List[StockAlertRead])
+async def list_stock_alerts(
+    status: Optional[List[StockHealthStatus]] = Query(None, description="Estados a incluir; por defecto OUT, CRITICAL y LOW"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Componentes con riesgo de rotura, ordenados por días hasta quedarse sin stock."""
+    return await get_stock_alerts(db, status, limit)
+
+
+@router.post("/alerts/refresh", response_model=dict)
+async def refresh_alerts(
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(require_role(["Admin"]))
+):
+    await refresh_stock_health(db)
+    await db.commit()
+    return {"status": "refreshed"}
+
+
+@router.get("/movements", response_model=List[StockMovementRead])
+async def list_movements(
+    response: Response,
+    component_id: Optional[int] = Query(None),
+    movement_type: Optional[StockMovementType] = Query(None),
+    task_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    movements = await list_stock_movements(db, component_id, movement_type, task_id, limit, cursor)
+    set_next_cursor(response, movements, limit)
+    return movements
+
+
+@router.get("/valuation/export")
+async def export_valuation(
+    as_of: Optional[date] = Query(None, description="Fecha de cierre (UTC); por defecto el stock actual"),
+    format: ExportFormat = Query("ndjson", description="Formato de exportación: ndjson o csv"),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(require_role(["Admin", "Supervisor"]))
+):
+    query = await valuation_query(db, as_of)
+    return stream_export(query, format, f"inventory_valuation_{as_of or 'current'}")
+
+
+@router.post("/snapshots", response_model=StockSnapshotResult)
+async def create_snapshot(
+    day: Optional[date] = Query(None, description="Día a cerrar (UTC); por defecto ayer"),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(require_role(["Admin"]))
+):
+    day = day or (datetime.now(timezone.utc).date() - timedelta(days=1))
+    components = await take_stock_snapshot(db, day)
+    return {"snapshot_date": day, "components": components}
+
+
 @router.get("/{item_id}", response_model=InventoryItemReadWithComponent)
 async def get_item(
     item_id: int,
@@ -64,6 +130,19 @@ async def get_item_by_component(
     return item
 
 
+@router.get("/by-component/{component_id}/stock", response_model=StockAtRead)
+async def get_stock_at_time(
+    component_id: int,
+    at: Optional[datetime] = Query(None, description="Instante a consultar; por defecto ahora"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    at = at or datetime.now(timezone.utc)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return {"component_id": component_id, "at": at, "quantity": await get_stock_at(db, component_id, at)}
+
+
 @router.put("/{item_id}", response_model=InventoryItemRead)
 async def update_item(
     item_id: int,
@@ -71,7 +150,7 @@ async def update_item(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    item = await update_inventory_item(db, item_id, item_in)
+    item = await update_inventory_item(db, item_id, item_in, user_id=current_user["id"])
     if not item:
         raise HTTPException(status_code=404, detail="Inventory item not found")
     return item
@@ -83,7 +162,7 @@ async def delete_item(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    ok = await delete_inventory_item(db, item_id)
+    ok = await delete_inventory_item(db, item_id, user_id=current_user["id"])
     if not ok:
         raise HTTPException(status_code=404, detail="Inventory item not found")
     return {"status": "deleted"}
@@ -97,7 +176,9 @@ async def adjust_item_quantity(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        item = await adjust_inventory_quantity(db, item_id, payload.delta)
+        item = await adjust_inventory_quantity(
+            db, item_id, payload.delta, payload.movement_type, payload.reason, current_user["id"]
+        )
         if not item:
             raise HTTPException(status_code=404, detail="Inventory item not found")
         return item
@@ -107,8 +188,13 @@ async def adjust_item_quantity(
 
 @router.get("/usage/", response_model=List[TaskUsedComponentRead])
 async def list_usage(
+    response: Response,
     component_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return await list_task_used_components(db, component_id)
+    usage = await list_task_used_components(db, component_id, limit, cursor)
+    set_next_cursor(response, usage, limit)
+    return usage
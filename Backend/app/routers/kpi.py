@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.postgres import get_db
-from app.auth.dependencies import get_current_user, get_optional_user
-from app.schemas.kpi import KpiSummary, KpiTrends, AssetKpi, WorkOrderKpi, FailureKpi, MonthlyResponseSeries
-from app.controllers.kpi import get_kpi_summary, get_kpi_trends, get_assets_kpi, get_workorders_kpi, get_failures_kpi, get_monthly_response_times
+from app.auth.dependencies import get_current_user, get_optional_user, require_role
+from app.schemas.kpi import KpiSummary, KpiTrends, AssetKpi, WorkOrderKpi, FailureKpi, MonthlyResponseSeries, ReliabilityReport, KpiDashboard
+from app.controllers.kpi import get_kpi_summary, get_kpi_trends, get_assets_kpi, get_workorders_kpi, get_failures_kpi, get_monthly_response_times, get_reliability_report, get_kpi_dashboard
+from app.controllers.kpi_rollup import rebuild_kpi_rollups, verify_kpi_rollups
 
 
 router = APIRouter(tags=["kpi"])
@@ -57,3 +58,44 @@ async def monthly_response_times(
     _user = Depends(get_optional_user),
 ):
     return await get_monthly_response_times(db, months)
+
+
+@router.get("/dashboard", response_model=KpiDashboard)
+async def kpi_dashboard(
+    weeks: int = Query(8, ge=1, le=52),
+    months: int = Query(6, ge=1, le=24),
+    db: AsyncSession = Depends(get_db),
+    _user = Depends(get_optional_user),
+):
+    """Todos los KPIs del dashboard en una sola llamada."""
+    return await get_kpi_dashboard(db, weeks, months)
+
+
+@router.get("/reliability", response_model=ReliabilityReport)
+async def reliability(
+    page: int = Query(1, ge=1, description="Página actual"),
+    page_size: int = Query(20, ge=1, le=100, description="Número de assets por página"),
+    db: AsyncSession = Depends(get_db),
+    _user = Depends(get_optional_user),
+):
+    """MTBF/MTTF global y por asset, ordenado por peor MTBF."""
+    return await get_reliability_report(db, page, page_size)
+
+
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(
+    db: AsyncSession = Depends(get_db),
+    _user = Depends(require_role(["Admin"])),
+):
+    """Recalcula los acumulados de KPI desde el histórico (reparación tras cargas masivas o ediciones manuales)."""
+    await rebuild_kpi_rollups(db)
+    return {"detail": "KPI rollups rebuilt"}
+
+
+@router.get("/rollups/verify")
+async def verify_rollups(
+    db: AsyncSession = Depends(get_db),
+    _user = Depends(require_role(["Admin"])),
+):
+    """Compara los acumulados incrementales con un rebuild (sin escribir): claves descuadradas y muestra."""
+    return await verify_kpi_rollups(db)
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
+from app.export import ExportFormat, export_columns, stream_export
+from app.models.maintenance import Maintenance
 from app.schemas.maintenance import MaintenanceCreate, MaintenanceRead, MaintenanceUpdate
 from app.controllers.maintenance import (
     create_maintenance, 
     get_maintenance, 
     get_all_maintenance,
     get_maintenance_by_asset,
+    maintenance_by_asset_query,
     update_maintenance, 
     delete_maintenance
 )
@@ -36,17 +40,22 @@ async def read_maintenance(
 
 @router.get("/", response_model=List[MaintenanceRead])
 async def read_all_maintenance(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar mantenimientos"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    return await get_all_maintenance(
+    items = await get_all_maintenance(
         db=db,
         page=page, 
         page_size=page_size, 
-        search=search
+        search=search,
+        cursor=cursor,
     )
+    set_next_cursor(response, items, page_size)
+    return items
 
 @router.get("/asset/{asset_id}", response_model=List[MaintenanceRead])
 async def read_maintenance_by_asset(
@@ -55,6 +64,17 @@ async def read_maintenance_by_asset(
 ):
     return await get_maintenance_by_asset(db=db, asset_id=asset_id)
 
+@router.get("/asset/{asset_id}/export")
+async def export_maintenance_by_asset(
+    asset_id: int,
+    format: ExportFormat = Query("ndjson", description="Formato de exportación: ndjson o csv"),
+    _user = Depends(get_current_user),
+):
+    """Exporta en streaming el historial de mantenimiento de un activo."""
+    query = export_columns(maintenance_by_asset_query(asset_id), Maintenance)
+    query = query.order_by(Maintenance.created_at.desc(), Maintenance.id.desc())
+    return stream_export(query, format, f"maintenance_asset_{asset_id}")
+
 @router.put("/{maintenance_id}", response_model=MaintenanceRead)
 async def update_existing_maintenance(
     maintenance_id: int,
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
 from app.schemas.maintenance_plan import (
     MaintenancePlanCreate,
     MaintenancePlanRead,
     MaintenancePlanUpdate,
+    PlanOccurrenceRead,
 )
 from app.controllers.maintenance_plan import (
     create_maintenance_plan,
@@ -23,6 +25,8 @@ from app.models.maintenancePlan import MaintenancePlan
 from app.models.workorder import WorkOrder
 from app.models.enums import WorkOrderStatus
 from app.auth.dependencies import get_current_user, require_role
+from app.controllers.plan_scheduler import generate_due_workorders
+from app.controllers.plan_occurrences import get_plan_occurrences
 
 router = APIRouter(tags=["MaintenancePlan"])
 
@@ -72,6 +76,29 @@ async def read_upcoming_maintenance_plans(
     result = await db.execute(query)
     return result.scalars().all()
 
+@router.get("/occurrences", response_model=List[PlanOccurrenceRead])
+async def read_plan_occurrences(
+    days: int = Query(90, ge=1, le=365, description="Días hacia adelante desde `start`"),
+    start: datetime = Query(None, description="Inicio del rango; por defecto ahora"),
+    asset_id: List[int] = Query(None, description="Activos a incluir (repetible); por defecto todos"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(require_role(["Admin", "Supervisor", "Tecnico"]))
+):
+    """Ocurrencias proyectadas de los planes activos en el rango, ordenadas por fecha."""
+    start = start or datetime.now(timezone.utc)
+    if start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    return await get_plan_occurrences(db, start, start + timedelta(days=days), asset_id, limit)
+
+@router.post("/generate-due", response_model=dict)
+async def generate_due_plan_workorders(
+    db: AsyncSession = Depends(get_db),
+    user = Depends(require_role(["Admin"]))
+):
+    """Ejecuta ya una pasada del planificador: crea las órdenes de los planes vencidos y avanza sus fechas."""
+    return await generate_due_workorders(db)
+
 @router.post("/", response_model=MaintenancePlanRead)
 async def create_new_maintenance_plan(
     plan_in: MaintenancePlanCreate,
@@ -91,24 +118,32 @@ async def read_maintenance_plan(plan_id: int, db: AsyncSession = Depends(get_db)
 
 @router.get("/", response_model=List[MaintenancePlanRead])
 async def read_all_maintenance_plans(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar planes"),
     asset_id: int = Query(None, description="Filter by asset id"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
 ):
-    return await get_all_maintenance_plans(db=db, page=page, page_size=page_size, search=search, asset_id=asset_id)
+    items = await get_all_maintenance_plans(db=db, page=page, page_size=page_size, search=search, asset_id=asset_id, cursor=cursor)
+    set_next_cursor(response, items, page_size)
+    return items
 
 # Versión sin slash final para evitar 422 cuando se llama /maintenance/plans sin "/"
 @router.get("", response_model=List[MaintenancePlanRead], include_in_schema=False)
 async def read_all_maintenance_plans_noslash(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar planes"),
     asset_id: int = Query(None, description="Filter by asset id"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
 ):
-    return await get_all_maintenance_plans(db=db, page=page, page_size=page_size, search=search, asset_id=asset_id)
+    items = await get_all_maintenance_plans(db=db, page=page, page_size=page_size, search=search, asset_id=asset_id, cursor=cursor)
+    set_next_cursor(response, items, page_size)
+    return items
 
 
 @router.put("/{plan_id}", response_model=MaintenancePlanRead)
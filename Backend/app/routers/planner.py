@@ -5,10 +5,16 @@ from typing import List
 
 from app.database.postgres import get_db
 from app.auth.dependencies import get_current_user, require_role
-from app.schemas.planner import PlannerWeek, PlannerUserRow, PlannerDay, PlannerTask
-from app.controllers.calendar import compute_capacity_week
+from app.schemas.planner import (
+    PlannerWeek, PlannerUserRow, PlannerDay, PlannerTask, PlannerForecast,
+    AutoScheduleRequest, AutoScheduleResult,
+)
+from app.controllers.calendar import compute_capacity_grid
+from app.controllers.forecast import get_workload_forecast, invalidate_forecast_days
+from app.controllers.auto_scheduler import auto_schedule_tasks
+from app.controllers.planned_hours import rebuild_planned_hours
+from app.controllers.department import get_subordinate_user_ids, get_managed_department_ids, get_subtree_department_ids
 from app.models.user import User
-from app.models.department import Department
 from app.models.task import Task
 from sqlalchemy.future import select
 
@@ -17,35 +23,6 @@ router = APIRouter(tags=["Planner"])
 WORKDAY_HOURS = 8.0
 
 
-async def _get_subordinate_user_ids(db: AsyncSession, manager_user_id: int) -> List[int]:
-    # Obtener departamentos donde el usuario es manager
-    result = await db.execute(select(Department).where(Department.manager_id == manager_user_id))
-    managed_deps = result.scalars().all()
-    if not managed_deps:
-        return []
-    # Construir árbol para incluir subdepartamentos
-    # Obtener todos
-    all_res = await db.execute(select(Department))
-    all_deps = all_res.scalars().all()
-    by_parent = {}
-    for d in all_deps:
-        by_parent.setdefault(d.parent_id, []).append(d)
-    target_dep_ids = set()
-    stack = [d.id for d in managed_deps]
-    while stack:
-        cur = stack.pop()
-        if cur in target_dep_ids:
-            continue
-        target_dep_ids.add(cur)
-        children = by_parent.get(cur, [])
-        for ch in children:
-            stack.append(ch.id)
-    # Obtener usuarios en esos departamentos (excluyendo managers quizá?)
-    user_res = await db.execute(select(User).where(User.department_id.in_(target_dep_ids)))
-    users = user_res.scalars().all()
-    return [u.id for u in users]
-
-
 @router.get("/week", response_model=PlannerWeek)
 async def get_planner_week(
     start: date = Query(None, description="Fecha de inicio de la semana (lunes)"),
@@ -62,7 +39,7 @@ async def get_planner_week(
     end = start + timedelta(days=days)
 
     # Obtener ids subordinados
-    subordinate_ids = await _get_subordinate_user_ids(db, current["id"]) if current["role"] != "Admin" else None
+    subordinate_ids = await get_subordinate_user_ids(db, current["id"]) if current["role"] != "Admin" else None
 
     user_query = select(User)
     if subordinate_ids is not None:
@@ -88,9 +65,12 @@ async def get_planner_week(
         d_key = t.due_date.date()
         tasks_by_user_date.setdefault((t.assigned_to, d_key), []).append(t)
 
+    # Capacidad de todos los usuarios en dos consultas
+    capacity = await compute_capacity_grid(db, [u.id for u in users], start, days)
+
     week_users: List[PlannerUserRow] = []
     for u in users:
-        capacity_rows = await compute_capacity_week(db, u.id, start, days)
+        capacity_rows = capacity[u.id]
         day_list: List[PlannerDay] = []
         for (d, cap, is_non, reason) in capacity_rows:
             tlist = tasks_by_user_date.get((u.id, d), [])
@@ -108,3 +88,80 @@ async def get_planner_week(
         week_users.append(PlannerUserRow(user=u, days=day_list))
 
     return PlannerWeek(start=start, days=days, users=week_users)
+
+
+@router.get("/forecast", response_model=PlannerForecast)
+async def get_planner_forecast(
+    start: date = Query(None, description="Semana inicial (se normaliza a lunes); por defecto la actual"),
+    weeks: int = Query(12, ge=1, le=26, description="Número de semanas a prever"),
+    department_id: int = Query(None, description="Limitar a los usuarios de un departamento"),
+    db: AsyncSession = Depends(get_db),
+    current = Depends(require_role(["Admin", "Supervisor"]))
+):
+    """Carga prevista (tareas + ocurrencias proyectadas de planes) frente a capacidad, por semana."""
+    today = date.today()
+    start = (start or today) - timedelta(days=(start or today).weekday())
+
+    subordinate_ids = await get_subordinate_user_ids(db, current["id"]) if current["role"] != "Admin" else None
+    user_query = select(User).where(User.is_active.is_not(False))
+    if subordinate_ids is not None:
+        user_query = user_query.where(User.id.in_(subordinate_ids))
+    if department_id is not None:
+        user_query = user_query.where(User.department_id == department_id)
+    users = (await db.execute(user_query)).scalars().all()
+
+    # La carga de activos sin responsable solo se muestra con alcance global
+    forecast = await get_workload_forecast(
+        db, users, start, weeks,
+        include_unassigned=subordinate_ids is None and department_id is None,
+    )
+    return PlannerForecast(**forecast)
+
+
+@router.post("/auto-schedule", response_model=AutoScheduleResult)
+async def auto_schedule(
+    payload: AutoScheduleRequest,
+    db: AsyncSession = Depends(get_db),
+    current = Depends(require_role(["Admin", "Supervisor"]))
+):
+    """Asigna fecha y responsable a las tareas que no caben o no están planificadas, según capacidad.
+
+    Con dry_run (por defecto) solo devuelve la propuesta; si no, la aplica en una transacción.
+    """
+    start = payload.start or date.today()
+    departments = None
+    if current["role"] != "Admin":
+        departments = await get_managed_department_ids(db, current["id"])
+    if payload.department_id is not None:
+        subtree = await get_subtree_department_ids(db, [payload.department_id])
+        if departments is not None and payload.department_id not in departments:
+            raise HTTPException(status_code=403, detail="Department outside managed scope")
+        departments = subtree
+
+    user_query = select(User).where(User.is_active.is_not(False))
+    if departments is not None:
+        if not departments:
+            return AutoScheduleResult(dry_run=payload.dry_run, assignments=[], unscheduled=[], stats={})
+        user_query = user_query.where(User.department_id.in_(departments))
+    users = (await db.execute(user_query)).scalars().all()
+
+    result = await auto_schedule_tasks(
+        db, users, start, payload.days,
+        task_ids=payload.task_ids,
+        include_unscheduled=payload.include_unscheduled,
+        reassign=payload.reassign,
+        dry_run=payload.dry_run,
+    )
+    if not payload.dry_run:
+        await db.commit()
+        invalidate_forecast_days(*(d for a in result["assignments"] for d in (a["from_due_date"], a["to_due_date"])))
+    return AutoScheduleResult(**result)
+
+
+@router.post("/planned-hours/rebuild", response_model=dict)
+async def rebuild_planned_hours_index(
+    db: AsyncSession = Depends(get_db),
+    current = Depends(require_role(["Admin"]))
+):
+    """Recalcula las horas planificadas por usuario y día desde las tareas (reparación)."""
+    return {"repaired_keys": await rebuild_planned_hours(db)}
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.database.postgres import get_db
+from app.auth.dependencies import get_current_user
+from app.schemas.search import SearchEntity, SearchResults
+from app.controllers.search import search_all
+
+
+router = APIRouter(tags=["search"])
+
+
+@router.get("/", response_model=SearchResults)
+async def search(
+    q: str = Query(..., min_length=2, max_length=200, description="Texto a buscar"),
+    types: Optional[List[SearchEntity]] = Query(None, description="Entidades en las que buscar (por defecto todas)"),
+    limit: int = Query(20, ge=1, le=100, description="Número máximo de resultados"),
+    db: AsyncSession = Depends(get_db),
+    _user = Depends(get_current_user),
+):
+    results = await search_all(db, q, entities=types, limit=limit)
+    return {"query": q, "results": results}
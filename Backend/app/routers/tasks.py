@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database.postgres import get_db
-from app.schemas.task import TaskCreate, TaskRead, TaskUpdate, TaskCompleteRequest
+from app.pagination import set_next_cursor
+from app.export import ExportFormat, export_columns, stream_export
+from app.models.task import Task
+from app.schemas.task import TaskCreate, TaskRead, TaskUpdate, TaskCompleteRequest, TaskBulkCreate, TaskBulkResult
 from app.controllers.task import (
     create_task,
+    create_tasks_bulk,
     get_task,
     get_tasks,
+    tasks_query,
     get_tasks_by_user,
     get_tasks_by_workorder,
     update_task,
@@ -35,6 +40,35 @@ async def create_new_task(
         # Errores de validación de referencias (asset/component/workorder inexistente)
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/bulk", response_model=TaskBulkResult)
+async def create_tasks_in_bulk(
+    bulk_in: TaskBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(require_role(["Admin", "Supervisor"])),
+):
+    """Crea varias tareas de una vez; las filas inválidas se devuelven en `errors` con su índice."""
+    created, errors = await create_tasks_bulk(
+        db=db,
+        tasks_in=bulk_in.tasks,
+        created_by_id=user["id"],
+        atomic=bulk_in.atomic,
+    )
+    return {"created": created, "errors": errors}
+
+@router.get("/export")
+async def export_tasks(
+    format: ExportFormat = Query("ndjson", description="Formato de exportación: ndjson o csv"),
+    search: str = Query(None, description="Término de búsqueda para filtrar tareas"),
+    status: str = Query(None, description="Filtrar por estado"),
+    priority: str = Query(None, description="Filtrar por prioridad"),
+    assigned_to: int = Query(None, description="Filtrar por usuario asignado"),
+    _user = Depends(require_role(["Admin", "Supervisor"]))
+):
+    """Exporta en streaming todas las tareas que cumplen los filtros de GET /tasks/."""
+    query = export_columns(tasks_query(search, status, priority, assigned_to), Task)
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    return stream_export(query, format, "tasks")
+
 @router.get("/{task_id}", response_model=TaskRead)
 async def read_task(
     task_id: int,
@@ -47,24 +81,29 @@ async def read_task(
 
 @router.get("/", response_model=List[TaskRead])
 async def read_tasks(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar tareas"),
     status: str = Query(None, description="Filtrar por estado"),
     priority: str = Query(None, description="Filtrar por prioridad"),
     assigned_to: int = Query(None, description="Filtrar por usuario asignado"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
     _user = Depends(require_role(["Admin", "Supervisor"]))
 ):
-    return await get_tasks(
+    items = await get_tasks(
         db=db,
         page=page,
         page_size=page_size,
         search=search,
         status=status,
         priority=priority,
-        assigned_to=assigned_to
+        assigned_to=assigned_to,
+        cursor=cursor,
     )
+    set_next_cursor(response, items, page_size)
+    return items
 
 @router.get("/user/{user_id}", response_model=List[TaskRead])
 async def read_tasks_by_user(
@@ -83,7 +122,7 @@ async def read_tasks_by_workorder(
     if user["role"] == "Tecnico":
         from sqlalchemy.future import select
         from app.models.workorder import WorkOrder
-        from app.models.department import Department
+        from app.controllers.department import is_department_in_subtree
         # Obtener workorder
         result = await db.execute(select(WorkOrder).where(WorkOrder.id == workorder_id))
         wo = result.scalar_one_or_none()
@@ -92,21 +131,8 @@ async def read_tasks_by_workorder(
         # Si la WO no tiene department_id, negar
         if wo.department_id is None:
             return []
-        # Construir subárbol del departamento del técnico
-        deps_result = await db.execute(select(Department))
-        deps = deps_result.scalars().all()
-        by_parent = {}
-        for d in deps:
-            by_parent.setdefault(d.parent_id, []).append(d.id)
-        to_visit = [user.get("department_id")] if user.get("department_id") else []
-        subtree = set()
-        while to_visit:
-            cur = to_visit.pop()
-            if cur is None:
-                continue
-            subtree.add(cur)
-            to_visit.extend(by_parent.get(cur, []))
-        if wo.department_id not in subtree:
+        # La WO debe pertenecer al subárbol del departamento del técnico
+        if not await is_department_in_subtree(db, wo.department_id, user.get("department_id")):
             return []
     return await get_tasks_by_workorder(db=db, workorder_id=workorder_id)
 
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database.postgres import get_db
+from app.pagination import set_next_cursor
 from app.schemas.user import UserCreate, UserRead, UserUpdate, UserProfile
 from app.controllers.user import (
     create_user, 
@@ -60,15 +61,19 @@ async def read_user(
 
 @router.get("/", response_model=List[UserRead])
 async def read_users(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=100, description="Número de elementos por página"),
     search: Optional[str] = Query(None, description="Término de búsqueda"),
     role: Optional[str] = Query(None, description="Filtrar por rol exacto"),
     is_active: Optional[bool] = Query(None, description="true activo, false inactivo"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db),
     user = Depends(require_role(["Admin", "Supervisor"]))
 ):
-    return await get_users(db=db, page=page, page_size=page_size, search=search, role=role, is_active=is_active)
+    items = await get_users(db=db, page=page, page_size=page_size, search=search, role=role, is_active=is_active, cursor=cursor)
+    set_next_cursor(response, items, page_size)
+    return items
 
 @router.put("/{user_id}", response_model=UserRead)
 async def update_existing_user(
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database.postgres import get_db
-from app.schemas.workorder import WorkOrderCreate, WorkOrderRead, WorkOrderUpdate, WorkOrderCompleteRequest, WorkOrderCompleteResult
+from app.pagination import set_next_cursor
+from app.export import ExportFormat, export_columns, stream_export
+from app.models.workorder import WorkOrder
+from app.schemas.workorder import (
+    WorkOrderCreate, WorkOrderRead, WorkOrderUpdate, WorkOrderCompleteRequest, WorkOrderCompleteResult,
+    WorkOrderBulkCreate, WorkOrderBulkCreateResult, WorkOrderBulkTransition, WorkOrderBulkTransitionResult,
+)
 from app.controllers.workorder import (
     create_workorder,
+    create_workorders_bulk,
+    transition_workorders_bulk,
     get_workorder,
     get_workorders,
+    workorders_query,
     get_workorders_by_asset,
     get_workorders_by_user,
     update_workorder,
@@ -29,6 +38,51 @@ async def create_new_workorder(
         created_by=user["id"],
     )
 
+@router.post("/bulk", response_model=WorkOrderBulkCreateResult)
+async def create_workorders_in_bulk(
+    bulk_in: WorkOrderBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(require_role(["Admin", "Supervisor"]))
+):
+    """Crea varias órdenes de una vez; las filas inválidas se devuelven en `errors` con su índice."""
+    created, errors = await create_workorders_bulk(
+        db=db,
+        workorders_in=bulk_in.workorders,
+        created_by=user["id"],
+        atomic=bulk_in.atomic,
+    )
+    return {"workorders": created, "errors": errors}
+
+@router.post("/bulk/transition", response_model=WorkOrderBulkTransitionResult)
+async def transition_workorders_in_bulk(
+    transition_in: WorkOrderBulkTransition,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(require_role(["Admin", "Supervisor"]))
+):
+    """Cambia el estado de varias órdenes; al completar crea sus maintenance en la misma transacción."""
+    workorders, maintenance, errors = await transition_workorders_bulk(
+        db=db,
+        workorder_ids=transition_in.ids,
+        status=transition_in.status,
+        maintenance_notes=transition_in.maintenance_notes,
+    )
+    return {"workorders": workorders, "maintenance": maintenance, "errors": errors}
+
+@router.get("/export")
+async def export_workorders(
+    format: ExportFormat = Query("ndjson", description="Formato de exportación: ndjson o csv"),
+    search: str = Query(None, description="Término de búsqueda para filtrar órdenes de trabajo"),
+    status: str = Query(None, description="Filtrar por estado"),
+    work_type: str = Query(None, description="Filtrar por tipo de trabajo"),
+    priority: str = Query(None, description="Filtrar por prioridad"),
+    assigned_to: int = Query(None, description="Filtrar por usuario asignado"),
+    _user = Depends(get_current_user),
+):
+    """Exporta en streaming todas las órdenes que cumplen los filtros de GET /workorders/."""
+    query = export_columns(workorders_query(search, status, work_type, priority, assigned_to), WorkOrder)
+    query = query.order_by(WorkOrder.created_at.desc(), WorkOrder.id.desc())
+    return stream_export(query, format, "workorders")
+
 @router.get("/{workorder_id}", response_model=WorkOrderRead)
 async def read_workorder(
     workorder_id: int,
@@ -41,6 +95,7 @@ async def read_workorder(
 
 @router.get("/", response_model=List[WorkOrderRead])
 async def read_workorders(
+    response: Response,
     page: int = Query(1, ge=1, description="Página actual"),
     page_size: int = Query(20, ge=1, le=1000, description="Número de elementos por página"),
     search: str = Query(None, description="Término de búsqueda para filtrar órdenes de trabajo"),
@@ -48,9 +103,10 @@ async def read_workorders(
     work_type: str = Query(None, description="Filtrar por tipo de trabajo"),
     priority: str = Query(None, description="Filtrar por prioridad"),
     assigned_to: int = Query(None, description="Filtrar por usuario asignado"),
+    cursor: str = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     db: AsyncSession = Depends(get_db)
 ):
-    return await get_workorders(
+    items = await get_workorders(
         db=db,
         page=page,
         page_size=page_size,
@@ -58,8 +114,11 @@ async def read_workorders(
         status=status,
         work_type=work_type,
         priority=priority,
-        assigned_to=assigned_to
+        assigned_to=assigned_to,
+        cursor=cursor,
     )
+    set_next_cursor(response, items, page_size)
+    return items
 
 @router.get("/asset/{asset_id}", response_model=List[WorkOrderRead])
 async def read_workorders_by_asset(
@@ -0,0 +1,158 @@
+"""Planificador en segundo plano (arrancado desde el lifespan de app.main).
+
+Con varios workers solo uno hace de líder: el que consigue el advisory lock de sesión
+SCHEDULER_LOCK_KEY, que mantiene una conexión abierta mientras vive. Si ese worker cae, la
+conexión se cierra, el lock se libera y otro worker lo toma en su siguiente intento.
+
+En cada pasada genera las órdenes de los planes vencidos y, una vez al día, guarda la foto
+de cierre del stock del día anterior, recalcula el estado de stock completo (las medias
+móviles avanzan aunque no haya consumos), vuelve a proyectar las ocurrencias de los planes
+(el horizonte avanza con los días) y repara las horas planificadas por usuario y día.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import logging
+
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database.postgres import AsyncSessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# Clave arbitraria pero fija del advisory lock del líder
+SCHEDULER_LOCK_KEY = 7_240_113
+
+_stats: Dict[str, Any] = {
+    "enabled": False,
+    "leader": False,
+    "runs": 0,
+    "failed_runs": 0,
+    "workorders_generated": 0,
+    "plans_processed": 0,
+    "last_run_at": None,
+    "last_run_ms": None,
+    "last_lag_seconds": None,
+    "last_throughput_per_s": None,
+    "last_daily_jobs": None,
+    "last_planned_hours_drift": None,
+    "last_error": None,
+}
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    return dict(_stats)
+
+
+async def run_scheduler_once() -> Dict[str, Any]:
+    """Una pasada completa del planificador, con sus propias sesiones."""
+    from app.controllers.plan_scheduler import generate_due_workorders
+
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        summary = await generate_due_workorders(session)
+    elapsed = time.perf_counter() - start
+
+    _stats["runs"] += 1
+    _stats["workorders_generated"] += summary["workorders"]
+    _stats["plans_processed"] += summary["plans"]
+    _stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+    _stats["last_run_ms"] = round(elapsed * 1000, 2)
+    _stats["last_lag_seconds"] = round(summary["max_lag_seconds"], 1)
+    _stats["last_throughput_per_s"] = round(summary["workorders"] / elapsed, 1) if summary["workorders"] else None
+    if summary["workorders"] or summary["skipped"]:
+        logger.info(
+            "plan_scheduler workorders=%s plans=%s skipped=%s batches=%s lag_s=%.0f ms=%.1f",
+            summary["workorders"], summary["plans"], summary["skipped"], summary["batches"],
+            summary["max_lag_seconds"], elapsed * 1000,
+        )
+
+    today = datetime.now(timezone.utc).date()
+    if _stats["last_daily_jobs"] != today.isoformat():
+        await _run_daily_jobs(today)
+        _stats["last_daily_jobs"] = today.isoformat()
+    return summary
+
+
+async def _run_daily_jobs(today) -> None:
+    from app.controllers.inventory import take_stock_snapshot
+    from app.controllers.stock_health import refresh_stock_health
+    from app.controllers.plan_occurrences import refresh_plan_occurrences
+    from app.controllers.planned_hours import rebuild_planned_hours
+    from app.controllers.forecast import forecast_week_cache
+
+    async with AsyncSessionLocal() as session:
+        await take_stock_snapshot(session, today - timedelta(days=1))
+        await refresh_stock_health(session)
+        await refresh_plan_occurrences(session)
+        await session.commit()
+        forecast_week_cache.clear()
+        _stats["last_planned_hours_drift"] = await rebuild_planned_hours(session)
+
+
+async def _lead(conn) -> None:
+    """Bucle del líder: una pasada cada PLAN_SCHEDULER_INTERVAL_SECONDS mientras conserve la conexión."""
+    while True:
+        try:
+            await run_scheduler_once()
+            _stats["last_error"] = None
+        except Exception as e:
+            _stats["failed_runs"] += 1
+            _stats["last_error"] = type(e).__name__  # el detalle va al log, no a /metrics
+            logger.exception("Error en la pasada del planificador")
+        await asyncio.sleep(settings.PLAN_SCHEDULER_INTERVAL_SECONDS)
+        # Comprueba que la conexión del lock sigue viva; si no, se vuelve a competir por él
+        await conn.execute(select(1))
+        await conn.commit()
+
+
+async def _unlock(conn) -> None:
+    try:
+        await conn.execute(select(func.pg_advisory_unlock(SCHEDULER_LOCK_KEY)))
+        await conn.commit()
+    except Exception:
+        # Conexión rota: el servidor ya liberó el lock al cerrarla
+        await conn.invalidate()
+
+
+async def scheduler_loop() -> None:
+    """Compite por el liderazgo y, si lo obtiene, ejecuta el planificador hasta ser cancelado."""
+    _stats["enabled"] = True
+    while True:
+        try:
+            async with engine.connect() as conn:
+                got_lock = (await conn.execute(select(func.pg_try_advisory_lock(SCHEDULER_LOCK_KEY)))).scalar()
+                await conn.commit()
+                if got_lock:
+                    _stats["leader"] = True
+                    logger.info("🗓️ Planificador de planes activo en este worker")
+                    try:
+                        await _lead(conn)
+                    finally:
+                        _stats["leader"] = False
+                        # La conexión vuelve al pool: el lock de sesión no se libera solo
+                        await asyncio.shield(_unlock(conn))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats["last_error"] = type(e).__name__
+            logger.warning(f"⚠️ Planificador: conexión del líder perdida: {e}")
+        await asyncio.sleep(settings.PLAN_SCHEDULER_INTERVAL_SECONDS)
+
+
+def start_scheduler() -> Optional[asyncio.Task]:
+    if not settings.PLAN_SCHEDULER_ENABLED:
+        return None
+    return asyncio.create_task(scheduler_loop(), name="plan_scheduler")
+
+
+async def stop_scheduler(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
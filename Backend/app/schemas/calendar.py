@@ -62,3 +62,42 @@ class TeamVacationDay(BaseModel):
     last_name: str
     date: date
     reason: Optional[str] = None
+
+
+class BulkSpecialDaysCreate(BaseModel):
+    """Mismo día especial en [start_date, end_date] para varios usuarios y/o un departamento (con subdepartamentos)."""
+    user_ids: List[int] = Field(default_factory=list)
+    department_id: Optional[int] = None
+    start_date: date
+    end_date: date
+    is_working: bool = False
+    hours: Optional[float] = Field(default=None, ge=0, le=24)
+    reason: Optional[str] = None
+
+    def model_post_init(self, __context):
+        if self.end_date < self.start_date:
+            raise ValueError("end_date debe ser >= start_date")
+        if (self.end_date - self.start_date).days > 366:
+            raise ValueError("El rango no puede superar un año")
+        if not self.user_ids and self.department_id is None:
+            raise ValueError("Indique user_ids o department_id")
+
+
+class BulkSpecialDaysResult(BaseModel):
+    users: int
+    days: int
+    rows: int
+
+
+class CompanyHolidayCreate(BaseModel):
+    date: date
+    reason: Optional[str] = None
+
+
+class CompanyHoliday(BaseModel):
+    id: int
+    date: date
+    reason: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,7 +1,19 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
 from typing import Optional
 from .user import UserReference
+from app.models.enums import FailureStatus, FailureSeverity
+from .utils import normalize_enum_value
+
+
+def _normalize(v, enum_cls):
+    """Valor canónico del enum ('HIGH', 'RESOLVED'...): los acumulados KPI agrupan por el valor guardado."""
+    if v is None:
+        return v
+    m = normalize_enum_value(v, enum_cls)
+    if not isinstance(m, enum_cls):
+        raise ValueError(f"Valor no válido: {v}")
+    return m.value
 
 
 class FailureCreate(BaseModel):
@@ -10,6 +22,10 @@ class FailureCreate(BaseModel):
     component_id: Optional[int] = None
     severity: str = "MEDIUM"
 
+    @field_validator('severity', mode='before')
+    def _normalize_severity_create(cls, v):
+        return _normalize(v, FailureSeverity)
+
 
 class FailureRead(BaseModel):
     id: int
@@ -44,6 +60,14 @@ class FailureUpdate(BaseModel):
     resolved_date: Optional[datetime] = None
     resolution_notes: Optional[str] = None
 
+    @field_validator('status', mode='before')
+    def _normalize_status_update(cls, v):
+        return _normalize(v, FailureStatus)
+
+    @field_validator('severity', mode='before')
+    def _normalize_severity_update(cls, v):
+        return _normalize(v, FailureSeverity)
+
 
 class FailureWithWorkOrder(BaseModel):
     id: int
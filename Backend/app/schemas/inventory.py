@@ -1,6 +1,6 @@
-from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, model_validator
 from app.schemas.component import ComponentRead
 
 
@@ -43,6 +43,13 @@ class InventoryItemReadWithComponent(BaseModel):
 class AdjustQuantityRequest(BaseModel):
     delta: float = Field(..., description="Variación de stock, puede ser negativa")
     reason: Optional[str] = Field(None, description="Motivo del ajuste")
+    movement_type: Literal["ADJUSTMENT", "RECEIPT"] = Field("ADJUSTMENT", description="RECEIPT para entradas de material")
+
+    @model_validator(mode="after")
+    def _receipt_positive(self):
+        if self.movement_type == "RECEIPT" and self.delta <= 0:
+            raise ValueError("Una recepción debe tener delta positivo")
+        return self
 
 
 class TaskUsedComponentRead(BaseModel):
@@ -55,3 +62,50 @@ class TaskUsedComponentRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+StockMovementType = Literal["OPENING", "RECEIPT", "CONSUMPTION", "ADJUSTMENT"]
+
+
+class StockMovementRead(BaseModel):
+    id: int
+    component_id: int
+    movement_type: StockMovementType
+    quantity: float
+    balance_after: float
+    unit_cost: Optional[float] = None
+    task_id: Optional[int] = None
+    user_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class StockAtRead(BaseModel):
+    component_id: int
+    at: datetime
+    quantity: float
+
+
+class StockSnapshotResult(BaseModel):
+    snapshot_date: date
+    components: int
+
+
+StockHealthStatus = Literal["OK", "LOW", "CRITICAL", "OUT"]
+
+
+class StockAlertRead(BaseModel):
+    component_id: int
+    component_name: str
+    component_type: Optional[str] = None
+    quantity: float
+    avg_daily_30d: float
+    avg_daily_90d: float
+    daily_rate: float
+    planned_demand: float
+    days_to_stockout: Optional[float] = None
+    status: StockHealthStatus
+    updated_at: datetime
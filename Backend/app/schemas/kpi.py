@@ -60,3 +60,29 @@ class MonthlyResponsePoint(BaseModel):
 
 class MonthlyResponseSeries(BaseModel):
     points: list[MonthlyResponsePoint]
+
+
+class AssetReliability(BaseModel):
+    asset_id: int
+    asset_name: Optional[str] = None
+    failures: int
+    mtbf_hours: Optional[float] = None
+    mttf_hours: Optional[float] = None
+
+
+class ReliabilityReport(BaseModel):
+    mtbf_hours: Optional[float] = None  # global
+    mttf_hours: Optional[float] = None  # global
+    total_assets: int
+    page: int
+    page_size: int
+    assets: List[AssetReliability]
+
+
+class KpiDashboard(BaseModel):
+    summary: KpiSummary
+    trends: KpiTrends
+    assets: AssetKpi
+    workorders: WorkOrderKpi
+    failures: FailureKpi
+    monthly_response: MonthlyResponseSeries
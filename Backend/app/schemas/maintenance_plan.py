@@ -49,3 +49,13 @@ class MaintenancePlanRead(MaintenancePlanBase):
 
     class Config:
         from_attributes = True
+
+
+class PlanOccurrenceRead(BaseModel):
+    plan_id: int
+    plan_name: str
+    seq: int
+    due_date: datetime
+    asset_id: Optional[int] = None
+    component_id: Optional[int] = None
+    estimated_duration: Optional[float] = None
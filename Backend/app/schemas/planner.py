@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import date, datetime
 from app.schemas.user import UserRead
@@ -36,3 +36,65 @@ class PlannerWeek(BaseModel):
     start: date
     days: int
     users: List[PlannerUserRow]
+
+
+class ForecastWeek(BaseModel):
+    week_start: date
+    capacity_hours: float
+    task_hours: float
+    projected_hours: float
+    load_hours: float
+    free_hours: float
+    utilization: Optional[float] = None
+
+
+class ForecastUserRow(BaseModel):
+    user_id: int
+    name: str
+    department_id: Optional[int] = None
+    weeks: List[ForecastWeek]
+
+
+class ForecastDepartmentRow(BaseModel):
+    department_id: Optional[int] = None
+    users: int
+    weeks: List[ForecastWeek]
+
+
+class PlannerForecast(BaseModel):
+    start: date
+    weeks: int
+    users: List[ForecastUserRow]
+    departments: List[ForecastDepartmentRow]
+    unassigned: List[ForecastWeek]
+    totals: List[ForecastWeek]
+
+
+class AutoScheduleRequest(BaseModel):
+    start: Optional[date] = Field(None, description="Primer día de la ventana; por defecto hoy")
+    days: int = Field(28, ge=1, le=120, description="Días de la ventana")
+    department_id: Optional[int] = Field(None, description="Limitar a los usuarios de un departamento (y subdepartamentos)")
+    task_ids: Optional[List[int]] = Field(None, max_length=10000, description="Tareas a replanificar aunque quepan en su día")
+    include_unscheduled: bool = Field(True, description="Incluir tareas sin fecha o sin responsable")
+    reassign: bool = Field(True, description="Permitir cambiar el responsable dentro del departamento")
+    dry_run: bool = Field(True, description="Solo devolver la propuesta, sin aplicarla")
+
+
+class AutoScheduleAssignment(BaseModel):
+    task_id: int
+    from_user_id: Optional[int] = None
+    to_user_id: int
+    from_due_date: Optional[datetime] = None
+    to_due_date: datetime
+
+
+class AutoScheduleUnscheduled(BaseModel):
+    task_id: int
+    reason: str
+
+
+class AutoScheduleResult(BaseModel):
+    dry_run: bool
+    assignments: List[AutoScheduleAssignment]
+    unscheduled: List[AutoScheduleUnscheduled]
+    stats: dict
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+SearchEntity = Literal["workorder", "task", "failure", "asset", "component"]
+
+
+class SearchHit(BaseModel):
+    type: SearchEntity
+    id: int
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    score: float
+
+
+class SearchResults(BaseModel):
+    query: str
+    results: List[SearchHit]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 from .user import UserReference
@@ -98,4 +98,20 @@ class TaskCompleteRequest(BaseModel):
     notes: Optional[str] = None  # alias para completion_notes
     description: Optional[str] = None
     actual_hours: Optional[float] = None
-    used_components: Optional[List[TaskCompleteItemIn]] = None
\ No newline at end of file
+    used_components: Optional[List[TaskCompleteItemIn]] = None
+
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(..., min_length=1, max_length=1000)
+    # True: si alguna fila falla no se crea ninguna
+    atomic: bool = False
+
+
+class TaskBulkError(BaseModel):
+    index: int  # posición de la fila en `tasks`
+    error: str
+
+
+class TaskBulkResult(BaseModel):
+    created: List[TaskRead]
+    errors: List[TaskBulkError]
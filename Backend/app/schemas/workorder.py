@@ -1,8 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from .user import UserReference
 from app.schemas.maintenance import MaintenanceRead
+from app.models.enums import WorkOrderStatus
+from .utils import normalize_enum_value
+
+
+def _normalize_status(v):
+    """Persistir siempre el valor canónico ('OPEN', 'IN_PROGRESS', ...) para que los filtros por estado sean indexables."""
+    v = normalize_enum_value(v, WorkOrderStatus)
+    return v.value if isinstance(v, WorkOrderStatus) else v
+
 
 class WorkOrderCreate(BaseModel):
     title: str
@@ -19,6 +28,10 @@ class WorkOrderCreate(BaseModel):
     department_id: Optional[int] = None
     plan_id: Optional[int] = None
 
+    @field_validator('status', mode='before')
+    def _normalize_status_create(cls, v):
+        return _normalize_status(v)
+
 class WorkOrderRead(BaseModel):
     id: int
     title: str
@@ -70,6 +83,10 @@ class WorkOrderUpdate(BaseModel):
     department_id: Optional[int] = None
     plan_id: Optional[int] = None
 
+    @field_validator('status', mode='before')
+    def _normalize_status_update(cls, v):
+        return _normalize_status(v)
+
 
 class WorkOrderCompleteRequest(BaseModel):
     """Solo notas opcionales para el maintenance generado automáticamente"""
@@ -80,4 +97,44 @@ class WorkOrderCompleteResult(BaseModel):
     maintenance: Optional[MaintenanceRead] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class WorkOrderBulkCreate(BaseModel):
+    workorders: List[WorkOrderCreate] = Field(..., min_length=1, max_length=1000)
+    # True: si alguna fila falla no se crea ninguna
+    atomic: bool = False
+
+
+class WorkOrderBulkError(BaseModel):
+    index: int  # posición de la fila en `workorders`
+    error: str
+
+
+class WorkOrderBulkCreateResult(BaseModel):
+    workorders: List[WorkOrderRead]
+    errors: List[WorkOrderBulkError]
+
+
+class WorkOrderBulkTransition(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+    status: str
+    maintenance_notes: Optional[str] = None  # para los maintenance creados al completar
+
+    @field_validator('status', mode='before')
+    def _normalize_status_transition(cls, v):
+        v = _normalize_status(v)
+        if v not in {s.value for s in WorkOrderStatus}:
+            raise ValueError(f"Estado no válido: {v}")
+        return v
+
+
+class WorkOrderBulkTransitionError(BaseModel):
+    id: int
+    error: str
+
+
+class WorkOrderBulkTransitionResult(BaseModel):
+    workorders: List[WorkOrderRead]
+    maintenance: List[MaintenanceRead]
+    errors: List[WorkOrderBulkTransitionError]
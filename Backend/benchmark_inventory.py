@@ -0,0 +1,133 @@
+import asyncio
+import random
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import delete, select
+
+from app.database.postgres import AsyncSessionLocal, engine
+from app.models.asset import Asset
+from app.models.component import Component
+from app.models.inventory import InventoryItem
+from app.controllers.inventory import consume_inventory
+
+COMPONENTS = 5
+INITIAL_STOCK = 1000.0
+PARALLEL = 100
+ROUNDS = 5
+MAX_QTY = 3
+
+
+async def _legacy_consume(session, items):
+    """Ruta anterior de update_task: SELECT, comprobación en Python y escritura, componente a componente."""
+    for component_id, qty in items:
+        res = await session.execute(select(InventoryItem).where(InventoryItem.component_id == component_id))
+        inv = res.scalar_one_or_none()
+        if inv is None or inv.quantity < qty:
+            raise ValueError(f"Insufficient inventory for component {component_id}")
+        await asyncio.sleep(0)  # cede el loop entre lectura y escritura, como una petición real
+        inv.quantity = inv.quantity - qty
+
+
+async def _completion(consume, items):
+    """Una finalización de tarea: consumo + commit en su propia sesión. Devuelve lo descontado."""
+    async with AsyncSessionLocal() as session:
+        try:
+            await consume(session, items)
+            await session.commit()
+            return items
+        except ValueError:
+            await session.rollback()
+            return None
+
+
+async def _stock(component_ids):
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(
+            select(InventoryItem.component_id, InventoryItem.quantity).where(InventoryItem.component_id.in_(component_ids))
+        )
+        return dict(res.all())
+
+
+async def run_mode(name, consume, component_ids):
+    async with AsyncSessionLocal() as session:
+        for component_id in component_ids:
+            res = await session.execute(select(InventoryItem).where(InventoryItem.component_id == component_id))
+            res.scalar_one().quantity = INITIAL_STOCK
+        await session.commit()
+
+    rng = random.Random(42)
+    consumed = {cid: 0.0 for cid in component_ids}
+    ok = rejected = 0
+    print(f"\n⚙️ {name}: {ROUNDS} rondas de {PARALLEL} finalizaciones en paralelo")
+    for round_no in range(1, ROUNDS + 1):
+        batches = [
+            [(cid, float(rng.randint(1, MAX_QTY))) for cid in rng.sample(component_ids, rng.randint(1, len(component_ids)))]
+            for _ in range(PARALLEL)
+        ]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(_completion(consume, items) for items in batches), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        errors = [r for r in results if isinstance(r, Exception)]
+        for items in results:
+            if isinstance(items, list):
+                ok += 1
+                for cid, qty in items:
+                    consumed[cid] += qty
+            elif items is None:
+                rejected += 1
+        print(f"  ronda {round_no}: {PARALLEL / elapsed:.0f} finalizaciones/s ({elapsed * 1000:.0f} ms)"
+              + (f", {len(errors)} errores ({type(errors[0]).__name__})" if errors else ""))
+
+    stock = await _stock(component_ids)
+    lost = {cid: (INITIAL_STOCK - consumed[cid]) - stock[cid] for cid in component_ids}
+    negative = [cid for cid, q in stock.items() if q < 0]
+    consistent = all(abs(v) < 1e-6 for v in lost.values())
+    print(f"  aceptadas: {ok}, rechazadas por stock: {rejected}")
+    print(f"  {'✅' if not negative else '❌'} stock negativo: {negative or 'ninguno'}")
+    print(f"  {'✅' if consistent else '❌'} stock final = inicial - consumido"
+          + ("" if consistent else f" (desfase por lost updates: {lost})"))
+
+
+async def main():
+    """
+    Benchmark de concurrencia del consumo de inventario: compara la ruta anterior (lectura +
+    escritura) con consume_inventory (UPDATE condicional) bajo finalizaciones en paralelo.
+    Uso `python benchmark_inventory.py`; crea y borra sus propios activo/componentes.
+    """
+    suffix = f"{int(time.time())}"
+    async with AsyncSessionLocal() as session:
+        asset = Asset(name=f"bench-inventory-{suffix}", asset_type="BENCH")
+        session.add(asset)
+        await session.flush()
+        components = [
+            Component(name=f"bench-{suffix}-{i}", component_type="BENCH", asset_id=asset.id)
+            for i in range(COMPONENTS)
+        ]
+        session.add_all(components)
+        await session.flush()
+        session.add_all([InventoryItem(component_id=c.id, quantity=INITIAL_STOCK, unit_cost=1.0) for c in components])
+        await session.commit()
+        asset_id = asset.id
+        component_ids = [c.id for c in components]
+
+    try:
+        await run_mode("Lectura + escritura (anterior)", _legacy_consume, component_ids)
+        await run_mode("UPDATE condicional (consume_inventory)", consume_inventory, component_ids)
+    except Exception as e:
+        print(f"❌ Error durante el benchmark: {e}")
+        raise e
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(InventoryItem).where(InventoryItem.component_id.in_(component_ids)))
+            await session.execute(delete(Component).where(Component.id.in_(component_ids)))
+            await session.execute(delete(Asset).where(Asset.id == asset_id))
+            await session.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
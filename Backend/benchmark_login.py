@@ -0,0 +1,55 @@
+import asyncio
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.auth.security import (
+    get_password_hash, verify_password, verify_password_async, password_hashing_stats
+)
+
+
+async def _heartbeat(stop: asyncio.Event, interval: float, lags: list):
+    """Mide cuánto se retrasa una tarea periódica: el retraso es el tiempo que el event loop estuvo bloqueado."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _run(label: str, concurrency: int, hashed: str, verify):
+    stop = asyncio.Event()
+    lags: list = []
+    beat = asyncio.create_task(_heartbeat(stop, 0.01, lags))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify("secret123", hashed) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    assert all(results)
+    lags_ms = sorted(l * 1000 for l in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{label:<10} {concurrency} logins en {elapsed:.2f}s "
+          f"({concurrency / elapsed:.1f} logins/s) | lag event loop máx {lags_ms[-1]:.0f} ms, p99 {p99:.0f} ms")
+
+
+async def main():
+    """
+    Benchmark de login: verificación bcrypt bloqueante vs pool de hashing con N logins simultáneos.
+    Uso: `python benchmark_login.py [concurrencia]` (por defecto 50).
+    """
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    hashed = get_password_hash("secret123")
+
+    async def blocking_verify(password, hashed_password):
+        return verify_password(password, hashed_password)
+
+    await _run("bloqueante", concurrency, hashed, blocking_verify)
+    await _run("pool", concurrency, hashed, verify_password_async)
+    print(f"📊 {password_hashing_stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+import asyncio
+import random
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.controllers.auto_scheduler import schedule_tasks
+
+DAY_HOURS = 8.0
+PRIORITIES = ["HIGH", "MEDIUM", "LOW"]
+
+
+def synthetic(users: int, days: int, tasks: int, seed: int = 42):
+    """Capacidad 8h laborables (fines de semana 0) y tareas concentradas en el primer tercio."""
+    rng = random.Random(seed)
+    capacity = [[DAY_HOURS if d % 7 < 5 else 0.0 for d in range(days)] for _ in range(users)]
+    departments = [u % 10 for u in range(users)]
+    items = [
+        {
+            "id": i,
+            "user": rng.randrange(users),
+            "day": rng.randrange(max(1, days // 3)),
+            "hours": float(rng.choice([1, 2, 2, 3, 4])),
+            "priority": rng.choice(PRIORITIES),
+        }
+        for i in range(tasks)
+    ]
+    for item in items:
+        item["department"] = departments[item["user"]]
+    return capacity, departments, items
+
+
+def legacy_rebalance(capacity, items):
+    """Algoritmo anterior del seed: por cada tarea a mover, recorre los días siguientes y
+    recalcula la carga del día sumando todas las tareas del usuario (cuadrático)."""
+    by_user = {}
+    for item in items:
+        by_user.setdefault(item["user"], []).append(dict(item))
+    moved = 0
+    for uid, user_tasks in by_user.items():
+        day_map = {}
+        for t in user_tasks:
+            day_map.setdefault(t["day"], []).append(t)
+        for d, tlist in list(day_map.items()):
+            cap = capacity[uid][d]
+            total = sum(t["hours"] for t in tlist)
+            if cap > 0 and total <= cap + 1e-6:
+                continue
+            moving, current = [], total
+            for t in sorted(tlist, key=lambda x: x["id"], reverse=True):
+                moving.append(t)
+                current -= t["hours"]
+                if cap > 0 and current <= cap + 1e-6:
+                    break
+            for t in moving:
+                nd = t["day"] + 1
+                while nd < min(len(capacity[uid]), t["day"] + 31):
+                    load = sum(o["hours"] for o in user_tasks if o is not t and o["day"] == nd)
+                    if capacity[uid][nd] > 0 and load + t["hours"] <= capacity[uid][nd] + 1e-6:
+                        t["day"] = nd
+                        moved += 1
+                        break
+                    nd += 1
+    return moved
+
+
+def run(users: int, days: int, tasks: int, legacy: bool):
+    capacity, departments, items = synthetic(users, days, tasks)
+    pools = {None: list(range(users))}
+    for u, dep in enumerate(departments):
+        pools.setdefault(dep, []).append(u)
+
+    print(f"\n⚙️ {users} usuarios × {days} días, {tasks:,} tareas")
+    for reassign in (False, True):
+        remaining = [row[:] for row in capacity]
+        start = time.perf_counter()
+        placed, unplaced = schedule_tasks(remaining, [dict(i) for i in items], [], pools, reassign)
+        elapsed = time.perf_counter() - start
+        overload = sum(1 for row in remaining for free in row if free < -1e-6)
+        print(f"  {'✅' if not overload else '❌'} schedule_tasks (reasignar={reassign}): {elapsed * 1000:.0f} ms, "
+              f"{len(placed):,} movidas, {len(unplaced):,} sin hueco, días sobrecargados: {overload}")
+    if legacy:
+        start = time.perf_counter()
+        moved = legacy_rebalance(capacity, items)
+        elapsed = time.perf_counter() - start
+        print(f"  ⏱️ algoritmo anterior del seed: {elapsed * 1000:.0f} ms, {moved:,} movidas")
+
+
+async def main():
+    """
+    Benchmark del planificador automático (en memoria, sin base de datos).
+    Uso `python benchmark_scheduler.py [tareas]` (por defecto 50.000).
+    """
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    # El algoritmo anterior es cuadrático por usuario: se compara en un tamaño donde aún termina
+    run(50, 60, 5_000, legacy=True)
+    run(200, 90, tasks, legacy=tasks <= 20_000)
+
+if __name__ == "__main__":
+    asyncio.run(main())
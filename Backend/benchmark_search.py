@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import os
+import time
+import asyncpg
+
+# Añadir el directorio raíz al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+
+DOCUMENT = "(coalesce(title, '') || ' ' || coalesce(description, ''))"
+
+# Ruta anterior (ILIKE por columna, sin índice utilizable) frente a la de controllers/search.py
+QUERIES = {
+    "ilike por columna (anterior)": """
+        SELECT id FROM bench_workorders
+        WHERE title ILIKE $1 OR description ILIKE $1
+        ORDER BY created_at DESC LIMIT 20
+    """,
+    "ilike sobre documento (trigram)": f"""
+        SELECT id FROM bench_workorders
+        WHERE {DOCUMENT} ILIKE $1
+        ORDER BY created_at DESC LIMIT 20
+    """,
+    "búsqueda con ranking (/search)": f"""
+        SELECT id, greatest(word_similarity($2, {DOCUMENT}), ({DOCUMENT} ILIKE $1)::int) AS score
+        FROM bench_workorders
+        WHERE {DOCUMENT} ILIKE $1 OR {DOCUMENT} %> $2
+        ORDER BY score DESC LIMIT 20
+    """,
+}
+
+TERMS = ["rodamiento", "compresor 17", "vibracion"]
+REPEATS = 5
+
+WORDS = [
+    "bomba", "motor", "valvula", "compresor", "rodamiento", "correa", "filtro", "sensor",
+    "engrase", "revision", "fuga", "aceite", "presion", "temperatura", "ruido", "cambio",
+    "ajuste", "limpieza", "calibracion", "inspeccion", "vibracion", "electrico", "hidraulico",
+]
+
+
+async def run_benchmark(rows: int):
+    """
+    Crea una copia temporal de workorders (con los índices de apply_simple_migrations, incluido
+    el GIN trigram del documento de búsqueda), la llena con `rows` filas sintéticas y compara
+    la latencia de la búsqueda anterior por ILIKE con la indexada.
+    """
+    host = settings.POSTGRES_SERVER or "localhost"
+    if os.getenv("DOCKER_ENV") == "true" or os.path.exists("/.dockerenv"):
+        host = "db"
+    elif host == "db":
+        host = "localhost"
+    database_url = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{host}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+
+    # Asegurar que pg_trgm y los índices existen en la tabla real antes de copiar su definición
+    from app.database.postgres import apply_simple_migrations
+    await apply_simple_migrations()
+
+    print(f"🔗 Conectando a: {host}:{settings.POSTGRES_PORT}")
+    conn = await asyncpg.connect(database_url)
+    try:
+        await conn.execute("CREATE TEMP TABLE bench_workorders (LIKE workorders INCLUDING INDEXES)")
+        print(f"🌱 Insertando {rows:,} filas sintéticas...")
+        await conn.execute("""
+            INSERT INTO bench_workorders (id, title, description, status, work_type, priority, asset_id,
+                                          created_by, created_at)
+            SELECT g,
+                   initcap(w[1 + g % n]) || ' ' || w[1 + (g / 7) % n] || ' ' || (g % 50),
+                   'Orden ' || g || ': ' || w[1 + (g / 3) % n] || ' de ' || w[1 + (g / 11) % n]
+                       || ' en linea ' || (g % 40) || ', revisar ' || w[1 + (g / 13) % n],
+                   'COMPLETED', 'PREVENTIVE', 'MEDIUM', 1 + g % 500, 1,
+                   now() - (g % (5 * 365)) * interval '1 day'
+            FROM generate_series(1, $1) g,
+                 (SELECT $2::text[] AS w, cardinality($2::text[]) AS n) v
+        """, rows, WORDS)
+        await conn.execute("VACUUM ANALYZE bench_workorders")
+
+        for term in TERMS:
+            pattern = f"%{term}%"
+            print(f"\n🔎 Término: '{term}'")
+            for name, sql in QUERIES.items():
+                args = (pattern, term) if "$2" in sql else (pattern,)
+                timings = []
+                for _ in range(REPEATS):
+                    start = time.perf_counter()
+                    await conn.fetch(sql, *args)
+                    timings.append((time.perf_counter() - start) * 1000)
+                plan = "\n".join(r[0] for r in await conn.fetch(f"EXPLAIN {sql}", *args))
+                # El GIN trigram solo se usa vía bitmap scan
+                indexed = "Bitmap Index Scan" in plan
+                timings.sort()
+                print(f"  {'✅' if indexed else '⚠️'} {name}: mediana {timings[len(timings) // 2]:.1f} ms, "
+                      f"mín {timings[0]:.1f} ms")
+    finally:
+        await conn.close()
+
+
+async def main():
+    """
+    Benchmark de búsqueda: uso `python benchmark_search.py [filas]` (por defecto 1M).
+    """
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    try:
+        await run_benchmark(rows)
+    except Exception as e:
+        print(f"❌ Error durante el benchmark: {e}")
+        raise e
+
+if __name__ == "__main__":
+    asyncio.run(main())
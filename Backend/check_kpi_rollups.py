@@ -0,0 +1,85 @@
+import asyncio
+import random
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Añadir el directorio raíz al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select
+
+from app.database.postgres import AsyncSessionLocal
+from app.models import Asset, Failure, User
+from app.controllers.kpi_rollup import failure_snapshot, rebuild_kpi_rollups, record_failure_change, verify_kpi_rollups
+
+RESOLVED = "RESOLVED"
+REPORTED = "REPORTED"
+
+
+async def main():
+    """
+    Comprueba que el camino incremental de los acumulados de fallos (incluido MTTF) da lo
+    mismo que un rebuild. Todo ocurre en una transacción que se deshace al final.
+    Uso `python check_kpi_rollups.py [operaciones]` (por defecto 200).
+    """
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(7)
+    base = datetime.now(timezone.utc) - timedelta(days=90)
+
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(select(User.id).limit(1))).scalar()
+        asset_ids = (await db.execute(select(Asset.id).limit(5))).scalars().all() or [None]
+        if user_id is None:
+            print("❌ Hace falta al menos un usuario en la base de datos")
+            return
+        await rebuild_kpi_rollups(db, commit=False)
+        ids = []
+        try:
+            for step in range(steps):
+                op = rng.choice(["create", "create", "resolve", "reopen", "move", "delete"]) if ids else "create"
+                if op == "create":
+                    failure = Failure(
+                        description=f"check {step}",
+                        status=REPORTED,
+                        severity="MEDIUM",
+                        reported_date=base + timedelta(hours=rng.uniform(0, 90 * 24)),
+                        asset_id=rng.choice(asset_ids),
+                        reported_by=user_id,
+                    )
+                    db.add(failure)
+                    await db.flush()
+                    ids.append(failure.id)
+                    await record_failure_change(db, None, await failure_snapshot(db, failure))
+                elif op == "delete":
+                    failure = await db.get(Failure, ids.pop(rng.randrange(len(ids))))
+                    old = await failure_snapshot(db, failure)
+                    await db.delete(failure)
+                    await db.flush()
+                    await record_failure_change(db, old, None)
+                else:
+                    failure = await db.get(Failure, rng.choice(ids))
+                    old = await failure_snapshot(db, failure)
+                    if op == "resolve":
+                        failure.status = RESOLVED
+                        failure.resolved_date = old["reported_date"] + timedelta(hours=rng.uniform(1, 72))
+                    elif op == "reopen":
+                        failure.status = REPORTED
+                        failure.resolved_date = None
+                    else:
+                        failure.reported_date = base + timedelta(hours=rng.uniform(0, 90 * 24))
+                    await db.flush()
+                    await record_failure_change(db, old, await failure_snapshot(db, failure))
+
+                drift = await verify_kpi_rollups(db)
+                if drift["rollup_keys"] or drift["counter_keys"]:
+                    print(f"❌ Paso {step} ({op}): {drift}")
+                    return
+            drift = await verify_kpi_rollups(db)
+            ok = not (drift["rollup_keys"] or drift["counter_keys"])
+            print(f"{'✅' if ok else '❌'} {steps} operaciones sobre {len(ids)} fallos: {drift}")
+        finally:
+            await db.rollback()
+
+if __name__ == "__main__":
+    asyncio.run(main())